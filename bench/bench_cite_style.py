@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Benchmark looking up the default citation style.
+
+``zh.py search`` calls ``app.styles.get(CITE_STYLE)`` for every
+keystroke, each time in a new process. This times the lookup with a
+new `ZotHero` for each call, with 10,000 installed styles:
+
+- ``update``: styles are updated first, as `Styles()` used to.
+- ``cached``: styles are only read from the cache.
+- ``cached+stale``: also checks `Styles.stale`, like the style pickers.
+
+Usage: bench_cite_style.py [<styles> [<reps>]]
+"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import sys
+from time import time
+
+from benchutil import log, percentile, tempdir, zotero_db
+
+
+def lookup(app, key, mode):
+    """Look up style ``key``."""
+    styles = app.styles
+    if mode == 'update':
+        styles.update()
+    elif mode == 'cached+stale':
+        assert not styles.stale
+
+    return styles.get(key)
+
+
+def main(n, reps):
+    from zothero.core import ZotHero
+    from zothero.tests.fixtures import make_styles
+
+    with tempdir() as dirpath:
+        datadir = os.path.join(dirpath, 'zotero')
+        make_styles(os.path.join(datadir, 'styles'), n)
+        zotero_db(datadir, 100)
+        cachedir = os.path.join(dirpath, 'cache')
+        os.makedirs(cachedir)
+
+        # fills the cache
+        key = next(ZotHero(cachedir, datadir).styles.all()).key
+
+        for mode in ('update', 'cached', 'cached+stale'):
+            times = []
+            for _ in range(reps):
+                start = time()
+                assert lookup(ZotHero(cachedir, datadir), key, mode)
+                times.append(time() - start)
+
+            log('[%d styles] %-12s p50=%6.2fms p95=%6.2fms', n, mode,
+                percentile(times, 50) * 1000, percentile(times, 95) * 1000)
+
+
+if __name__ == '__main__':
+    args = [int(s) for s in sys.argv[1:]]
+    main(args[0] if args else 10000, args[1] if len(args) > 1 else 50)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-28
+#
+
+"""Benchmark the codecs used to store entries in the search index.
+
+Reports encode and decode throughput and the mean size of an encoded
+entry for each codec in `zothero.serialise.CODECS`.
+
+Usage: bench_codecs.py [<items>]
+"""
+
+from __future__ import print_function, absolute_import
+
+import sys
+
+from benchutil import best, log, tempdir, zotero_db
+
+
+def main(n):
+    from zothero.serialise import CODECS
+    from zothero.zotero import Zotero
+
+    with tempdir() as dirpath:
+        zotero_db(dirpath, n)
+        entries = list(Zotero(dirpath).all_entries())
+
+    n = len(entries)
+    log('[%d entries]', n)
+    for name in sorted(CODECS):
+        codec = CODECS[name]
+        data = [codec.encode(e) for e in entries]
+        size = sum(len(d) for d in data) / float(n)
+
+        enc = best(lambda: [codec.encode(e) for e in entries])
+        dec = best(lambda: [codec.decode(d) for d in data])
+        log('[%-12s] %5.0f bytes/entry, encode %6.0f/s (%5.1fus), '
+            'decode %6.0f/s (%5.1fus)', name, size, n / enc, 1e6 * enc / n,
+            n / dec, 1e6 * dec / n)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-04
+#
+
+"""Benchmark search latency while the index is being rebuilt.
+
+A separate process re-indexes a synthetic library over and over,
+while this one searches the index:
+
+    cold  a new `Index` for each query, like a new ``zh.py search``
+    warm  the same `Index` for every query, like ``zh.py daemon``
+
+Each is run with the default SQLite settings ZotHero used before
+(``legacy``: rollback journal, no tuning) and with `zothero.db`'s
+settings (``tuned``), both with and without the writer running.
+Queries that fail with "database is locked" are counted as errors.
+The index now sets its own journal mode and re-indexes into a new
+file, so only the other settings differ (see ``bench_shadow.py``).
+
+Usage: bench_concurrent.py [<items> [<queries>]]
+"""
+
+from __future__ import print_function, absolute_import
+
+import logging
+import multiprocessing
+import os
+import sqlite3
+import sys
+from time import sleep, time
+
+from benchutil import log, percentile, tempdir, zotero_db
+
+QUERIES = (u'bayesian', u'climate model', u'data', u'evid', u'history',
+           u'learning net', u'policy', u'quantum theory', u'soc', u'urban')
+
+
+# Settings of `zothero.db` for each mode
+SETTINGS = {
+    'legacy': dict(JOURNAL_MODE='DELETE', CACHED_STATEMENTS=128,
+                   PRAGMAS=(), READ_PRAGMAS=()),
+    'tuned': {},
+}
+
+
+def configure(mode):
+    """Apply settings of ``mode`` to `zothero.db`."""
+    from zothero import db
+    if not SETTINGS['tuned']:  # save defaults
+        SETTINGS['tuned'] = {k: getattr(db, k) for k in SETTINGS['legacy']}
+
+    for k, v in SETTINGS[mode].items():
+        setattr(db, k, v)
+
+
+def reindex(datadir, path, mode, started, stop):
+    """Re-index until ``stop`` is set."""
+    from zothero.index import Index
+    from zothero.zotero import Zotero
+
+    configure(mode)
+    idx = Index(path)
+    zot = Zotero(datadir)
+    started.set()
+    while not stop.is_set():
+        idx._update(zot, force=True)
+
+
+def run(path, index=None, n=200):
+    """Run ``n`` searches and return latencies and number of errors."""
+    from zothero.index import Index
+
+    times, errors = [], 0
+    for i in range(n):
+        q = QUERIES[i % len(QUERIES)]
+        start = time()
+        try:
+            (index or Index(path)).search(q)
+        except sqlite3.OperationalError as err:
+            log('error: %s', err)
+            errors += 1
+            continue
+
+        times.append(time() - start)
+        sleep(0.005)  # time between keystrokes
+
+    return times, errors
+
+
+def report(name, times, errors):
+    """Log latency percentiles."""
+    if not times:
+        log('[%-28s] all queries failed', name)
+        return
+    log('[%-28s] p50=%7.2fms p95=%7.2fms max=%8.2fms errors=%d', name,
+        percentile(times, 50) * 1000, percentile(times, 95) * 1000,
+        max(times) * 1000, errors)
+
+
+def main(n_items, n_queries):
+    from zothero.index import Index
+    from zothero.zotero import Zotero
+
+    with tempdir() as datadir:
+        zotero_db(datadir, n_items)
+        for mode in ('legacy', 'tuned'):
+            configure(mode)
+            path = os.path.join(datadir, 'search-%s.sqlite' % mode)
+            Index(path).update(Zotero(datadir))
+
+            for writing in (False, True):
+                stop = multiprocessing.Event()
+                started = multiprocessing.Event()
+                p = None
+                if writing:
+                    p = multiprocessing.Process(
+                        target=reindex,
+                        args=(datadir, path, mode, started, stop))
+                    p.start()
+                    started.wait()
+
+                label = '%s, %s' % (mode, 'writer' if writing else 'idle')
+                report(label + ', cold', *run(path, n=n_queries))
+                report(label + ', warm', *run(path, Index(path), n_queries))
+
+                if p:
+                    stop.set()
+                    p.join()
+
+
+if __name__ == '__main__':
+    if os.getenv('VERBOSE'):
+        logging.basicConfig(level=logging.DEBUG)
+    args = [int(s) for s in sys.argv[1:]]
+    main(args[0] if args else 10000, args[1] if len(args) > 1 else 200)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-29
+#
+
+"""Benchmark search latency with and without ``zh.py daemon``.
+
+Compares running ``zh.py search`` as a new process (as Alfred does
+without the daemon) with running ``zhc.py search`` against a warm
+daemon. Also reports the latency of the socket round trip alone.
+
+Usage: bench_daemon.py [<items>]
+"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import subprocess
+import sys
+from time import sleep, time
+
+from benchutil import SRC, log, percentile, tempdir, zotero_db
+from bench_zh_search import QUERIES, alfred_env, run_zh
+
+REPS = 30
+
+
+def run_zhc(env, *args):
+    """Run ``zhc.py`` in a subprocess and return its output."""
+    cmd = [sys.executable, os.path.join(SRC, 'zhc.py')] + list(args)
+    return subprocess.check_output(cmd, env=env, cwd=SRC,
+                                   stderr=subprocess.DEVNULL)
+
+
+def report(name, n, times):
+    """Log p50 and p99 of ``times``."""
+    log('[%d items] %-20s p50=%6.1fms p99=%6.1fms', n, name,
+        percentile(times, 50) * 1000, percentile(times, 99) * 1000)
+
+
+def measure(func, *args):
+    """Call ``func`` `REPS` times for each query. Return durations."""
+    times = []
+    for q in QUERIES:
+        for _ in range(REPS):
+            start = time()
+            func(*(args + ('search', q)))
+            times.append(time() - start)
+    return times
+
+
+def main(n):
+    sys.path.insert(0, SRC)
+    import zhc
+
+    with tempdir() as dirpath:
+        os.makedirs(os.path.join(dirpath, 'zotero', 'styles'))
+        zotero_db(os.path.join(dirpath, 'zotero'), n)
+        env = alfred_env(dirpath)
+        env['USE_DAEMON'] = '1'
+        env['TMPDIR'] = dirpath
+        run_zh(env, 'reindex')
+
+        report('cold process', n, measure(run_zh, env))
+
+        os.environ.update(env)  # for `zhc.socket_path` & `zhc.request`
+
+        cmd = [sys.executable, os.path.join(SRC, 'zh.py'), 'daemon']
+        daemon = subprocess.Popen(cmd, env=env, cwd=SRC,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            path = zhc.socket_path(env['alfred_workflow_cache'])
+            while not os.path.exists(path):
+                sleep(0.01)
+
+            assert run_zhc(env, 'search', QUERIES[0]) == \
+                run_zh(env, 'search', QUERIES[0])
+
+            report('zhc.py + daemon', n, measure(run_zhc, env))
+
+            report('socket only', n,
+                   measure(lambda *args: zhc.request(path, list(args))))
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-01
+#
+
+"""Benchmark removing deleted items from the search index.
+
+Fills an index with cheap placeholder rows for every item in a
+synthetic Zotero library, moves 1% of the items to the trash, then
+times removing them the old way (sets of all item IDs in Python and
+one ``DELETE`` per ID) and the new way (an anti-join against the
+Zotero database attached to the index connection). Python memory allocated
+is measured with `tracemalloc`.
+
+Usage: bench_deletions.py [<items>...]
+"""
+
+from __future__ import print_function, absolute_import
+
+import logging
+import os
+import shutil
+import sys
+import tracemalloc
+
+from benchutil import log, tempdir, timed, zotero_db
+
+# Fraction of items moved to the trash
+TRASHED = 0.01
+
+
+def fill(idx, zot):
+    """Add a placeholder entry to ``idx`` for each item in ``zot``."""
+    from zothero.index import COLUMNS
+
+    blank = (u'x',) * len(COLUMNS)
+    with timed('fill index'), idx.cursor() as c:
+        for id_ in zot.ids():
+            c.execute(u'INSERT INTO entries VALUES (?, {})'.format(
+                u', '.join(u'?' * len(COLUMNS))), (id_,) + blank)
+            c.execute(u'INSERT INTO data VALUES (?, ?)', (id_, u'{}'))
+            c.execute(u'INSERT INTO modified VALUES (?, ?)',
+                      (id_, u'2017-01-01 00:00:00'))
+            c.execute(u'INSERT INTO hits VALUES (?, ?, 1, ?, ?, 2017, ?, 0, '
+                      u'?, ?)', (id_, u'KEY', u'book', u'x', u'[]', u'[]',
+                                 u''))
+
+
+def trash(zot):
+    """Move `TRASHED` of the items in ``zot`` to the trash."""
+    with zot.conn as c:
+        c.execute(u"""INSERT OR IGNORE INTO deletedItems (itemID)
+                      SELECT itemID FROM items
+                      WHERE itemID % ? = 0""", (int(1 / TRASHED),))
+
+
+def old(idx, zot):
+    """Remove deleted items like `Index._update` used to."""
+    with idx.cursor() as c:
+        index_ids = {row['id'] for row in c.execute(u'SELECT id FROM data')}
+        zot_ids = set(zot.ids())
+        gone = index_ids - zot_ids
+        for table in ('entries', 'data', 'hits', 'modified'):
+            c.executemany(u'DELETE FROM {} WHERE id = ?'.format(table),
+                          [(id_,) for id_ in gone])
+    return len(gone)
+
+
+def new(idx, zot):
+    """Remove deleted items like `Index._update` does now."""
+    from zothero.index import DELETE_SQL, GONE_SQL
+
+    with idx.attached(zot.dbpath), idx.cursor() as c:
+        c.execute(u'DELETE FROM temp.gone')
+        gone = c.execute(GONE_SQL).rowcount
+        for sql in DELETE_SQL:
+            c.execute(sql)
+    return gone
+
+def main(sizes):
+    from zothero.index import Index
+    from zothero.zotero import Zotero
+
+    for n in sizes:
+        with tempdir() as dirpath:
+            zotero_db(dirpath, n, deleted=0)
+            zot = Zotero(dirpath)
+            base = os.path.join(dirpath, 'base.sqlite')
+            idx = Index(base)
+            fill(idx, zot)
+            idx.conn.close()
+            trash(zot)
+
+            for func in (old, new):
+                name = func.__name__
+                # Memory is measured separately, as tracing slows Python
+                for traced in (False, True):
+                    path = os.path.join(dirpath, name + '.sqlite')
+                    shutil.copyfile(base, path)
+                    idx = Index(path)
+                    idx.conn  # open before measuring
+                    zot = Zotero(dirpath)
+                    if traced:
+                        tracemalloc.start()
+                        gone = func(idx, zot)
+                        _, peak = tracemalloc.get_traced_memory()
+                        tracemalloc.stop()
+                        log('[%6d items, %s] %d deleted, '
+                            'peak Python memory=%0.2fMB',
+                            n, name, gone, peak / 1048576.0)
+                    else:
+                        with timed('%6d items, %s' % (n, name)):
+                            func(idx, zot)
+                    idx.conn.close()
+                    zot.conn.close()
+
+
+if __name__ == '__main__':
+    if os.getenv('VERBOSE'):
+        logging.basicConfig(level=logging.DEBUG)
+    main([int(s) for s in sys.argv[1:]] or [100000])
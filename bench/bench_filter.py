@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Benchmark `Workflow.filter()` against `filtering.FilterIndex`.
+
+Replays typing traces over synthetic titles and times each keystroke
+with `Workflow.filter()` (``filter``) and `FilterIndex.search()`
+(``index``), with all results and with ``max_results`` (``top``).
+Results are checked to be the same.
+
+Also times building the index and saving it to and loading it from
+the workflow's cache.
+
+Usage: bench_filter.py [<items>...]
+"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import random
+import sys
+from time import time
+
+from benchutil import log, percentile, tempdir, timed
+from bench_zh_search import alfred_env
+
+QUERIES = (u'climate model', u'okon', u'müller', u'bmh', u'smith data 12')
+TOP = 50
+
+
+def trace():
+    """Queries run while ``QUERIES`` are typed."""
+    for q in QUERIES:
+        for i in range(1, len(q) + 1):
+            yield q[:i]
+
+
+def titles(n, seed=1):
+    """Return ``n`` synthetic titles."""
+    from zothero.tests.fixtures import SURNAMES, WORDS
+
+    rnd = random.Random(seed)
+    items = []
+    for i in range(n):
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(2, 6))]
+        if rnd.random() < 0.5:
+            words[0] = words[0].title()
+        items.append(u'{} {} ({})'.format(rnd.choice(SURNAMES),
+                                          u' '.join(words), i))
+    return items
+
+
+def keystrokes(func):
+    """Return times of calling ``func`` for each query in `trace()`."""
+    times = []
+    for q in trace():
+        start = time()
+        func(q)
+        times.append(time() - start)
+    return times
+
+
+def main(sizes):
+    from workflow import Workflow3
+    from zothero.filtering import FilterIndex
+
+    with tempdir() as dirpath:
+        os.environ.update(alfred_env(dirpath))
+        wf = Workflow3()
+        for n in sizes:
+            items = titles(n)
+            with timed('%d items, build' % n):
+                index = FilterIndex(items)
+            with timed('%d items, save' % n):
+                wf.cache_data('filter', index)
+            with timed('%d items, load' % n):
+                index = wf.cached_data('filter', max_age=0)
+
+            for q in trace():
+                for kw in (dict(min_score=30), dict(max_results=TOP)):
+                    assert index.search(q, include_score=True, **kw) == \
+                        wf.filter(q, items, include_score=True, **kw), q
+
+            for name, func in (
+                    ('filter', lambda q: wf.filter(q, items, min_score=30)),
+                    ('index', lambda q: index.search(q, min_score=30)),
+                    ('filter top', lambda q: wf.filter(q, items,
+                                                       max_results=TOP)),
+                    ('index top', lambda q: index.search(q,
+                                                         max_results=TOP))):
+                times = keystrokes(func)
+                log('[%d items] %-10s %d keystrokes: p50=%8.2fms '
+                    'p95=%8.2fms total=%7.2fs', n, name, len(times),
+                    percentile(times, 50) * 1000,
+                    percentile(times, 95) * 1000, sum(times))
+
+
+if __name__ == '__main__':
+    main([int(s) for s in sys.argv[1:]] or [10000, 100000])
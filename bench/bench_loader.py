@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-24
+#
+
+"""Benchmark loading entries from the Zotero database.
+
+Compares loading each item with its own set of queries (the old
+per-item path) with loading items in batches via `Zotero.all_entries()`.
+
+Usage: bench_loader.py [<items>...]
+"""
+
+from __future__ import print_function, absolute_import
+
+import sys
+
+from benchutil import log, tempdir, timed, zotero_db
+
+
+def main(sizes):
+    from zothero.zotero import ITEMS_SQL, Zotero
+
+    for n in sizes:
+        with tempdir() as dirpath:
+            zotero_db(dirpath, n)
+            zot = Zotero(dirpath)
+
+            times = []
+            with timed('%6d items, per-item' % n, times):
+                rows = zot.conn.execute(ITEMS_SQL).fetchall()
+                for row in rows:
+                    zot._load_entries([row])
+
+            with timed('%6d items, bulk' % n, times):
+                count = sum(1 for _ in zot.all_entries())
+
+            log('[%6d items] %d entries, %0.1fx faster', n, count,
+                times[0] / times[1])
+
+
+if __name__ == '__main__':
+    main([int(s) for s in sys.argv[1:]] or [1000, 10000, 40000])
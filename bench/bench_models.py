@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-27
+#
+
+"""Benchmark memory use and attribute access of the data models.
+
+Loads entries from a synthetic Zotero database, then measures the
+memory needed to hold them as the old dict-based models and as the
+slotted `zothero.models` classes, and the time taken to read every
+entry's creators' names.
+
+Usage: bench_models.py [<items>]
+"""
+
+from __future__ import print_function, absolute_import
+
+import gc
+import sys
+import tracemalloc
+
+from benchutil import best, log, tempdir, zotero_db
+
+
+class AttrDict(dict):
+    """The dict-based model that `zothero.models.Model` replaced."""
+
+    def __getattr__(self, key):
+        if key not in self:
+            raise AttributeError(key)
+        return self[key]
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+def legacy_entry(d):
+    """Create an old-style `Entry` from ``Entry.to_dict()`` data."""
+    e = AttrDict(d)
+    e.creators = [AttrDict(c) for c in e.creators]
+    e.collections = [AttrDict(c) for c in e.collections]
+    e.attachments = [AttrDict(a) for a in e.attachments]
+    return e
+
+
+def measure(func, data):
+    """Return result of ``func(data)`` and bytes allocated to it."""
+    gc.collect()
+    tracemalloc.start()
+    result = [func(d) for d in data]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def read_names(entries):
+    """Access attributes the way the search results code does."""
+    for e in entries:
+        u' '.join(c.family for c in e.creators if c.type == 'author')
+        e.title, e.year, e.key
+
+
+def main(n):
+    from zothero.models import Entry
+    from zothero.zotero import Zotero
+
+    with tempdir() as dirpath:
+        zotero_db(dirpath, n)
+        data = [e.to_dict() for e in Zotero(dirpath).all_entries()]
+
+    log('[%d entries]', len(data))
+    sizes = {}
+    for name, func in (('AttrDict', legacy_entry),
+                       ('slots', Entry.from_dict)):
+        entries, size = measure(func, data)
+        sizes[name] = size
+        log('[%-8s] %7.1f MB, %4d bytes/entry, attributes %0.3fs', name,
+            size / 1048576.0, size / len(entries),
+            best(lambda: read_names(entries)))
+        del entries
+
+    log('[slots] %0.0f%% smaller', 100.0 * (1 - sizes['slots'] /
+                                            sizes['AttrDict']))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Benchmark narrowing the previous results while a word is typed.
+
+Replays keystroke traces: each query is typed a character at a time
+and searched for with `Index.search()`, either in full each time
+(``full``) or, like ``zh.py search``, within the results of the
+previous query when `narrows()` says that's allowed and the previous
+results weren't truncated (``narrow``).
+
+Usage: bench_narrow.py [<items>]
+"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import sys
+from time import time
+
+from benchutil import log, percentile, tempdir, zotero_db
+
+# Words match thousands of synthetic entries, so only queries with
+# an author and a year have few enough results to be narrowed
+QUERIES = (u'climate model', u'quantum', u'müller policy',
+           u'smithson 2017 climate', u'tanaka 2015 survey',
+           u'chen 2014 network', u'okafor 2016 bayesian inference')
+
+
+def trace():
+    """Lists of queries run while each of ``QUERIES`` is typed."""
+    for q in QUERIES:
+        yield [q[:i] for i in range(1, len(q) + 1)]
+
+
+def replay(idx, narrow):
+    """Search for all prefixes in `trace()`.
+
+    Returns:
+        tuple: List of search times, indices of narrowed searches
+            and IDs of the results of each search.
+
+    """
+    from zothero.index import SEARCH_LIMIT, narrows
+
+    times, narrowed, ids = [], [], []
+    for queries in trace():
+        last = None
+        for q in queries:
+            within = None
+            if narrow and last and last[2] and narrows(last[0], q):
+                within = last[1]
+                narrowed.append(len(times))
+
+            start = time()
+            hits = idx.search(q, within)
+            times.append(time() - start)
+            last = (q, [h.id for h in hits], len(hits) < SEARCH_LIMIT)
+            ids.append(last[1])
+
+    return times, narrowed, ids
+
+
+def main(n):
+    from zothero.index import Index
+    from zothero.zotero import Zotero
+
+    with tempdir() as dirpath:
+        zotero_db(dirpath, n)
+        for fts in ('fts5', 'fts4'):
+            idx = Index(os.path.join(dirpath, 'search-%s.sqlite' % fts),
+                        fts=fts)
+            idx.update(Zotero(dirpath))
+            idx.search(u'warm up')
+
+            results, times = {}, {}
+            for narrow in (False, True):
+                times[narrow], narrowed, results[narrow] = replay(idx, narrow)
+                t = times[narrow]
+                log('[%d items] %s %-6s %d searches: total=%6.0fms '
+                    'p50=%5.1fms p95=%5.1fms', n, fts,
+                    'narrow' if narrow else 'full', len(t), sum(t) * 1000,
+                    percentile(t, 50) * 1000, percentile(t, 95) * 1000)
+
+            assert results[True] == results[False], 'results differ'
+            for narrow in (False, True):
+                t = [times[narrow][i] for i in narrowed]
+                log('[%d items] %s %-6s %d narrowable searches: '
+                    'total=%6.1fms p50=%5.1fms max=%5.1fms', n, fts,
+                    'narrow' if narrow else 'full', len(t), sum(t) * 1000,
+                    percentile(t, 50) * 1000, max(t) * 1000)
+            idx.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-03
+#
+
+"""Benchmark extracting the text of notes.
+
+Generates notes like those Zotero creates from PDF annotations
+(highlights with JSON-laden attributes and citations), then reports
+the throughput in MB/s of HTML of:
+
+    htmlparser  `notes.HTMLText` (what ZotHero used before)
+    regex       `notes.strip_tags()`
+    cache-cold  `notes.NoteCache` with an empty cache
+    cache-warm  `notes.NoteCache` with all notes cached
+
+Usage: bench_notes.py [<notes> [<kb>]]
+"""
+
+from __future__ import print_function, absolute_import
+
+import json
+import os
+import random
+import sys
+
+from benchutil import best, log, tempdir
+
+WORDS = (u'the of model bayesian inference prior posterior data sample '
+         u'variance estimate likelihood café naïve “quoted” & < >').split()
+
+ANNOTATION = (u'<p><span class="highlight" data-annotation="{ann}">'
+              u'&ldquo;{text}&rdquo;</span> <span class="citation" '
+              u'data-citation="{cit}">(<span class="citation-item">'
+              u'Smith, 2017, p. {page}</span>)</span> {comment}</p>\n')
+
+
+def escape(s):
+    """Escape text for HTML."""
+    return (s.replace(u'&', u'&amp;').replace(u'<', u'&lt;')
+            .replace(u'>', u'&gt;').replace(u'"', u'&quot;'))
+
+
+def make_note(rnd, size):
+    """HTML of an annotation note of about ``size`` characters."""
+    parts = [u'<div data-schema-version="8"><h1>Annotations</h1>\n']
+    n = 0
+    while n < size:
+        text = escape(u' '.join(rnd.choice(WORDS) for _ in range(40)))
+        ann = escape(json.dumps({
+            'attachmentURI': 'http://zotero.org/users/1/items/ABCD1234',
+            'annotationKey': '%08X' % rnd.getrandbits(32),
+            'color': '#ffd400', 'pageLabel': str(rnd.randint(1, 300)),
+            'position': {'pageIndex': rnd.randint(0, 300),
+                         'rects': [[rnd.random() * 500 for _ in range(4)]]},
+        }))
+        cit = escape(json.dumps({'citationItems': [
+            {'uris': ['http://zotero.org/users/1/items/ABCD1234']}]}))
+        comment = escape(u' '.join(rnd.choice(WORDS) for _ in range(8)))
+        p = ANNOTATION.format(ann=ann, text=text, cit=cit,
+                              page=rnd.randint(1, 300), comment=comment)
+        parts.append(p)
+        n += len(p)
+
+    parts.append(u'</div>')
+    return u''.join(parts)
+
+
+def main(count, kb):
+    from zothero.notes import HTMLText, NoteCache, strip_tags
+
+    rnd = random.Random(1)
+    notes = [make_note(rnd, kb * 1024) for _ in range(count)]
+    mb = sum(len(s.encode('utf-8')) for s in notes) / 1048576.0
+    log('%d notes, %0.1fMB of HTML', count, mb)
+
+    for s in notes:
+        assert strip_tags(s) == HTMLText.strip(s)
+
+    def report(name, t):
+        log('[%-10s] %8.3fs  %8.1f MB/s', name, t, mb / t)
+
+    report('htmlparser', best(lambda: [HTMLText.strip(s) for s in notes], 3))
+    report('regex', best(lambda: [strip_tags(s) for s in notes], 3))
+
+    with tempdir() as dirpath:
+        paths = iter(os.path.join(dirpath, 'notes-%d.sqlite' % i)
+                     for i in range(100))
+
+        def cold():
+            cache = NoteCache(next(paths))
+            cache.texts(notes)
+            cache.close()
+
+        report('cache-cold', best(cold, 3))
+
+        cache = NoteCache(os.path.join(dirpath, 'warm.sqlite'))
+        cache.texts(notes)
+        report('cache-warm', best(lambda: cache.texts(notes), 3))
+        cache.close()
+
+
+if __name__ == '__main__':
+    args = [int(s) for s in sys.argv[1:]]
+    main(args[0] if args else 50, args[1] if len(args) > 1 else 300)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-02
+#
+
+"""Benchmark a full reindex with different numbers of workers.
+
+Times building the index rows alone (`parallel.iter_rows()`) and a
+full reindex (`Index._update()`) of a synthetic library, with each
+number of worker processes. Writing to the index happens in one
+process, so it limits how much a full reindex can speed up.
+
+Usage: bench_parallel.py [<items> [<workers>...]]
+"""
+
+from __future__ import print_function, absolute_import
+
+import logging
+import multiprocessing
+import os
+import sys
+
+from benchutil import log, tempdir, timed, zotero_db
+
+
+def main(n, counts):
+    from zothero.index import Index
+    from zothero.parallel import iter_rows
+    from zothero.zotero import Zotero
+
+    log('%d CPUs', multiprocessing.cpu_count())
+    with tempdir() as dirpath:
+        zotero_db(dirpath, n)
+        zot = Zotero(dirpath)
+        for workers in counts:
+            times = []
+            with timed('%6d items, %d worker(s), build rows' % (n, workers),
+                       times):
+                for _ in iter_rows(zot, 'json', workers):
+                    pass
+
+            path = os.path.join(dirpath, 'search-%d.sqlite' % workers)
+            idx = Index(path, workers=workers)
+            with timed('%6d items, %d worker(s), full reindex' %
+                       (n, workers), times):
+                idx._update(zot, True)
+
+            log('[%6d items, %d worker(s)] %0.0f entries/s (rows only)',
+                n, workers, n / times[0])
+
+
+if __name__ == '__main__':
+    if os.getenv('VERBOSE'):
+        logging.basicConfig(level=logging.DEBUG)
+    args = [int(s) for s in sys.argv[1:]]
+    main(args[0] if args else 100000, args[1:] or [1, 2, 4, 8])
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-24
+#
+
+"""Benchmark the FTS4 matchinfo ranking function.
+
+Compares `index.make_rank_func` with the original ``struct``-based
+implementation for 1-, 2- and 5-phrase queries.
+"""
+
+from __future__ import print_function, absolute_import
+
+import random
+import struct
+
+from benchutil import best, log
+
+CALLS = 100000
+
+
+def struct_rank(weights):
+    """Original ``struct.unpack``-based ranking function."""
+    def rank(matchinfo):
+        bufsize = len(matchinfo)
+        matchinfo = [struct.unpack(b'I', matchinfo[i:i + 4])[0]
+                     for i in range(0, bufsize, 4)]
+        it = iter(matchinfo[2:])
+        return sum(x[0] * w / x[1]
+                   for x, w in zip(zip(it, it, it), weights)
+                   if x[1])
+
+    return rank
+
+
+def main():
+    from zothero.index import WEIGHTINGS, make_rank_func
+
+    rnd = random.Random(1)
+    funcs = (('struct', struct_rank(WEIGHTINGS)),
+             ('memoryview', make_rank_func(WEIGHTINGS)))
+
+    for phrases in (1, 2, 5):
+        values = [phrases, len(WEIGHTINGS)]
+        for _ in range(phrases * len(WEIGHTINGS)):
+            values += [rnd.randint(0, 5), rnd.randint(5, 500),
+                       rnd.randint(1, 100)]
+        blob = struct.pack('%dI' % len(values), *values)
+
+        for name, func in funcs:
+            t = best(lambda: [func(blob) for _ in range(CALLS)])
+            log('[%d phrase(s)] %-10s %0.2fus/row', phrases, name,
+                t / CALLS * 10 ** 6)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-24
+#
+
+"""Benchmark reindexing a synthetic Zotero library.
+
+Times a full reindex, then an update after one note is edited.
+
+Usage: bench_reindex.py [<items>...]
+"""
+
+from __future__ import print_function, absolute_import
+
+import logging
+import os
+import sys
+
+from benchutil import log, tempdir, timed, zotero_db
+
+
+def main(sizes):
+    from zothero.index import Index
+    from zothero.util import peak_rss
+    from zothero.zotero import Zotero
+
+    for n in sizes:
+        with tempdir() as dirpath:
+            zotero_db(dirpath, n)
+            zot = Zotero(dirpath)
+            idx = Index(os.path.join(dirpath, 'search.sqlite'))
+
+            with timed('%6d items, full reindex' % n):
+                idx._update(zot, True)
+
+            log('[%6d items] index=%0.1fMB, peak RSS=%0.1fMB', n,
+                os.path.getsize(idx.dbpath) / 1048576.0,
+                peak_rss() / 1048576.0)
+
+            with zot.conn as c:
+                c.execute("""UPDATE itemNotes SET note = '<p>edited</p>'
+                             WHERE itemID = (SELECT MIN(itemID)
+                                             FROM itemNotes)""")
+                c.execute("""UPDATE items
+                             SET clientDateModified = '2030-01-01 00:00:00'
+                             WHERE itemID = (SELECT MIN(itemID)
+                                             FROM itemNotes)""")
+
+            with timed('%6d items, one note edited' % n):
+                idx._update(zot)
+
+
+if __name__ == '__main__':
+    if os.getenv('VERBOSE'):
+        logging.basicConfig(level=logging.INFO)
+    main([int(s) for s in sys.argv[1:]] or [1000, 10000])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-06
+#
+
+"""Benchmark ``zh.py search`` with and without the result cache.
+
+Replays a keystroke trace: each query is typed a character at a
+time, and Alfred runs ``zh.py search`` for each prefix. While the
+index is being updated, Alfred also re-runs the last query every
+0.2 seconds (``RERUNS`` times here). Searches are run in this
+process, like ``zh.py daemon`` does.
+
+Usage: bench_results.py [<items>]
+"""
+
+from __future__ import print_function, absolute_import
+
+import io
+import logging
+import os
+import sys
+from contextlib import redirect_stdout
+from time import time
+
+from benchutil import SRC, log, percentile, tempdir, zotero_db
+from bench_zh_search import alfred_env, run_zh
+
+QUERIES = (u'climate model', u'smith 2017', u'quantum')
+
+# Times the final query is repeated by Alfred's re-runs
+RERUNS = 5
+
+
+def trace():
+    """Queries Alfred runs while ``QUERIES`` are typed."""
+    for q in QUERIES:
+        for i in range(1, len(q) + 1):
+            yield q[:i]
+        for _ in range(RERUNS):
+            yield q
+
+
+def search(zh, query):
+    """Run ``zh.py search <query>`` in this process."""
+    from workflow import Workflow3
+
+    sys.argv = ['zh.py', 'search', query]
+    zh.wf = Workflow3()
+    zh.log = zh.wf.logger
+    start = time()
+    with redirect_stdout(io.StringIO()):
+        zh.main(zh.wf)
+    return time() - start
+
+
+def main(n):
+    with tempdir() as dirpath:
+        os.makedirs(os.path.join(dirpath, 'zotero', 'styles'))
+        zotero_db(os.path.join(dirpath, 'zotero'), n)
+        env = alfred_env(dirpath)
+        run_zh(env, 'reindex')
+
+        os.environ.update(env)
+        sys.path.insert(0, SRC)
+        import zh
+        from zothero.results import ResultCache
+        logging.disable(logging.INFO)
+
+        fetch = ResultCache.fetch
+        for cached in (False, True):
+            if not cached:
+                ResultCache.fetch = lambda self, n, k, g, func: func()
+            else:
+                ResultCache.fetch = fetch
+
+            search(zh, u'warm up')
+            times = [search(zh, q) for q in trace()]
+            log('[%d items] cache=%-5s %d searches: total=%6.0fms '
+                'p50=%5.1fms p95=%5.1fms', n, cached, len(times),
+                sum(times) * 1000, percentile(times, 50) * 1000,
+                percentile(times, 95) * 1000)
+
+        import zothero
+        for name, s in sorted(zothero.app.results.stats().items()):
+            log('[%d items] %-6s hit rate=%3.0f%% hit=%5.1fms miss=%5.1fms',
+                n, name, s['hit_rate'] * 100, s['hit_ms'], s['miss_ms'])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-24
+#
+
+"""Benchmark search query latency for FTS5 and FTS4 indexes.
+
+Usage: bench_search.py [<items>...]
+"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import sys
+from time import time
+
+from benchutil import log, percentile, tempdir, timed, zotero_db
+
+REPS = 5
+
+QUERIES = {
+    1: [u'bayesian', u'smith', u'network', u'climate'],
+    2: [u'bayesian smith', u'network model', u'urban policy',
+        u'quantum theory'],
+    5: [u'bayesian smith model network theory',
+        u'urban policy growth markets evidence',
+        u'quantum theory structure dynamics systems',
+        u'social survey data analysis review'],
+}
+
+
+def build(dirpath, n):
+    """Create FTS5 and FTS4 indexes of ``n`` items."""
+    from zothero.index import Index
+    from zothero.zotero import Zotero
+
+    zotero_db(dirpath, n)
+    zot = Zotero(dirpath)
+    indexes = {}
+    for fts in ('fts5', 'fts4'):
+        idx = Index(os.path.join(dirpath, fts + '.sqlite'), fts)
+        if not indexes:
+            with timed('%6d items, build %s index' % (n, fts)):
+                idx._update(zot, True)
+        else:  # copy data from first index
+            src = list(indexes.values())[0]
+            with timed('%6d items, build %s index' % (n, fts)):
+                with idx.conn as c:
+                    c.execute('ATTACH DATABASE ? AS src', (src.dbpath,))
+                    for table in ('entries', 'data', 'modified'):
+                        c.execute('INSERT INTO {0} SELECT * FROM src.{0}'
+                                  .format(table))
+                idx.conn.execute('DETACH DATABASE src')
+
+        indexes[fts] = idx
+
+    return indexes
+
+
+def main(sizes):
+    for n in sizes:
+        with tempdir() as dirpath:
+            indexes = build(dirpath, n)
+
+            for fts, idx in sorted(indexes.items()):
+                for k, queries in sorted(QUERIES.items()):
+                    times = []
+                    hits = 0
+                    for _ in range(REPS):
+                        for q in queries:
+                            start = time()
+                            hits += len(idx._search(q))
+                            times.append(time() - start)
+
+                    log('[%6d items] %s, %d term(s): p50=%0.2fms '
+                        'p99=%0.2fms (%d hits/query)', n, fts, k,
+                        percentile(times, 50) * 1000,
+                        percentile(times, 99) * 1000,
+                        hits / len(times))
+
+
+if __name__ == '__main__':
+    main([int(s) for s in sys.argv[1:]] or [10000, 50000, 100000])
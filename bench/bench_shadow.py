@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-05
+#
+
+"""Benchmark searches during a full re-index.
+
+A separate process re-indexes a synthetic library over and over,
+either by re-writing the live index in one transaction (``in-place``,
+like ZotHero used to) or by building a new database and renaming
+it over the index (``shadow``, `Index._rebuild()`). This process
+searches the index with a new `Index` for each query (``cold``) and
+with the same one (``warm``).
+
+Queries that fail (e.g. "database is locked") are counted as errors.
+
+Usage: bench_shadow.py [<items> [<queries>]]
+"""
+
+from __future__ import print_function, absolute_import
+
+from itertools import chain
+import logging
+import multiprocessing
+import os
+import sys
+
+from benchutil import tempdir, zotero_db
+from bench_concurrent import report, run
+
+
+def rebuild_in_place(idx, zot):
+    """Re-index all entries in the live index."""
+    from zothero.index import OPTIMIZE_SQL
+    from zothero.parallel import iter_rows
+
+    with idx.attached(zot.dbpath), idx.cursor() as c:
+        rows = chain.from_iterable(iter_rows(zot, idx.codec.name))
+        idx._write(c, rows)
+        c.execute(OPTIMIZE_SQL)
+
+
+def reindex(datadir, path, mode, started, stop):
+    """Re-index until ``stop`` is set."""
+    from zothero.index import Index
+    from zothero.zotero import Zotero
+
+    idx = Index(path)
+    zot = Zotero(datadir)
+    started.set()
+    while not stop.is_set():
+        if mode == 'shadow':
+            idx._update(zot, force=True)
+        else:
+            rebuild_in_place(idx, zot)
+
+
+def main(n_items, n_queries):
+    from zothero.index import Index
+    from zothero.zotero import Zotero
+
+    with tempdir() as datadir:
+        zotero_db(datadir, n_items)
+        for mode in ('in-place', 'shadow'):
+            path = os.path.join(datadir, 'search-%s.sqlite' % mode)
+            Index(path).update(Zotero(datadir))
+
+            stop = multiprocessing.Event()
+            started = multiprocessing.Event()
+            p = multiprocessing.Process(
+                target=reindex, args=(datadir, path, mode, started, stop))
+            p.start()
+            started.wait()
+
+            report(mode + ', cold', *run(path, n=n_queries))
+            report(mode + ', warm', *run(path, Index(path), n_queries))
+
+            stop.set()
+            p.join()
+
+
+if __name__ == '__main__':
+    if os.getenv('VERBOSE'):
+        logging.basicConfig(level=logging.DEBUG)
+    args = [int(s) for s in sys.argv[1:]]
+    main(args[0] if args else 10000, args[1] if len(args) > 1 else 200)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-31
+#
+
+"""Benchmark updating a snapshot of a large Zotero database.
+
+Creates a synthetic ``zotero.sqlite`` padded to <size> MB, snapshots
+it, then changes one row and times updating the snapshot with each
+method. Bytes written are as reported by `Snapshot` and, on Linux,
+by the kernel (``wchar`` in ``/proc/self/io``, which includes
+SQLite's journal).
+
+The ``copy`` method is what ZotHero did before (copy the whole file).
+
+Usage: bench_snapshot.py [<size>]
+"""
+
+from __future__ import print_function, absolute_import
+
+import logging
+import os
+import sqlite3
+import sys
+from time import time
+
+from benchutil import log, tempdir, zotero_db
+
+# Size of padding rows
+BLOB_SIZE = 64 * 1024
+
+
+def pad(path, size):
+    """Add rows to database at ``path`` until it's ``size`` bytes."""
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('CREATE TABLE padding (id INTEGER PRIMARY KEY, data)')
+        n = max(0, (size - os.path.getsize(path)) // BLOB_SIZE)
+        conn.executemany('INSERT INTO padding (data) VALUES (?)',
+                         ((os.urandom(BLOB_SIZE),) for _ in range(n)))
+    conn.close()
+
+
+def change_one_row(path, i):
+    """Change one value in database at ``path``."""
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("""UPDATE itemDataValues SET value = ?
+                        WHERE valueID = 1""", ('changed %d' % i,))
+    conn.close()
+
+
+def wchar():
+    """Bytes written by this process or ``None`` if unknown."""
+    try:
+        with open('/proc/self/io') as fp:
+            for line in fp:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def main(size):
+    from zothero.snapshot import METHODS, Snapshot
+
+    with tempdir() as dirpath:
+        source = zotero_db(dirpath, 2000)
+        pad(source, size * 1048576)
+        log('database: %0.1fMB', os.path.getsize(source) / 1048576.0)
+
+        for i, method in enumerate(METHODS):
+            snap = Snapshot(source, os.path.join(dirpath, method + '.sqlite'),
+                            (method,))
+            snap.update()
+
+            os.utime(source)
+            start = time()
+            snap.update()
+            d = time() - start
+            log('[%-6s] touched only:    %8.3fms', method, d * 1000)
+
+            change_one_row(source, i)
+            w = wchar()
+            start = time()
+            snap.update()
+            d = time() - start
+            w = wchar() - w if w is not None else 0
+            log('[%-6s] one-row change: %8.3fs, written=%0.2fMB '
+                '(kernel: %0.2fMB)', method, d, snap.written / 1048576.0,
+                w / 1048576.0)
+
+
+if __name__ == '__main__':
+    if os.getenv('VERBOSE'):
+        logging.basicConfig(level=logging.DEBUG)
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
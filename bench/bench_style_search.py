@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Benchmark filtering styles in the style pickers.
+
+``zh.py citations`` and ``zh.py style`` run for every keystroke.
+This replays typing traces over synthetic styles the size of Zotero's
+style repository and times each keystroke:
+
+- ``get+filter``: `Workflow.filter()` over all styles loaded with a
+  query per style (as ZotHero used to).
+- ``all+filter``: `Workflow.filter()` over `Styles.all()`.
+- ``search``: `Styles.search()`.
+
+Usage: bench_style_search.py [<styles>]
+"""
+
+from __future__ import print_function, absolute_import
+
+from operator import attrgetter
+import os
+import sys
+from time import time
+
+from benchutil import log, percentile, tempdir
+from bench_zh_search import alfred_env
+
+QUERIES = (u'climate model', u'journal of', u'cmd', u'zeitgeist 12')
+
+
+def trace():
+    """Queries run while ``QUERIES`` are typed."""
+    for q in QUERIES:
+        for i in range(1, len(q) + 1):
+            yield q[:i]
+
+
+def get_filter(wf, styles, query):
+    """Load styles one at a time and filter them."""
+    items = [styles.store.get(k) for k in styles.store.keys()]
+    items = [s for s in items if not s.hidden]
+    return wf.filter(query, items, key=attrgetter('name'), min_score=30)
+
+
+def all_filter(wf, styles, query):
+    """Load all styles at once and filter them."""
+    return wf.filter(query, styles.all(), key=attrgetter('name'),
+                     min_score=30)
+
+
+def search(wf, styles, query):
+    """Search the index of style names."""
+    return styles.search(query)
+
+
+def main(n):
+    from workflow import Workflow3
+    from zothero.styles import Styles
+    from zothero.tests.fixtures import make_styles
+
+    with tempdir() as dirpath:
+        os.environ.update(alfred_env(dirpath))
+        wf = Workflow3()
+        stylesdir = os.path.join(dirpath, 'styles')
+        make_styles(stylesdir, n)
+        styles = Styles(stylesdir, os.path.join(dirpath, 'cache'))
+        styles.update()
+
+        for name, func in (('get+filter', get_filter),
+                           ('all+filter', all_filter),
+                           ('search', search)):
+            times = []
+            for q in trace():
+                start = time()
+                func(wf, styles, q)
+                times.append(time() - start)
+
+            log('[%d styles] %-10s %d keystrokes: p50=%7.2fms '
+                'p95=%7.2fms max=%7.2fms', n, name, len(times),
+                percentile(times, 50) * 1000, percentile(times, 95) * 1000,
+                max(times) * 1000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
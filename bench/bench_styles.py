@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Benchmark loading CSL styles.
+
+Creates a directory of synthetic styles the size of Zotero's style
+repository and times `Styles.update()` with an empty cache
+(``cold``), with ``workers`` processes to parse the styles, again
+with nothing changed (``warm``), and after a style has been added
+(``added``).
+
+Also compares reading the metadata of all styles by parsing the whole
+file (``tree``, like ZotHero used to) with `styles.read_info()`,
+which only parses the <info> header.
+
+Usage: bench_styles.py [<styles> [<workers>]]
+"""
+
+from __future__ import print_function, absolute_import
+
+import logging
+import os
+import sys
+
+from benchutil import log, tempdir, timed
+
+
+def parse_tree(path):
+    """Read style metadata by parsing the whole file."""
+    import xml.etree.ElementTree as ET
+    from zothero.styles import NS
+
+    root = ET.parse(path)
+    info = dict(name=root.find('.//{%s}title' % NS).text)
+    for elem in root.findall('.//{%s}link' % NS):
+        rel = elem.attrib.get('rel')
+        if rel == 'self':
+            info['url'] = elem.attrib.get('href')
+        elif rel == 'independent-parent':
+            info['parent_url'] = elem.attrib.get('href')
+
+    return info
+
+
+def load(stylesdir, cachedir, workers=None):
+    """Update styles in ``cachedir`` from ``stylesdir``."""
+    from zothero.styles import Styles
+
+    styles = Styles(stylesdir, cachedir, workers)
+    styles.update()
+    return styles
+
+
+def main(n, workers):
+    from zothero.styles import read_info
+    from zothero.tests.fixtures import make_styles
+
+    with tempdir() as dirpath:
+        stylesdir = os.path.join(dirpath, 'styles')
+        with timed('create %d styles' % n):
+            make_styles(stylesdir, n)
+
+        paths = [os.path.join(stylesdir, fn) for fn in os.listdir(stylesdir)]
+        for name, func in (('tree', parse_tree), ('read_info', read_info)):
+            with timed('%d styles, %s' % (n, name)):
+                for path in paths:
+                    func(path)
+
+        for w in sorted({1, workers}):
+            cachedir = os.path.join(dirpath, 'cache-%d' % w)
+            with timed('%d styles, cold, workers=%d' % (n, w)):
+                styles = load(stylesdir, cachedir, w)
+
+        with timed('%d styles, warm' % n):
+            styles = load(stylesdir, cachedir)
+
+        make_styles(stylesdir, 1, seed=2)
+        with timed('%d styles, added' % n):
+            styles = load(stylesdir, cachedir)
+
+        log('[%d styles] %d loaded', n, len(list(styles.all(True))))
+
+
+if __name__ == '__main__':
+    if os.getenv('VERBOSE'):
+        logging.basicConfig(level=logging.DEBUG)
+    args = [int(s) for s in sys.argv[1:]]
+    main(args[0] if args else 10000, args[1] if len(args) > 1 else 4)
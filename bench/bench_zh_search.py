@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-24
+#
+
+"""Benchmark ``zh.py search`` end to end.
+
+Runs ``zh.py search <query>`` against a synthetic Zotero library, both
+as a new process (as Alfred does) and in-process under `tracemalloc`
+to count memory allocations.
+
+Usage: bench_zh_search.py [<items>]
+"""
+
+from __future__ import print_function, absolute_import
+
+import io
+import logging
+import os
+import subprocess
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+from time import time
+
+from benchutil import SRC, log, percentile, tempdir, zotero_db
+
+REPS = 20
+QUERIES = (u'bayesian', u'smith model', u'qua')
+
+
+def alfred_env(dirpath):
+    """Environment variables for running ``zh.py`` outside Alfred."""
+    env = dict(os.environ)
+    for name in ('cache', 'data'):
+        path = os.path.join(dirpath, name)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        env['alfred_workflow_' + name] = path
+
+    env.update(alfred_workflow_bundleid='net.deanishe.zothero.bench',
+               alfred_workflow_version='0.0',
+               ZOTERO_DIR=os.path.join(dirpath, 'zotero'))
+    return env
+
+
+def run_zh(env, *args):
+    """Run ``zh.py`` in a subprocess and return its output."""
+    cmd = [sys.executable, os.path.join(SRC, 'zh.py')] + list(args)
+    return subprocess.check_output(cmd, env=env, cwd=SRC,
+                                   stderr=subprocess.DEVNULL)
+
+
+def in_process(env, *args):
+    """Run ``zh.py`` in this process. Return (seconds, allocations)."""
+    os.environ.update(env)
+    sys.argv = ['zh.py'] + list(args)
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+
+    import zh
+    from workflow import Workflow3
+
+    zh.wf = Workflow3()
+    zh.log = zh.wf.logger
+    logging.disable(logging.INFO)
+
+    tracemalloc.start()
+    start = time()
+    with redirect_stdout(io.StringIO()):
+        zh.main(zh.wf)
+    d = time() - start
+    n = sum(s.count for s in tracemalloc.take_snapshot().statistics('lineno'))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return d, n, peak
+
+
+def main(n):
+    with tempdir() as dirpath:
+        os.makedirs(os.path.join(dirpath, 'zotero', 'styles'))
+        zotero_db(os.path.join(dirpath, 'zotero'), n)
+        env = alfred_env(dirpath)
+        run_zh(env, 'reindex')
+
+        for q in QUERIES:
+            times = []
+            for _ in range(REPS):
+                start = time()
+                run_zh(env, 'search', q)
+                times.append(time() - start)
+
+            log('[%d items] zh.py search %-12r process: p50=%0.1fms '
+                'p99=%0.1fms', n, q, percentile(times, 50) * 1000,
+                percentile(times, 99) * 1000)
+
+        for q in QUERIES:
+            in_process(env, 'search', q)  # warm up imports
+            d, count, peak = in_process(env, 'search', q)
+            log('[%d items] zh.py search %-12r in-process: %0.1fms, '
+                '%d live blocks, peak %0.1fKB traced', n, q, d * 1000,
+                count, peak / 1024.0)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
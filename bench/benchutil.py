@@ -0,0 +1,83 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-24
+#
+
+"""Helpers shared by the ZotHero benchmarks.
+
+Importing this module puts the workflow's ``lib`` directory on
+``sys.path``, so benchmarks can import `zothero` directly.
+"""
+
+from __future__ import print_function, absolute_import
+
+from contextlib import contextmanager
+import os
+import shutil
+import sys
+import tempfile
+from time import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), 'src')
+LIB = os.path.join(SRC, 'lib')
+
+sys.path.insert(0, LIB)
+
+
+def log(s, *args):
+    """Simple STDERR logger."""
+    if args:
+        s = s % args
+    print(s, file=sys.stderr)
+
+
+@contextmanager
+def timed(name, times=None):
+    """Log execution time of block and append it to ``times``."""
+    start = time()
+    yield
+    d = time() - start
+    log('[%s] %0.3fs', name, d)
+    if times is not None:
+        times.append(d)
+
+
+def best(func, reps=5):
+    """Return fastest of ``reps`` calls to ``func`` in seconds."""
+    times = []
+    for _ in range(reps):
+        start = time()
+        func()
+        times.append(time() - start)
+    return min(times)
+
+
+def percentile(times, p):
+    """Return ``p``th percentile of ``times``."""
+    times = sorted(times)
+    i = int(round((len(times) - 1) * p / 100.0))
+    return times[i]
+
+
+@contextmanager
+def tempdir():
+    """Temporary directory that is deleted afterwards."""
+    path = tempfile.mkdtemp(prefix='zothero-bench-')
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+
+def zotero_db(dirpath, n_items, **kwargs):
+    """Create a synthetic ``zotero.sqlite`` in ``dirpath``."""
+    from zothero.tests.fixtures import make_zotero_db
+    path = os.path.join(dirpath, 'zotero.sqlite')
+    with timed('create %d-item zotero.sqlite' % n_items):
+        make_zotero_db(path, n_items, **kwargs)
+    return path
@@ -17,11 +17,12 @@ from __future__ import print_function, absolute_import
 
 from contextlib import contextmanager
 import logging
-import os
 import re
 import sqlite3
 import time
 
+from .db import connect, delete
+
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
@@ -47,6 +48,17 @@ CREATE TABLE `{name}` (
 
 """
 
+# Insert or update a value
+SQL_UPSERT = u"""
+INSERT INTO `{table}` (`key`, `value`, `updated`) VALUES (?, ?, ?)
+    ON CONFLICT (`key`) DO UPDATE
+    SET `value` = excluded.`value`, `updated` = excluded.`updated`
+"""
+
+# Maximum number of keys per query in `Store.get_many()`. SQLite
+# older than 3.32 allows at most 999 parameters.
+BATCH_SIZE = 500
+
 # Convenience constants; currently unused
 FOREVER = 0
 ONE_MINUTE = 60
@@ -116,6 +128,38 @@ class Store(object):
         for row in self.conn.execute(sql):
             yield row['key']
 
+    def items(self):
+        """Iterate over all keys and values in one query.
+
+        Values are passed through `self.convert_out()`.
+
+        Yields:
+            tuple: ``(key, value)`` pairs.
+
+        """
+        sql = u"""
+            SELECT `key`, `value` FROM `{table}` WHERE 1
+        """.format(table=self.name)
+
+        for row in self.conn.execute(sql):
+            yield row['key'], self.convert_out(row['value'])
+
+    def values(self):
+        """Iterate over all values in one query.
+
+        Values are passed through `self.convert_out()`.
+
+        Yields:
+            obj: Objects deserialised from the database.
+
+        """
+        sql = u"""
+            SELECT `value` FROM `{table}` WHERE 1
+        """.format(table=self.name)
+
+        for row in self.conn.execute(sql):
+            yield self.convert_out(row['value'])
+
     def get(self, key, default=None):
         """Return value for `key` or `default`.
 
@@ -141,6 +185,31 @@ class Store(object):
 
         return default
 
+    def get_many(self, keys):
+        """Return values for ``keys``.
+
+        Passes results through `self.convert_out()`.
+
+        Args:
+            keys (iterable): Database keys.
+
+        Returns:
+            dict: Key -> value mapping. Absent keys are omitted.
+
+        """
+        keys = [self._validate_key(k) for k in keys]
+        values = {}
+        for i in range(0, len(keys), BATCH_SIZE):
+            batch = keys[i:i + BATCH_SIZE]
+            sql = u"""
+                SELECT `key`, `value` FROM `{table}` WHERE `key` IN ({qs})
+            """.format(table=self.name, qs=u', '.join(u'?' * len(batch)))
+
+            for row in self.conn.execute(sql, batch):
+                values[row['key']] = self.convert_out(row['value'])
+
+        return values
+
     def set(self, key, value):
         """Set value for key, passing `value` through `self.convert_in()`.
 
@@ -149,50 +218,59 @@ class Store(object):
             value (obj): Object to store in database.
 
         """
-        key = self._validate_key(key)
-        value = self.convert_in(value)
+        self.set_many([(key, value)])
 
-        with self.cursor() as c:
-            sql = u"""
-                UPDATE `{table}`
-                    SET `value` = ?, `updated` = ?
-                    WHERE key = ?
-            """.format(table=self.name)
+    def set_many(self, items):
+        """Set several values in one transaction.
 
-            c.execute(sql, (value, time.time(), key))
+        Values are passed through `self.convert_in()`.
 
-            if c.rowcount > 0:
-                log.debug(u'[%s] updated `%s` -> %r', self.name, key, value)
-                return
+        Args:
+            items (dict or iterable): Key -> value mapping or
+                ``(key, value)`` pairs.
 
-        with self.cursor() as c:
-            sql = u"""
-                INSERT INTO `{table}`
-                    (`key`, `value`, `updated`)
-                    VALUES (?, ?, ?)
-            """.format(table=self.name)
+        Returns:
+            int: Number of values set.
 
-            c.execute(sql, (key, value, time.time()))
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
 
-            if c.rowcount > 0:
-                log.debug(u'[%s] inserted `%s` -> %r', self.name, key, value)
-                return
+        now = time.time()
+        rows = [(self._validate_key(k), self.convert_in(v), now)
+                for k, v in items]
+
+        with self.cursor() as c:
+            c.executemany(SQL_UPSERT.format(table=self.name), rows)
 
-        log.error("[%s] couldn't save value for key %r", self.name, key)
+        if len(rows) == 1:
+            log.debug(u'[%s] set `%s`', self.name, rows[0][0])
+        else:
+            log.debug(u'[%s] set %d value(s)', self.name, len(rows))
+
+        return len(rows)
 
     def delete(self, key):
         """Remove item from store."""
+        return self.delete_many([key]) > 0
+
+    def delete_many(self, keys):
+        """Remove items from store in one transaction.
+
+        Args:
+            keys (iterable): Keys of items to remove.
+
+        Returns:
+            int: Number of items removed.
+
+        """
         sql = u"""
             DELETE FROM `{table}` WHERE `key` = ?
         """.format(table=self.name)
 
         with self.cursor() as c:
-            c.execute(sql, (key,))
-
-            if c.rowcount:
-                return True
-
-        return False
+            c.executemany(sql, [(k,) for k in keys])
+            return c.rowcount
 
     def updated(self, key=None):
         """Timestamp of last time ``key`` was updated.
@@ -276,8 +354,7 @@ class Cache(object):
     def conn(self):
         """Connection to database."""
         if not self._conn:
-            conn = sqlite3.connect(self.filepath)
-            conn.row_factory = sqlite3.Row
+            conn = connect(self.filepath)
             with conn as c:
                 try:
                     c.execute(u'SELECT * FROM `dbinfo`')
@@ -328,10 +405,10 @@ class Cache(object):
 
         """
         if name is None:  # Delete whole cache
-            try:
-                os.unlink(self.filepath)
-            except OSError:
-                pass
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+            delete(self.filepath)
             return
         elif name in self.caches:
             sql = u'DROP TABLE `{}`'.format(name)
@@ -15,7 +15,7 @@ import logging
 import os
 
 from .config import read as read_config
-from .util import copyifnewer, unicodify, shortpath
+from .util import unicodify, shortpath
 
 # Default location of Zotero's data in version 5
 DEFAULT_ZOTERO_DIR = u'~/Zotero'
@@ -23,6 +23,16 @@ DEFAULT_ZOTERO_DIR = u'~/Zotero'
 log = logging.getLogger(__name__)
 
 
+def _fileid(path):
+    """Return (inode, mtime) of ``path`` or (0, 0) if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0, 0
+
+    return st.st_ino, st.st_mtime
+
+
 class ZotHero(object):
     """Main application object.
 
@@ -30,6 +40,7 @@ class ZotHero(object):
 
       - `zotero.Zotero`
       - `index.Index`
+      - `results.ResultCache`
       - `styles.Styles`
 
     and provides a convenient, utility interface to them.
@@ -39,7 +50,8 @@ class ZotHero(object):
 
     """
 
-    def __init__(self, cachedir, zot_data_dir=None, zot_attachments_dir=None):
+    def __init__(self, cachedir, zot_data_dir=None, zot_attachments_dir=None,
+                 reindex_workers=None):
         """Create new `ZotHero` using ``cachedir``.
 
         Args:
@@ -50,9 +62,13 @@ class ZotHero(object):
                 attachments are stored in. This should be set to the
                 same as the "Linked Attachment Base Directory" set
                 in Zotero's preferences (if one is set).
+            reindex_workers (int, optional): Number of processes to
+                build the search index with when re-indexing all
+                entries. Defaults to the number of CPUs (max. 4).
 
         """
         self.cachedir = cachedir
+        self.reindex_workers = reindex_workers
 
         # Copy of Zotero database. Zotero locks the original, so
         # it's necessary to make a copy.
@@ -65,9 +81,14 @@ class ZotHero(object):
         self._zotero_dir = zot_data_dir or datadir
         # Zotero's attachment base
         self._attachments_dir = zot_attachments_dir or attachdir
+        self._snapshot = None  # Snapshot of Zotero database
         self._zot = None  # Zotero object
         self._index = None  # Index object
+        self._results = None  # ResultCache object
         self._styles = None  # Styles object
+        # Identities of the files the above objects were loaded from.
+        # See `refresh()`.
+        self._fileids = {}
 
         log.debug('[core] cachedir=%r', shortpath(cachedir))
         log.debug('[core] zotero_dir=%r', shortpath(self.zotero_dir))
@@ -125,9 +146,15 @@ class ZotHero(object):
                 raise ValueError('Zotero database not found: %r' % original)
 
             # Ensure cached copy of database is up to date
-            dbpath = copyifnewer(original, self._copy_path)
+            from .snapshot import Snapshot
+            self._snapshot = Snapshot(original, self._copy_path)
+            self._snapshot.update()
+            dbpath = self._snapshot.path
 
-            self._zot = Zotero(self.zotero_dir, dbpath, self.attachments_dir)
+            self._zot = Zotero(self.zotero_dir, dbpath, self.attachments_dir,
+                               notes_cache=os.path.join(self.cachedir,
+                                                        'notes.sqlite'))
+            self._fileids['zotero'] = _fileid(dbpath)
 
             # Validate paths by calling storage & styles properties
             log.debug('[core] storage=%r', shortpath(self._zot.storage_dir))
@@ -148,11 +175,30 @@ class ZotHero(object):
         """
         if not self._index:
             from .index import Index
-            self._index = Index(os.path.join(self.cachedir, 'search.sqlite'))
+            self._index = Index(os.path.join(self.cachedir, 'search.sqlite'),
+                                workers=self.reindex_workers)
             self._index.update(self.zotero)
+            self._fileids['index'] = _fileid(self._index.dbpath)
 
         return self._index
 
+    @property
+    def results(self):
+        """Cache of search results.
+
+        Returns:
+            .results.ResultCache: Cache shared by all processes.
+
+        """
+        if not self._results:
+            from .results import ResultCache
+            self._results = ResultCache(os.path.join(self.cachedir,
+                                                     'results.sqlite'))
+            self._results.conn  # create database
+            self._fileids['results'] = _fileid(self._results.dbpath)
+
+        return self._results
+
     @property
     def stale(self):
         """Return ``True`` if search index isn't up to date."""
@@ -161,14 +207,61 @@ class ZotHero(object):
 
         return self.zotero.last_updated > self.index.last_updated
 
-    def update_index(self, force=False):
-        """Update the search index."""
+    def refresh(self):
+        """Forget objects whose files have changed since they were loaded.
+
+        Long-running processes (i.e. ``zh.py daemon``) call this before
+        each request, so they see a changed Zotero database, a deleted
+        or rebuilt index, and added styles, as a new process would.
+        """
+        if self._zot:
+            # The copy may be updated in place (by this or another
+            # process), so a changed mtime means the open connection
+            # is reading a changed file.
+            fileid = self._fileids['zotero']
+            if fileid != _fileid(self._zot.dbpath) or self._snapshot.stale:
+                log.debug('[core] Zotero database changed')
+                self._zot = None
+
+        # Only a new file matters for the index: SQLite handles writes
+        # by other processes.
+        if self._index and \
+                self._fileids['index'][0] != _fileid(self._index.dbpath)[0]:
+            log.debug('[core] search index replaced')
+            self._index = None
+
+        if self._results and self._fileids['results'][0] != \
+                _fileid(self._results.dbpath)[0]:
+            log.debug('[core] result cache deleted')
+            self._results.close()
+            self._results = None
+
+        if self._styles and \
+                self._fileids['styles'] != _fileid(self._styles.dirpath):
+            log.debug('[core] styles changed')
+            self._styles = None
+
+    def update_index(self, force=False, workers=None):
+        """Update the search index.
+
+        Args:
+            force (bool, optional): Re-index all entries.
+            workers (int, optional): Number of processes to re-index
+                all entries with. Overrides ``reindex_workers``.
+
+        """
+        if workers:
+            self.index.workers = workers
         self.index.update(self.zotero, force)
 
     @property
     def styles(self):
         """CSL Styles loader.
 
+        Styles are read from the cache, which is only filled from
+        the styles directory if it's empty. Call `Styles.update()` to
+        load changed styles.
+
         Returns:
             .styles.Styles: `Styles` object pointing to the styles directory
             of :attr:`zotero`.
@@ -177,6 +270,11 @@ class ZotHero(object):
         if not self._styles:
             from .styles import Styles
             self._styles = Styles(self.zotero.styles_dir, self.cachedir)
+            self._fileids['styles'] = _fileid(self._styles.dirpath)
+            # There's nothing to show until the styles have been read.
+            # Afterwards, the caller updates them if they're `stale`.
+            if self._styles.empty:
+                self._styles.update()
 
         return self._styles
 
@@ -192,10 +290,40 @@ class ZotHero(object):
         """
         return self.index.entry(entry_id)
 
-    def search(self, query):
-        """Search the Zotero database."""
+    def search(self, query, within=None):
+        """Search the Zotero database.
+
+        The IDs of the results are cached until the index changes
+        (see `results`). Results of searches ``within`` previous
+        results aren't cached, as they depend on the previous query.
+
+        Args:
+            query (unicode): Query to search for.
+            within (list, optional): Only search entries with these
+                IDs. See `index.Index.search()`.
+
+        Returns:
+            list: `models.SearchHit` objects for matching entries.
+
+        """
+        from .results import normalise
+
         log.info(u'[core] searching for "%s" ...', query)
-        return self.index.search(query)
+        if within is not None:
+            return self.index.search(query, within)
+
+        # Read the generation first, so results found after an update
+        # aren't cached as those of the generation before it
+        generation = self.index.generation
+        hits = []
+
+        def _search():
+            hits.extend(self.index.search(query, within))
+            return [(h.id, h.score) for h in hits]
+
+        results = self.results.fetch(u'search', normalise(query),
+                                     generation, _search)
+        return hits or self.index.hits(results)
 
     def style(self, key):
         """Return CSL style for key."""
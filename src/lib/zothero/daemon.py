@@ -0,0 +1,204 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-29
+#
+
+"""Long-running server that answers queries from a warm process.
+
+``zh.py daemon`` runs a `Server`, which keeps `ZotHero`, its index
+connection and caches alive between keystrokes. ``zhc.py`` forwards
+Script Filter queries to it over a Unix domain socket, so each
+keystroke costs a connection instead of a Python startup and all
+the imports.
+
+Protocol: the client sends NUL-separated UTF-8 fields, then shuts
+down its side of the connection. The first field is the number of
+command-line arguments, followed by the arguments, followed by the
+client's environment as ``NAME=value`` fields. The server replies with
+a status line (``0`` for success) followed by the output of the
+command. Unlike JSON, this needs no imports in the client.
+"""
+
+from __future__ import print_function, absolute_import
+
+import errno
+import fcntl
+import logging
+import os
+import socket
+import zlib
+
+# Seconds the server waits for a request before exiting
+IDLE_TIMEOUT = 600.0
+
+# Seconds to wait for a client to send its request
+CLIENT_TIMEOUT = 5.0
+
+log = logging.getLogger(__name__)
+
+
+def socket_path(cachedir):
+    """Path of the daemon's socket for workflow cache ``cachedir``.
+
+    The socket lives in the temporary directory, not ``cachedir``,
+    as macOS limits socket paths to 104 bytes.
+
+    NOTE: ``zhc.py`` has its own copy of this function, so it needn't
+    import `zothero`. Keep them in sync.
+
+    Args:
+        cachedir (str): Workflow's cache directory.
+
+    Returns:
+        str: Path to Unix domain socket.
+
+    """
+    tmpdir = os.getenv('TMPDIR') or '/tmp'
+    name = 'zothero-{:08x}.sock'.format(zlib.crc32(cachedir.encode('utf-8')))
+    return os.path.join(tmpdir, name)
+
+
+def parse_request(data):
+    """Parse request sent by client.
+
+    Args:
+        data (bytes): Request. See module docstring for the format.
+
+    Returns:
+        tuple: List of arguments and dict of environment variables.
+
+    """
+    fields = data.decode('utf-8', 'surrogateescape').split(u'\0')
+    n = int(fields[0])
+    argv = fields[1:n + 1]
+    env = dict(f.split(u'=', 1) for f in fields[n + 1:])
+    return argv, env
+
+
+class Server(object):
+    """Answer requests on a Unix domain socket until idle.
+
+    Requests are handled one at a time, in the order they arrive.
+
+    Attributes:
+        path (str): Path to Unix domain socket.
+        handler (callable): Called with the ``argv`` and ``env`` of
+            each request. Returns the output of the command.
+        timeout (float): Idle timeout in seconds.
+        watch (list): Paths of files (i.e. the workflow's source code)
+            that stop the server when they change.
+
+    """
+
+    def __init__(self, path, handler, timeout=IDLE_TIMEOUT, watch=None):
+        """Create new `Server`.
+
+        Args:
+            path (str): Path to Unix domain socket.
+            handler (callable): Function to handle requests.
+            timeout (float, optional): Idle timeout in seconds.
+            watch (list, optional): Stop when any of these files change.
+
+        """
+        self.path = path
+        self.handler = handler
+        self.timeout = timeout
+        self.watch = list(watch or [])
+        self._mtimes = [os.path.getmtime(p) for p in self.watch]
+
+    @property
+    def changed(self):
+        """Return ``True`` if any of the watched files have changed."""
+        try:
+            return self._mtimes != [os.path.getmtime(p) for p in self.watch]
+        except OSError:
+            return True
+
+    def serve_forever(self):
+        """Handle requests until idle timeout or a watched file changes.
+
+        Returns:
+            bool: ``False`` if another server is already running.
+
+        """
+        # The lock is held for as long as the server is running,
+        # so only one server can own the socket.
+        lockfile = open(self.path + '.lock', 'w')
+        try:
+            fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as err:
+            if err.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            log.debug('[daemon] already running')
+            lockfile.close()
+            return False
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            if os.path.exists(self.path):  # left behind by a crash
+                os.unlink(self.path)
+
+            umask = os.umask(0o077)
+            try:
+                sock.bind(self.path)
+            finally:
+                os.umask(umask)
+
+            sock.listen(16)
+            sock.settimeout(self.timeout)
+            log.debug('[daemon] listening on %r', self.path)
+
+            while True:
+                try:
+                    conn, _ = sock.accept()
+                except socket.timeout:
+                    log.debug('[daemon] idle for %0.0fs, exiting',
+                              self.timeout)
+                    break
+
+                with conn:
+                    self.handle(conn)
+
+                if self.changed:
+                    log.debug('[daemon] source code changed, exiting')
+                    break
+
+        finally:
+            sock.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            lockfile.close()
+
+        return True
+
+    def handle(self, conn):
+        """Read request from ``conn``, call `handler` and send output.
+
+        Args:
+            conn (socket.socket): Client connection.
+
+        """
+        conn.settimeout(CLIENT_TIMEOUT)
+        try:
+            chunks = []
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                chunks.append(data)
+
+            argv, env = parse_request(b''.join(chunks))
+            output = self.handler(argv, env)
+            status = 0
+        except Exception as err:
+            log.exception('[daemon] request failed: %s', err)
+            output, status = u'', 1
+
+        try:
+            conn.sendall(u'{}\n{}'.format(status, output).encode('utf-8'))
+        except (OSError, socket.timeout) as err:
+            log.warning('[daemon] could not send reply: %s', err)
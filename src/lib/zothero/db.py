@@ -0,0 +1,206 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-04
+#
+
+"""Open ZotHero's own SQLite databases with tuned settings.
+
+`connect()` is used by `index.Index` and `cache.Cache`. Databases
+are put in WAL mode by default, so readers see the last committed
+data while another connection writes.
+
+The search index uses a rollback journal instead, because it is
+rebuilt in a separate file that `replace()` renames over the live
+one. SQLite finds a database's WAL files by name, so they would be
+shared by the old and new files.
+
+Every connection gets a larger page cache, keeps temporary tables
+in memory and caches more prepared statements. Read connections
+(``readonly=True``) also memory-map the database, and are
+``query_only``, so a bug can't turn a search into a write.
+
+Don't use `connect()` for Zotero's database: it belongs to Zotero,
+and switching it to WAL mode would change the file.
+"""
+
+from __future__ import print_function, absolute_import
+
+import logging
+import os
+import sqlite3
+
+log = logging.getLogger(__name__)
+
+# Journal mode of databases. WAL lets readers and a writer work at
+# the same time.
+JOURNAL_MODE = 'WAL'
+
+# Seconds to wait for a lock, e.g. while a WAL checkpoint runs
+TIMEOUT = 5.0
+
+# Prepared statements cached per connection (Python's default is 128)
+CACHED_STATEMENTS = 256
+
+# PRAGMAs for every connection. A negative cache_size is in KiB.
+# With WAL, synchronous=NORMAL can only lose the last transactions
+# on power failure, not corrupt the database, and everything in
+# ZotHero's databases can be rebuilt.
+PRAGMAS = (
+    ('cache_size', -16384),
+    ('temp_store', 'MEMORY'),
+    ('synchronous', 'NORMAL'),
+)
+
+# Additional PRAGMAs for read connections
+READ_PRAGMAS = (
+    ('mmap_size', 256 * 1024 * 1024),
+    ('query_only', 1),
+)
+
+# Extensions of the files SQLite creates next to a database in WAL
+# mode. They must be deleted along with the database.
+WAL_SUFFIXES = ('-wal', '-shm')
+
+# Extension of the rollback journal
+JOURNAL_SUFFIX = '-journal'
+
+
+def connect(path, readonly=False, timeout=TIMEOUT, journal_mode=None):
+    """Open SQLite database at ``path``.
+
+    Rows are returned as `sqlite3.Row` objects.
+
+    Args:
+        path (str): Path to database file.
+        readonly (bool, optional): Return a read connection.
+        timeout (float, optional): Seconds to wait for a lock.
+        journal_mode (str, optional): Journal mode of the database.
+            Defaults to `JOURNAL_MODE`.
+
+    Returns:
+        sqlite3.Connection: Connection to database.
+
+    """
+    conn = sqlite3.connect(path, timeout=timeout,
+                           cached_statements=CACHED_STATEMENTS)
+    conn.row_factory = sqlite3.Row
+
+    # Changing the journal mode needs a write lock, so only do it if
+    # it's necessary. The mode is stored in the database file.
+    journal_mode = journal_mode or JOURNAL_MODE
+    mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    if mode.lower() != journal_mode.lower():
+        try:
+            conn.execute('PRAGMA journal_mode = %s' % journal_mode)
+        except sqlite3.OperationalError as err:
+            log.warning('[db] could not set journal mode of %r: %s',
+                        path, err)
+
+    pragmas = PRAGMAS + READ_PRAGMAS if readonly else PRAGMAS
+    for name, value in pragmas:
+        conn.execute('PRAGMA %s = %s' % (name, value))
+
+    if journal_mode.upper() != 'WAL':
+        # With a rollback journal, synchronous=NORMAL can corrupt the
+        # database on power failure
+        conn.execute('PRAGMA synchronous = FULL')
+
+    return conn
+
+
+def wal_mtime(path):
+    """Time the database at ``path`` was last written to.
+
+    In WAL mode, changes are written to the ``-wal`` file and only
+    copied to the database file later, so its modification time
+    alone is out of date.
+
+    Args:
+        path (str): Path to database file.
+
+    Returns:
+        float: Latest modification time of the database and its WAL,
+            or 0.0 if the database doesn't exist.
+
+    """
+    t = 0.0
+    for p in (path, path + '-wal'):
+        try:
+            t = max(t, os.path.getmtime(p))
+        except OSError:
+            pass
+
+    return t
+
+
+def inode(path):
+    """Inode of database at ``path``.
+
+    A database that has been replaced (see `replace()`) has a
+    different inode. Connections to it must be reopened to see the
+    new file.
+
+    Args:
+        path (str): Path to database file.
+
+    Returns:
+        int: Inode number, or 0 if the database doesn't exist.
+
+    """
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return 0
+
+
+def _unlink(paths):
+    """Delete files that exist."""
+    for p in paths:
+        try:
+            os.unlink(p)
+        except OSError:
+            pass
+
+
+def delete(path):
+    """Delete database at ``path`` and its journal and WAL files.
+
+    Args:
+        path (str): Path to database file.
+
+    """
+    _unlink((path, path + JOURNAL_SUFFIX) +
+            tuple(path + s for s in WAL_SUFFIXES))
+
+
+def replace(src, dst):
+    """Atomically replace database ``dst`` with ``src``.
+
+    ``src`` must be closed and use a rollback journal. Connections
+    that are open to ``dst`` keep reading the old file until they
+    are reopened.
+
+    The caller must stop other connections writing to ``dst``: a
+    journal left by an unfinished transaction would otherwise be
+    "rolled back" into the new file. A journal left by a crashed
+    process is rolled back before ``dst`` is replaced. WAL files of
+    ``dst`` are deleted, as SQLite would apply them to the new file.
+
+    Args:
+        src (str): Path to new database.
+        dst (str): Path to database to replace.
+
+    """
+    if os.path.exists(dst + JOURNAL_SUFFIX) and os.path.exists(dst):
+        conn = sqlite3.connect(dst)
+        conn.execute('PRAGMA schema_version')  # rolls back hot journal
+        conn.close()
+
+    wal = tuple(dst + s for s in WAL_SUFFIXES)
+    _unlink(wal)
+    os.rename(src, dst)
+    _unlink(wal)
@@ -0,0 +1,295 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Fuzzy filtering of lists that are searched repeatedly.
+
+`FilterIndex` scores and sorts items exactly like `Workflow.filter()`,
+but it works out the search keys of the items (diacritic-folded keys,
+capitals, atoms and initials) once, not on every call. Instances can
+be pickled, so an index can be cached with `Workflow.cache_data()`.
+"""
+
+from __future__ import print_function, absolute_import
+
+import heapq
+import logging
+import re
+from unicodedata import normalize
+
+from workflow.workflow import (
+    ASCII_REPLACEMENTS,
+    INITIALS,
+    MATCH_ALL,
+    MATCH_ALLCHARS,
+    MATCH_ATOM,
+    MATCH_CAPITALS,
+    MATCH_INITIALS_CONTAIN,
+    MATCH_INITIALS_STARTSWITH,
+    MATCH_STARTSWITH,
+    MATCH_SUBSTRING,
+    isascii,
+    split_on_delimiters,
+)
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Version of the pickled data. Change it when the search keys change,
+# so cached indices are rebuilt.
+VERSION = 1
+
+
+def fold_to_ascii(text):
+    """Fold diacritics like `Workflow.fold_to_ascii()`.
+
+    Args:
+        text (unicode): Text to fold.
+
+    Returns:
+        unicode: Text with non-ASCII characters replaced.
+    """
+    if isascii(text):
+        return text
+
+    text = u''.join([ASCII_REPLACEMENTS.get(c, c) for c in text])
+    return normalize('NFKD', text)
+
+
+def search_keys(value):
+    """Return the keys the ``MATCH_*`` rules test ``value`` against.
+
+    Args:
+        value (unicode): (Folded) search key of an item.
+
+    Returns:
+        tuple: ``(value, lowercase value, capitals, atoms, initials)``.
+        ``atoms`` is a string of space-delimited atoms (which pickles
+        faster than a set). Query words contain no spaces.
+    """
+    atoms = [s.lower() for s in split_on_delimiters(value)]
+    return (value,
+            value.lower(),
+            u''.join([c for c in value if c in INITIALS]).lower(),
+            u' {} '.format(u' '.join(atoms)),
+            u''.join([s[0] for s in atoms if s]))
+
+
+def _allchars(query):
+    """Return search function matching all characters of ``query``."""
+    pattern = u''.join([u'.*?' + re.escape(c) for c in query])
+    return re.compile(pattern, re.IGNORECASE).search
+
+
+def _score(query, keys, match_on, search):
+    """Score search ``keys`` against ``query`` like `Workflow.filter()`.
+
+    Args:
+        query (unicode): Lowercase word of query.
+        keys (tuple): Keys returned by `search_keys()`.
+        match_on (int): ``MATCH_*`` rules to apply.
+        search (callable): `_allchars()` for ``query``.
+
+    Returns:
+        tuple: ``(score, rule)`` or ``(0, None)`` if nothing matched.
+    """
+    value, lower, capitals, atoms, initials = keys
+    n = len(query)
+
+    if match_on & MATCH_STARTSWITH and lower.startswith(query):
+        return 100.0 - (len(value) / n), MATCH_STARTSWITH
+
+    if match_on & MATCH_CAPITALS and capitals.startswith(query):
+        return 100.0 - (len(capitals) / n), MATCH_CAPITALS
+
+    if match_on & MATCH_ATOM and u' {} '.format(query) in atoms:
+        return 100.0 - (len(value) / n), MATCH_ATOM
+
+    if match_on & MATCH_INITIALS_STARTSWITH and initials.startswith(query):
+        return 100.0 - (len(initials) / n), MATCH_INITIALS_STARTSWITH
+
+    elif match_on & MATCH_INITIALS_CONTAIN and query in initials:
+        return 95.0 - (len(initials) / n), MATCH_INITIALS_CONTAIN
+
+    if match_on & MATCH_SUBSTRING and query in lower:
+        return 90.0 - (len(value) / n), MATCH_SUBSTRING
+
+    if match_on & MATCH_ALLCHARS:
+        if value.isascii() and u'\n' not in value:
+            # Find the characters in order, as the regex would, but
+            # without its backtracking. The match starts at 0.
+            end = 0
+            for c in query:
+                end = lower.find(c, end) + 1
+                if not end:
+                    return 0, None
+
+            return 100.0 / (end + 1), MATCH_ALLCHARS
+
+        m = search(value)
+        if m:
+            return (100.0 / ((1 + m.start()) * (m.end() - m.start() + 1)),
+                    MATCH_ALLCHARS)
+
+    return 0, None
+
+
+class FilterIndex(object):
+    """Items and their precomputed search keys.
+
+    Attributes:
+        items (list): The items that are filtered.
+    """
+
+    def __init__(self, items, key=lambda x: x):
+        """Create a new `FilterIndex` for ``items``.
+
+        Args:
+            items (iterable): Items to filter.
+            key (callable, optional): Function that returns the search
+                key of an item (as for `Workflow.filter()`).
+        """
+        self.items = list(items)
+        # Indices of items with a (non-empty) search key
+        self._keyed = []
+        # Lowercase keys to sort items with the same score by
+        self._sortkeys = []
+        # Search keys and bitmasks of the characters in their lowercase
+        # versions, unfolded and folded. Folded keys are the same
+        # objects if the key is ASCII.
+        self._keys = ([], [])
+        self._chars = ([], [])
+        # Bits of characters in `_chars`
+        self._bits = {}
+
+        for i, item in enumerate(self.items):
+            value = key(item).strip()
+            self._sortkeys.append(value.lower())
+            if not value:
+                for l in self._keys + self._chars:
+                    l.append(None)
+                continue
+
+            self._keyed.append(i)
+            keys = search_keys(value)
+            chars = self._mask(keys[1], True)
+            folded = fold_to_ascii(value)
+            self._keys[0].append(keys)
+            self._chars[0].append(chars)
+            if folded != value:
+                keys = search_keys(folded)
+                chars = self._mask(keys[1], True)
+
+            self._keys[1].append(keys)
+            self._chars[1].append(chars)
+
+    def _mask(self, s, add=False):
+        """Return bitmask of the characters in ``s``.
+
+        Args:
+            s (unicode): String to return mask for.
+            add (bool, optional): Assign bits to new characters. If
+                ``False``, return ``None`` if ``s`` contains a character
+                no item does.
+
+        Returns:
+            int: Bitmask.
+        """
+        mask = 0
+        for c in set(s):
+            bit = self._bits.get(c)
+            if bit is None:
+                if not add:
+                    return None
+                bit = self._bits[c] = 1 << len(self._bits)
+            mask |= bit
+
+        return mask
+
+    def __len__(self):
+        """Number of items."""
+        return len(self.items)
+
+    def search(self, query, ascending=False, include_score=False,
+               min_score=0, max_results=0, match_on=MATCH_ALL,
+               fold_diacritics=True):
+        """Fuzzy search items.
+
+        Takes the same arguments and returns the same results as
+        `Workflow.filter()` (items with equal keys and scores are in
+        the order they were added).
+
+        Args:
+            query (unicode): Query to filter items by.
+            ascending (bool, optional): Return worst matches first.
+            include_score (bool, optional): Return ``(item, score, rule)``
+                tuples instead of items.
+            min_score (int, optional): Drop items with a lower score.
+            max_results (int, optional): Return at most this many items.
+                Only this many results are sorted.
+            match_on (int, optional): ``MATCH_*`` rules to apply.
+            fold_diacritics (bool, optional): Fold non-ASCII characters
+                in the search keys if the query is ASCII.
+
+        Returns:
+            list: Matching items.
+        """
+        query = query.strip()
+        if not query:
+            return self.items[:]
+
+        candidates = self._keyed
+        totals = {}
+        rules = {}
+
+        for word in query.split(u' '):
+            word = word.strip().lower()
+            if not word:
+                continue
+
+            fold = 1 if fold_diacritics and isascii(word) else 0
+            keys = self._keys[fold]
+            chars = self._chars[fold]
+            search = _allchars(word)
+            # Skip items that don't contain all characters of the word
+            # before applying the rules
+            need = self._mask(word)
+            if need is None:
+                return []
+            candidates = [i for i in candidates if chars[i] & need == need]
+
+            matched = []
+            for i in candidates:
+                s, rule = _score(word, keys[i], match_on, search)
+                if s:  # items must match every word
+                    matched.append(i)
+                    totals[i] = totals.get(i, 0) + s
+                    rules[i] = rule
+
+            candidates = matched
+
+        sortkeys = self._sortkeys
+        results = [(100.0 / totals[i], sortkeys[i], totals[i], i)
+                   for i in candidates if totals[i]]
+        if min_score:
+            results = [t for t in results if t[2] > min_score]
+
+        if max_results and len(results) > max_results:
+            select = heapq.nlargest if ascending else heapq.nsmallest
+            results = select(max_results, results)
+        else:
+            results.sort(reverse=ascending)
+
+        log.debug(u'[filter] %d/%d item(s) match "%s"',
+                  len(results), len(self.items), query)
+
+        if include_score:
+            return [(self.items[i], score, rules[i])
+                    for _, _, score, i in results]
+
+        return [self.items[t[3]] for t in results]
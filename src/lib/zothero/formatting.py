@@ -56,51 +56,82 @@ class EntryFormatter(object):
             unicode: Formatted list of creators.
 
         """
-        n = len(self.e.creators)
-        if n == 0:
-            return u'xxx.'
+        return format_creators(self.e.creators)
 
-        creators = []
-        for c in self.e.creators:
-            name = c.family
-            i = c.index
-            if c.type == 'editor':
-                name += ' (ed.)'
-            elif c.type == 'translator':
-                name += ' (trans.)'
+    @property
+    def year(self):
+        """Formatted year.
 
-            creators.append((i, name))
+        Returns "xxx." if year is unset, otherwise "YYYY."
 
-        # Sort creators by index priority, then alphabetically
-        creators.sort()
-        names = [t[1] for t in creators]
+        Returns:
+            unicode: Formatted year.
 
-        if n == 1:
-            ref = names[0]
+        """
+        return format_year(self.e.year)
 
-        elif n == 2:
-            ref = ' and '.join(names)
 
-        else:
-            ref = ', '.join(names[:-1])
-            ref = u'{}, and {}'.format(ref, names[-1])
+def format_creators(creators):
+    """Properly formatted authors.
 
-        if ref and ref[-1] not in '.!?':
-            ref += '.'
+    Returns 'xxx.' if there are no creators, otherwise joins
+    them with commas & "and", and adds a full stop.
 
-        return ref
+    Args:
+        creators (list): `models.Creator` objects.
 
-    @property
-    def year(self):
-        """Formatted year.
+    Returns:
+        unicode: Formatted list of creators.
 
-        Returns "xxx." if year is unset, otherwise "YYYY."
+    """
+    n = len(creators)
+    if n == 0:
+        return u'xxx.'
 
-        Returns:
-            unicode: Formatted year.
+    names = []
+    for c in creators:
+        name = c.family
+        i = c.index
+        if c.type == 'editor':
+            name += ' (ed.)'
+        elif c.type == 'translator':
+            name += ' (trans.)'
 
-        """
-        if not self.e.year:
-            return 'xxx.'
+        names.append((i, name))
+
+    # Sort creators by index priority, then alphabetically
+    names.sort()
+    names = [t[1] for t in names]
+
+    if n == 1:
+        ref = names[0]
+
+    elif n == 2:
+        ref = ' and '.join(names)
+
+    else:
+        ref = ', '.join(names[:-1])
+        ref = u'{}, and {}'.format(ref, names[-1])
+
+    if ref and ref[-1] not in '.!?':
+        ref += '.'
+
+    return ref
+
+
+def format_year(year):
+    """Formatted year.
+
+    Returns "xxx." if year is unset, otherwise "YYYY."
+
+    Args:
+        year (int): Year of publication.
+
+    Returns:
+        unicode: Formatted year.
+
+    """
+    if not year:
+        return 'xxx.'
 
-        return str(self.e.year) + '.'
+    return str(year) + '.'
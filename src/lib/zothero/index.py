@@ -12,27 +12,65 @@
 from __future__ import print_function, absolute_import
 
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
+import fcntl
+from itertools import chain
 import logging
-import os
+import re
 import sqlite3
-import struct
-from urllib.parse import urlparse
+import time
 
-from .util import dt2sqlite, timed, time_since, shortpath
-from .zotero import Entry
+from .db import connect, delete, inode, replace, wal_mtime
+from .formatting import format_creators
+from .models import SearchHit
+from .serialise import CODECS, DEFAULT_CODEC, get_codec
+from .util import (batched, dt2sqlite, sqlite2dt, timed, time_since,
+                   shortpath)
 
 # Version of the database schema/data format.
 # Increment this every time the schema or JSON format changes to
 # invalidate the existing cache.
-DB_VERSION = 8
+DB_VERSION = 14
+
+# Number of entries written to the index in each batch. When the
+# live index is updated, each batch is a separate transaction.
+BATCH_SIZE = 500
+
+# Journal mode of the index. Not WAL, as a full re-index builds a new
+# database and renames it over the old one (see `zothero.db`).
+JOURNAL_MODE = 'DELETE'
+
+# Extension of the file a full re-index is built in
+SHADOW_SUFFIX = '.new'
+
+# Maximum number of characters of an entry's notes added to the
+# full-text index. Longer notes are truncated.
+NOTES_MAX_LENGTH = 200000
+
+# Search database column names
+COLUMNS = ('title', 'year', 'creators', 'authors', 'editors', 'tags',
+           'collections', 'attachments', 'notes', 'abstract', 'all')
+
+# Search weightings for columns. The first column (key) is ignored (0.0)
+# collections, attachments, notes, abstract and all have lower weightings.
+# "all" is particularly low-ranked to avoid polluting results
+WEIGHTINGS = (0.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 0.5, 0.4, 0.3, 0.3, 0.1)
 
 # SQL schema for the search database. The Entry is also stored in the
-# database as JSON for speed (it takes 7 SQL queries to retrieve an
-# Entry from the Zotero database).
+# database for speed (it takes 7 SQL queries to retrieve an Entry from
+# the Zotero database), serialised with the codec named in `dbinfo`
+# (see `zothero.serialise`). The data needed to show search
+# results are stored in `hits`, so `Index.search` needn't decode
+# the JSON of every result.
+#
+# The text of the search columns is stored once in `entries`. The
+# full-text index `search` is an external-content table that reads
+# the text from `entries` and is kept in sync by triggers (see
+# `FTS_SCHEMA`). The ID of each entry is its rowid in both tables.
 INDEX_SCHEMA = """
-CREATE VIRTUAL TABLE search USING fts3(
-    `id`, `title`, `year`, `creators`, `authors`, `editors`,
+CREATE TABLE entries (
+    `id` INTEGER PRIMARY KEY NOT NULL,
+    `title`, `year`, `creators`, `authors`, `editors`,
     `tags`, `collections`, `attachments`, `notes`, `abstract`, `all`
 );
 
@@ -43,43 +81,325 @@ CREATE TABLE modified (
 
 CREATE TABLE data (
     id INTEGER PRIMARY KEY NOT NULL,
-    json TEXT DEFAULT "{}"
+    value NOT NULL
+);
+
+CREATE TABLE hits (
+    id INTEGER PRIMARY KEY NOT NULL,
+    key TEXT NOT NULL,
+    library INTEGER NOT NULL,
+    type TEXT,
+    title TEXT,
+    year INTEGER,
+    creators TEXT,
+    attachments INTEGER,
+    notes TEXT,
+    citekey TEXT
 );
 
+CREATE TABLE fingerprints (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+
 CREATE TABLE dbinfo (
     key TEXT PRIMARY KEY NOT NULL,
     value TEXT NOT NULL
-)
+);
 """
 
+# Columns of `entries` and `search`
+_COLS = u', '.join(u'`{}`'.format(c) for c in ('id',) + COLUMNS)
+_NEW = u', '.join(u'new.`{}`'.format(c) for c in ('id',) + COLUMNS)
+_OLD = u', '.join(u'old.`{}`'.format(c) for c in ('id',) + COLUMNS)
+
+# Full-text index using FTS5 (preferred) or FTS4, if SQLite wasn't
+# compiled with FTS5. The FTS4 table uses the same (FTS3) ranking as
+# earlier versions of the index. Both have prefix indexes for 2- and
+# 3-character prefixes to speed up the prefix search in `SEARCH_SQL`.
+FTS_SCHEMA = {
+    'fts5': u"""
+CREATE VIRTUAL TABLE search USING fts5(
+    `id` UNINDEXED, `title`, `year`, `creators`, `authors`, `editors`,
+    `tags`, `collections`, `attachments`, `notes`, `abstract`, `all`,
+    content='entries', content_rowid='id', prefix='2 3'
+);
+
+CREATE TRIGGER entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO search (rowid, {cols}) VALUES (new.id, {new});
+END;
+
+CREATE TRIGGER entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO search (search, rowid, {cols})
+        VALUES ('delete', old.id, {old});
+END;
+
+-- Use column weightings for the "rank" column
+INSERT INTO search (search, rank) VALUES ('rank', 'bm25({weights})');
+""",
+    'fts4': u"""
+CREATE VIRTUAL TABLE search USING fts4(
+    `id`, `title`, `year`, `creators`, `authors`, `editors`,
+    `tags`, `collections`, `attachments`, `notes`, `abstract`, `all`,
+    content='entries', notindexed=id, prefix='2,3'
+);
+
+CREATE TRIGGER entries_bd BEFORE DELETE ON entries BEGIN
+    DELETE FROM search WHERE docid = old.id;
+END;
+
+CREATE TRIGGER entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO search (docid, {cols}) VALUES (new.id, {new});
+END;
+""",
+}
+
 log = logging.getLogger(__name__)
 
-SEARCH_SQL = """
-SELECT search.id AS id, json, rank(matchinfo(search)) AS score
-FROM search
-LEFT JOIN data ON search.id = data.id
-WHERE search MATCH ?
-ORDER BY score DESC
-LIMIT 100
+# Maximum number of search results
+SEARCH_LIMIT = 100
+
+# Match the query both as-is and with the last term as a prefix
+# (e.g. "smith 20" and "smith 20*") in one query. Exact matches are
+# boosted above prefix-only matches, and entries matching both are
+# only returned once (with their exact-match score).
+#
+# {hits} is replaced with a query returning the IDs and scores of the
+# top :limit entries matching the MATCH expression {match}.
+SEARCH_SQL = u"""
+SELECT hits.*, score
+FROM (
+    SELECT id, MAX(boost) AS boost, score
+    FROM (
+        SELECT * FROM ({exact})
+        UNION ALL
+        SELECT * FROM ({prefix})
+    )
+    GROUP BY id
+    ORDER BY boost DESC, score DESC
+    LIMIT :limit
+) AS matches
+LEFT JOIN hits ON matches.id = hits.id
+ORDER BY boost DESC, score DESC
 """
 
+HITS_SQL = {
+    # FTS5 ranks results natively via the `rank` column
+    'fts5': u"""
+        SELECT rowid AS id, {boost} AS boost, -rank AS score
+        FROM search
+        WHERE search MATCH {match} {within}
+        ORDER BY rank
+        LIMIT :limit
+    """,
+    # FTS4 ranks via the `rank` function created by `make_rank_func`
+    'fts4': u"""
+        SELECT docid AS id, {boost} AS boost,
+               rank(matchinfo(search)) AS score
+        FROM search
+        WHERE search MATCH {match} {within}
+        ORDER BY score DESC
+        LIMIT :limit
+    """,
+}
+
+# Restrict `HITS_SQL` to the entries with IDs {ids}. The unary "+"
+# stops FTS5 running the query once for each ID, which is much
+# slower than filtering its matches. FTS4 looks up IDs quickly.
+WITHIN_SQL = {
+    'fts5': u'AND +rowid IN ({ids})',
+    'fts4': u'AND docid IN ({ids})',
+}
+
+
+def search_sql(module, within=None):
+    """Search query for FTS module ``module``.
+
+    Args:
+        module (str): "fts5" or "fts4".
+        within (list, optional): Only search entries with these IDs.
+
+    Returns:
+        str: SQL query with ``:exact``, ``:prefix`` and ``:limit``
+            parameters.
+
+    """
+    sql = u''
+    if within is not None:
+        ids = u', '.join(str(int(id_)) for id_ in within)
+        sql = WITHIN_SQL[module].format(ids=ids)
+
+    hits = HITS_SQL[module]
+    return SEARCH_SQL.format(
+        exact=hits.format(boost=1, match=':exact', within=sql),
+        prefix=hits.format(boost=0, match=':prefix', within=sql))
+
+
+def narrows(previous, query):
+    """Return ``True`` if ``query`` only matches results of ``previous``.
+
+    This is the case when ``query`` adds letters or digits to the
+    last term of ``previous``, e.g. "smith 20" and "smith 201": as
+    the last term is also searched for as a prefix, every entry that
+    matches "smith 201" also matches "smith 20". Queries containing
+    ``NOT`` or ``-term`` don't narrow, as the last term may be negated.
+
+    Args:
+        previous (unicode): Previous query.
+        query (unicode): New query.
+
+    Returns:
+        bool: ``True`` if the results of ``query`` are a subset of
+            those of ``previous``.
+
+    """
+    added = len(query) - len(previous)
+    if not previous or added < 1 or not query.startswith(previous) or \
+            not query[-added:].isalnum():
+        return False
+
+    # Extending a negated term widens the results, so queries with
+    # negations never narrow
+    terms = _split_query(query)
+    if any(t == 'NOT' or t.startswith('-') for t in terms):
+        return False
+
+    # The last term (without a column filter) must be a plain word,
+    # both before and after
+    col, sep, term = terms[-1].rpartition(':')
+    if sep and col not in COLUMNS:
+        return False
+
+    ops = ('OR', 'AND', 'NOT', 'NEAR')
+    return len(term) > added and term.isalnum() and \
+        term not in ops and term[:-added] not in ops
+
+
 RESET_SQL = """
 DROP TABLE IF EXISTS `data`;
+DROP TABLE IF EXISTS `hits`;
 DROP TABLE IF EXISTS `dbinfo`;
+DROP TABLE IF EXISTS `fingerprints`;
 DROP TABLE IF EXISTS `modified`;
 DROP TABLE IF EXISTS `search`;
+DROP TABLE IF EXISTS `entries`;
 VACUUM;
 PRAGMA INTEGRITY_CHECK;
 """
 
-# Search database column names
-COLUMNS = ('title', 'year', 'creators', 'authors', 'editors', 'tags',
-           'collections', 'attachments', 'notes', 'abstract', 'all')
+# Write a batch of entries to the index. Existing rows are deleted first,
+# so these work for both new and updated entries. The triggers on
+# `entries` update the full-text index.
+WRITE_SQL = (
+    u'DELETE FROM entries WHERE id = ?',
+    u'INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    u'INSERT OR REPLACE INTO data VALUES (?, ?)',
+    u'INSERT OR REPLACE INTO modified VALUES (?, ?)',
+    u'INSERT OR REPLACE INTO hits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+)
 
-# Search weightings for columns. The first column (key) is ignored (0.0)
-# collections, attachments, notes, abstract and all have lower weightings.
-# "all" is particularly low-ranked to avoid polluting results
-WEIGHTINGS = (0.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 0.5, 0.4, 0.3, 0.3, 0.1)
+# The following queries are run with the Zotero database attached to
+# the index connection as "zotero" (see `Index.attached`).
+
+# Items in the Zotero database that are indexed. Must match the
+# conditions of `zotero.ITEMS_SQL`.
+LIVE_SQL = u"""
+SELECT itemID FROM zotero.items
+WHERE itemTypeID NOT IN (1, 14)
+AND itemID NOT IN (SELECT itemID FROM zotero.deletedItems)
+"""
+
+# IDs of entries deleted from Zotero or moved to the trash. The
+# anti-join looks up each indexed ID by primary key, which is faster
+# than comparing against every item in `LIVE_SQL`.
+GONE_SQL = u"""
+INSERT INTO temp.gone
+SELECT id FROM data
+WHERE NOT EXISTS (
+    SELECT 1 FROM zotero.items AS i
+    WHERE i.itemID = data.id AND i.itemTypeID NOT IN (1, 14)
+)
+OR EXISTS (
+    SELECT 1 FROM zotero.deletedItems AS d WHERE d.itemID = data.id
+)
+"""
+
+# Remove entries found by `GONE_SQL`
+DELETE_SQL = tuple(
+    u'DELETE FROM {} WHERE id IN (SELECT id FROM temp.gone)'.format(table)
+    for table in ('entries', 'data', 'hits', 'modified')
+)
+
+# IDs of items that aren't in the index, e.g. restored from the trash
+MISSING_SQL = u"""
+SELECT itemID FROM ({})
+WHERE itemID NOT IN (SELECT id FROM data)
+""".format(LIVE_SQL)
+
+# Number of indexed entries
+COUNT_SQL = u'SELECT COUNT(*) FROM data'
+
+# Generation of the index (see `Index.generation`)
+GENERATION_SQL = u"SELECT value FROM dbinfo WHERE key = 'generation'"
+
+# Working tables for `Index._update`. The queries that fill
+# `fingerprints` (`zotero.FINGERPRINT_SQL`) don't qualify table names,
+# but they only exist in the Zotero database.
+TEMP_SCHEMA = u"""
+CREATE TEMP TABLE IF NOT EXISTS gone (
+    id INTEGER PRIMARY KEY NOT NULL
+);
+
+CREATE TEMP TABLE IF NOT EXISTS fingerprints (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+"""
+
+# IDs of items whose fingerprints are new, changed or gone
+FINGERPRINTS_CHANGED_SQL = u"""
+SELECT new.id FROM temp.fingerprints AS new
+    LEFT JOIN main.fingerprints AS old
+        ON new.kind = old.kind AND new.id = old.id
+WHERE old.value IS NOT new.value
+UNION
+SELECT old.id FROM main.fingerprints AS old
+    LEFT JOIN temp.fingerprints AS new
+        ON new.kind = old.kind AND new.id = old.id
+WHERE new.id IS NULL
+"""
+
+# Replace stored fingerprints with the new ones
+FINGERPRINTS_UPDATE_SQL = (
+    u"""
+    DELETE FROM main.fingerprints
+    WHERE NOT EXISTS (
+        SELECT 1 FROM temp.fingerprints AS new
+        WHERE new.kind = main.fingerprints.kind
+        AND new.id = main.fingerprints.id
+    )
+    """,
+    u"""
+    INSERT OR REPLACE INTO main.fingerprints
+    SELECT new.* FROM temp.fingerprints AS new
+        LEFT JOIN main.fingerprints AS old
+            ON new.kind = old.kind AND new.id = old.id
+    WHERE old.value IS NOT new.value
+    """,
+)
+
+# Merge the FTS index b-trees after a large update
+OPTIMIZE_SQL = u"INSERT INTO search(search) VALUES('optimize')"
+
+# fields in Entry.zdata to exclude from the "all" column
+ZFIELDS_IGNORE = ('title', 'numPages', 'numberOfVolumes')
+
+# Terms in a search query
+_split_query = re.compile(r'"[^"]*"|\S+').findall
 
 
 class InitialiseDB(Exception):
@@ -87,118 +407,343 @@ class InitialiseDB(Exception):
 
 
 def make_rank_func(weights):
-        """Search ranking function.
+    """Search ranking function.
+
+    Use floats (1.0 not 1) for more accurate results. Use 0 to ignore a
+    column.
+
+    Adapted from <http://goo.gl/4QXj25> and <http://goo.gl/fWg25i>
+
+    :param weights: list or tuple of the relative ranking per column.
+    :type weights: :class:`tuple` OR :class:`list`
+    :returns: a function to rank SQLITE FTS results
+    :rtype: :class:`function`
 
-        Use floats (1.0 not 1) for more accurate results. Use 0 to ignore a
-        column.
+    """
+    # matchinfo contains the number of phrases and columns, followed by
+    # three values for each phrase/column pair: hits in this row, hits
+    # in all rows and number of rows with hits. Weights apply to the
+    # first len(weights) triples. Zero-weighted columns contribute
+    # nothing to the score, so they're skipped.
+    offsets = tuple((2 + i * 3, w) for i, w in enumerate(weights) if w)
 
-        Adapted from <http://goo.gl/4QXj25> and <http://goo.gl/fWg25i>
+    def rank(matchinfo):
+        """Rank function for SQLite.
 
-        :param weights: list or tuple of the relative ranking per column.
-        :type weights: :class:`tuple` OR :class:`list`
-        :returns: a function to rank SQLITE FTS results
-        :rtype: :class:`function`
+        `matchinfo` is defined as returning 32-bit unsigned integers in
+        machine byte order (see http://www.sqlite.org/fts3.html#matchinfo)
+        and `memoryview.cast` uses machine byte order.
 
         """
-        def rank(matchinfo):
-            """Rank function for SQLite.
+        info = memoryview(matchinfo).cast('I')
+        n = len(info)
+        score = 0
+        for i, w in offsets:
+            if i + 3 > n:
+                break
+
+            total = info[i + 1]
+            if total:
+                score += info[i] * w / total
+
+        return score
+
+    return rank
+
+
+def fts_schema(module):
+    """SQL to create the full-text index with FTS module ``module``.
+
+    Args:
+        module (str): "fts5" or "fts4".
+
+    Returns:
+        str: SQL script.
+
+    """
+    return FTS_SCHEMA[module].format(
+        cols=_COLS, new=_NEW, old=_OLD,
+        weights=u', '.join(str(w) for w in WEIGHTINGS))
+
+
+def fts5_available(conn):
+    """Return ``True`` if SQLite was compiled with FTS5."""
+    try:
+        conn.execute(u'CREATE VIRTUAL TABLE temp.fts5test USING fts5(x)')
+    except sqlite3.OperationalError:
+        return False
+
+    conn.execute(u'DROP TABLE temp.fts5test')
+    return True
+
+
+def fts5_query(query):
+    """Convert a (FTS3-style) user query to FTS5 syntax.
 
-            `matchinfo` is defined as returning 32-bit unsigned integers in
-            machine byte order (see http://www.sqlite.org/fts3.html#matchinfo)
-            and `struct` defaults to machine byte order.
+    FTS5 treats most punctuation in unquoted terms as syntax errors,
+    so each term is quoted. Column filters (e.g. ``title:``), prefix
+    wildcards (``*``), ``OR``, ``AND``, ``NOT`` and quoted phrases are
+    preserved.
 
-            """
-            bufsize = len(matchinfo)  # Length in bytes.
-            matchinfo = [struct.unpack(b'I', matchinfo[i:i + 4])[0]
-                         for i in range(0, bufsize, 4)]
-            it = iter(matchinfo[2:])
-            return sum(x[0] * w / x[1]
-                       for x, w in zip(zip(it, it, it), weights)
-                       if x[1])
+    Args:
+        query (unicode): User query.
 
-        return rank
+    Returns:
+        unicode: FTS5 query.
+
+    """
+    terms = []
+    for term in _split_query(query):
+        if term in ('OR', 'AND', 'NOT') or \
+                (len(term) > 1 and term[0] == term[-1] == '"'):
+            terms.append(term)
+            continue
+
+        col, sep, rest = term.partition(':')
+        if sep and col in COLUMNS:
+            term = rest
+        else:
+            col = None
+
+        star = u''
+        if term.endswith('*'):
+            term, star = term.rstrip('*'), u'*'
+
+        if not term:
+            continue
+
+        term = u'"{}"{}'.format(term.replace('"', '""'), star)
+        if col:
+            term = col + u':' + term
+
+        terms.append(term)
+
+    return u' '.join(terms)
+
+
+def entry_rows(e, codec):
+    """Generate index rows for an `Entry`.
+
+    Args:
+        e (models.Entry): Entry to index.
+        codec (serialise.Codec): Codec to serialise Entry with.
+
+    Returns:
+        tuple: Parameters for each of the `WRITE_SQL` queries.
+
+    """
+    # Only needed when indexing, so they're not imported by searches
+    from urllib.parse import urlparse
+    from .notes import truncate
+
+    tags = u' '.join(e.tags)
+    collections = u' '.join([d.name for d in e.collections])
+    attachments = u' '.join([d.name for d in e.attachments if d.name])
+    notes = truncate(u' '.join(e.notes), NOTES_MAX_LENGTH)
+
+    names = {d.family for d in e.creators + e.authors + e.editors
+             if d.family}
+
+    all_ = [e.title, u' '.join(names), tags, collections,
+            attachments, notes, e.abstract, str(e.year), e.date]
+
+    for k, v in e.zdata.items():
+        if k in ZFIELDS_IGNORE or 'date' in k.lower() or not v:
+            continue
+
+        if k == 'url':
+            hostname = urlparse(v).hostname
+            if not hostname:
+                continue
+
+            if hostname.startswith('www.'):
+                hostname = hostname[4:]
+            all_.append(hostname)
+        else:
+            all_.append(v)
+
+    all_ = [v for v in all_ if v]
+
+    search = (
+        e.id,
+        e.title,
+        str(e.year),
+        u' '.join([d.family for d in e.creators if d.family]),
+        u' '.join([d.family for d in e.authors if d.family]),
+        u' '.join([d.family for d in e.editors if d.family]),
+        tags,
+        collections,
+        attachments,
+        notes,
+        e.abstract,
+        u' '.join(all_),
+    )
+
+    hit = (e.id, e.key, e.library, e.type, e.title, e.year,
+           format_creators(e.creators), len(e.attachments),
+           u'\n\n'.join(e.notes), e.citekey)
+
+    return ((e.id,), search, (e.id, codec.encode(e)),
+            (e.id, dt2sqlite(e.modified)), hit)
 
 
 class Index(object):
     """Search index database."""
 
-    def __init__(self, dbpath):
+    def __init__(self, dbpath, fts=None, codec=DEFAULT_CODEC, workers=None):
         """Create a new search index.
 
         Args:
             dbpath (str): Path to SQLite database file.
+            fts (str, optional): SQLite full-text module to use, "fts5"
+                or "fts4". Defaults to FTS5 if SQLite supports it.
+            codec (str, optional): Name of codec to store entries with
+                in a new database. Existing databases are read with the
+                codec named in their ``dbinfo``. See `zothero.serialise`.
+            workers (int, optional): Number of processes to build
+                index rows with when re-indexing all entries. See
+                `zothero.parallel`.
 
         """
         self.dbpath = dbpath
-        self._conn = None
+        self.fts = fts
+        # Codec of the open database and the one to create new ones with
+        self.codec = self._new_codec = get_codec(codec)
+        self.workers = workers
+        self._conn = None  # read connection
+        self._writer = None  # write connection
+        self._inode = 0  # inode of database the connections are open to
 
     @property
     def conn(self):
-        """Return connection to the database."""
+        """Read connection to the database.
+
+        Searches only use this connection. The database is
+        initialised (via :attr:`writer`) if it's empty or stale.
+        The connection is reopened if the database has been replaced
+        by a full re-index.
+        """
+        self._check_replaced()
         if not self._conn:
-            conn = sqlite3.connect(self.dbpath)
-            conn.row_factory = sqlite3.Row
+            self._detect_fts()
+            conn = self._connect(readonly=True)
+            if not self._db_valid(conn):
+                self.writer  # initialises database
 
+            log.debug('[index] opened %r', shortpath(self.dbpath))
+            conn.create_function('rank', 1, make_rank_func(WEIGHTINGS))
+            self._conn = conn
+
+        return self._conn
+
+    @property
+    def writer(self):
+        """Write connection to the database.
+
+        Only opened to update the index. See `zothero.db` for why
+        reads and writes use different connections.
+        """
+        self._check_replaced()
+        if not self._writer:
+            self._detect_fts()
+            conn = self._connect()
             if not self._db_valid(conn):
-                log.debug('[index] initialising %r ...',
-                          shortpath(self.dbpath))
+                log.debug('[index] initialising %r (%s) ...',
+                          shortpath(self.dbpath), self.fts)
+                self.codec = self._new_codec
 
-                conn.executescript(INDEX_SCHEMA)
+                conn.executescript(RESET_SQL)
+                conn.executescript(INDEX_SCHEMA + fts_schema(self.fts))
                 with conn as c:
                     sql = u"""
-                        INSERT INTO dbinfo VALUES('version', ?)
+                        INSERT INTO dbinfo VALUES(?, ?)
                     """
-                    c.execute(sql, (str(DB_VERSION),))
+                    c.executemany(sql, [('version', str(DB_VERSION)),
+                                        ('fts', self.fts),
+                                        ('codec', self.codec.name)])
+
+            self._writer = conn
+
+        return self._writer
+
+    def _connect(self, readonly=False):
+        """Open a connection and remember the inode of the database."""
+        ino = inode(self.dbpath)
+        conn = connect(self.dbpath, readonly, journal_mode=JOURNAL_MODE)
+        # A new database is created by `connect()`
+        self._inode = self._inode or ino or inode(self.dbpath)
+        return conn
+
+    def _check_replaced(self):
+        """Close connections if the database file has been replaced."""
+        if self._inode and self._inode != inode(self.dbpath):
+            log.debug('[index] %r replaced, reopening ...',
+                      shortpath(self.dbpath))
+            self.close()
 
-            log.debug('[index] opened %r', shortpath(self.dbpath))
-            conn.create_function('rank', 1, make_rank_func(WEIGHTINGS))
-            self._conn = conn
+    def close(self):
+        """Close database connections."""
+        for conn in (self._conn, self._writer):
+            if conn:
+                conn.close()
 
-        return self._conn
+        self._conn = self._writer = None
+        self._inode = 0
+
+    def _detect_fts(self):
+        """Set :attr:`fts` to best full-text module if it isn't set."""
+        if not self.fts:
+            # Read connections can't create the table the test needs
+            conn = sqlite3.connect(':memory:')
+            self.fts = 'fts5' if fts5_available(conn) else 'fts4'
+            conn.close()
 
     def _db_valid(self, conn):
-        """Validate database version against `DB_VERSION`."""
+        """Validate database version against `DB_VERSION`.
+
+        The index is also invalid if it uses a different full-text
+        module to :attr:`fts` or an unknown codec. Otherwise,
+        :attr:`codec` is set to the database's codec.
+        """
         sql = u"""
-            SELECT `value` AS `version`
-                FROM `dbinfo`
-            WHERE `key` = 'version'
+            SELECT `key`, `value` FROM `dbinfo`
         """
         try:
-            row = conn.execute(sql).fetchone()
+            info = {row['key']: row['value'] for row in conn.execute(sql)}
         except sqlite3.OperationalError:
             return False
 
-        if int(row['version']) != DB_VERSION:  # index must be rebuilt
-            log.debug('[index] clearing stale database %r ...',
+        if int(info.get('version', 0)) != DB_VERSION or \
+                info.get('fts') != self.fts or \
+                info.get('codec') not in CODECS:  # must be rebuilt
+            log.debug('[index] stale database %r ...',
                       shortpath(self.dbpath))
-
-            with conn as c:
-                c.executescript(RESET_SQL)
             return False
 
+        self.codec = CODECS[info['codec']]
         return True
 
     @contextmanager
     def cursor(self):
-        """Context manager providing database cursor."""
-        with self.conn as c:
+        """Context manager providing cursor for :attr:`writer`."""
+        with self.writer as c:
             yield c.cursor()
 
     @property
     def empty(self):
         """Return ``True`` if index database is empty."""
         with self.conn as c:
-            row = c.execute('SELECT COUNT(*) AS n FROM search').fetchone()
-            return row['n'] == 0
+            row = c.execute('SELECT 1 FROM entries LIMIT 1').fetchone()
+            return row is None
 
     @property
     def last_updated(self):
         """Return modified time of database file."""
-        if not os.path.exists(self.dbpath):
+        t = wal_mtime(self.dbpath)
+        if not t:
             log.debug('[index] not yet initialised')
             return 0.0
 
-        t = os.path.getmtime(self.dbpath)
         log.debug('[index] last updated %s', time_since(t))
         return t
 
@@ -212,48 +757,120 @@ class Index(object):
             zothero.zotero.Entry: `Entry` for `id` or `None` if not found.
 
         """
-        sql = """SELECT json FROM data WHERE id = ?"""
+        sql = """SELECT value FROM data WHERE id = ?"""
         row = self.conn.execute(sql, (entry_id,)).fetchone()
         if not row:
             return None
 
-        return Entry.from_json(row['json'])
+        return self.codec.decode(row['value'])
 
-    def search(self, query):
+    def search(self, query, within=None):
         """Search index for ``query``.
 
         Args:
             query (unicode): Query to search for
+            within (list, optional): Only search the entries with
+                these IDs, e.g. the results of a query ``query``
+                narrows (see `narrows()`). If the results were
+                limited to `SEARCH_LIMIT`, the results of ``query``
+                needn't be among them.
+
+        Returns:
+            list: `SearchHit` objects for matching database items.
+
+        """
+        hits = [SearchHit(*row, loader=self.entry)
+                for row in self._search(query, within=within)]
+
+        log.info('[index] %d result(s) for %r', len(hits), query)
+        return hits
+
+    def _search(self, query, limit=SEARCH_LIMIT, within=None):
+        """Run `SEARCH_SQL` for ``query``.
+
+        Unless it's already a prefix, the last term of ``query``
+        is also searched for as a prefix.
+
+        Args:
+            query (unicode): User query.
+            limit (int, optional): Maximum number of results.
+            within (list, optional): IDs of entries to search.
 
         Returns:
-            list: `Entry` objects for matching database items.
+            list: Result rows.
 
         """
-        entries = []
-        for row in self.conn.execute(SEARCH_SQL, (query,)):
-            entries.append(Entry.from_json(row['json']))
+        conn = self.conn  # sets `fts`
+        prefix = query if query.endswith('*') else query + '*'
+        if self.fts == 'fts5':
+            query, prefix = fts5_query(query), fts5_query(prefix)
+            if not query:
+                return []
 
-        # If we didn't get many results, perform a second search using
-        # a wildcard
-        if len(entries) < 30 and not query.endswith('*'):
-            seen = {e.id for e in entries}  # ignore any duplicates
+        if within is not None and not within:
+            return []
 
-            for row in self.conn.execute(SEARCH_SQL, (query + '*',)):
-                if row['id'] not in seen:
-                    entries.append(Entry.from_json(row['json']))
+        params = {'exact': query, 'prefix': prefix, 'limit': limit}
+        return conn.execute(search_sql(self.fts, within), params).fetchall()
 
-        log.info('[index] %d result(s) for %r', len(entries), query)
-        return entries
+    def hits(self, results):
+        """Load the `SearchHit` objects of earlier search results.
+
+        Args:
+            results (list): ``(id, score)`` pairs of search results,
+                e.g. from `results.ResultCache`.
+
+        Returns:
+            list: `SearchHit` objects in the same order. Entries that
+                are no longer in the index are omitted.
+
+        """
+        if not results:
+            return []
+
+        sql = u'SELECT * FROM hits WHERE id IN ({})'.format(
+            u', '.join(u'?' * len(results)))
+        rows = {row['id']: row
+                for row in self.conn.execute(sql, [r[0] for r in results])}
+        return [SearchHit(*rows[id_], score=score, loader=self.entry)
+                for id_, score in results if id_ in rows]
+
+    @property
+    def generation(self):
+        """Counter that is increased by every update that changes the index.
+
+        Search results of a generation stay valid until the next
+        generation (see `results.ResultCache`).
+
+        Returns:
+            int: Generation of index, 0 if it's never been updated.
+
+        """
+        row = self.conn.execute(GENERATION_SQL).fetchone()
+        return int(row[0]) if row else 0
+
+    @property
+    def sync_state(self):
+        """High-water marks of the last update.
+
+        Returns:
+            tuple: See `zotero.Zotero.sync_state()`.
+
+        """
+        sql = u"""
+            SELECT key, value FROM dbinfo
+            WHERE key IN ('sync_version', 'sync_modified')
+        """
+        info = {row['key']: row['value'] for row in self.conn.execute(sql)}
+        return (int(info.get('sync_version') or 0),
+                info.get('sync_modified') or u'')
 
     def update(self, zot, force=False):
         """Update search index from a `Zotero` instance.
 
         If the Zotero database is newer than the index (or the index
-        is empty), retrieve entries from the Zotero DB and add them
-        to the index.
-
-        Attempts to only load modified entries, but if there are none,
-        and the database file has changed, forces a full reload.
+        is empty), add entries that have changed since the last update
+        to the index. See `_update()`.
 
         Args:
             zot (zotero.Zotero): `Zotero` object whose items
@@ -267,26 +884,43 @@ class Index(object):
         """
         # Only update search index if Zotero database is newer or
         # the index hasn't been populated yet.
-        if zot.last_updated <= self.last_updated and not self.empty:
+        if not force and zot.last_updated <= self.last_updated and \
+                not self.empty:
             log.debug('[index] up to date: %r', shortpath(self.dbpath))
             return False
 
         with timed('updated search index'):
-            # First try to only update entries whose modified date (or
-            # whose attachments' modified date) has changed.
-            if not self._update(zot, force):
-                # Index wasn't updated, although the database has
-                # changed. That means a note or something else that
-                # doesn't have a modified date was changed.
-                # Force a full update.
-                self._update(zot, True)
+            self._update(zot, force)
 
         return True
 
     def _update(self, zot, force=False):
         """Update search index from a `Zotero` instance.
 
-        Retrieve Zotero entries and add to/update in the search index.
+        When ``force`` is ``True`` or the index is empty, all entries
+        are re-indexed into a new database, which then replaces the
+        index (see `_rebuild()`).
+
+        Otherwise, only entries that have changed since the last
+        update are re-indexed. These are:
+
+        - Items (incl. their notes and attachments) that changed since
+          the high-water marks of the last update (see `sync_state`).
+        - Items whose notes, attachments, tags or collections have
+          different fingerprints (see `zotero.FINGERPRINT_SQL`), which
+          catches deleted children.
+        - Items that aren't in the index, e.g. restored from the trash.
+
+        They are written to the index in small transactions, so
+        searches are never held up for long.
+
+        Entries deleted from Zotero are removed by queries against the
+        Zotero database attached to the index connection, so the IDs
+        of all items are never loaded into Python.
+
+        Only one process updates the index at a time. If another
+        process is already updating it, a full re-index waits for it
+        to finish, but other updates are skipped.
 
         Args:
             zot (zotero.Zotero): `Zotero` object whose items
@@ -302,127 +936,223 @@ class Index(object):
         if force:
             log.debug('[index] forcing full re-index ...')
 
-        with self.cursor() as c:
-            # ------------------------------------------------------
-            # Get keys of indexed items
-            sql = u'SELECT id FROM data'
-            index_ids = {row['id'] for row in c.execute(sql)}
-
-            # ------------------------------------------------------
-            # New and updated entries
-
-            i = j = 0  # updated, new entries
-            if force or not index_ids:  # Index is empty, fetch all entries
-                it = zot.all_entries()
-            else:  # Only fetch entries modified since last update
-                # Zotero stores TIMESTAMPs in UTC
-                dt = datetime.utcfromtimestamp(self.last_updated)
-                it = zot.modified_since(dt)
-
-            # fields in zdata to exclude from all_
-            zfields_ignore = ('title', 'numPages', 'numberOfVolumes')
-
-            for e in it:
-
-                tags = u' '.join(e.tags)
-                collections = u' '.join([d.name for d in e.collections])
-                attachments = u' '.join([d.name for d in e.attachments
-                                         if d.name])
-                notes = u' '.join(e.notes)
-
-                names = {d.family for d in e.creators + e.authors + e.editors
-                         if d.family}
-
-                all_ = [e.title, u' '.join(names), tags, collections,
-                        attachments, notes, e.abstract, str(e.year),
-                        e.date]
-
-                for k, v in e.zdata.items():
-                    if k in zfields_ignore or 'date' in k.lower() or not v:
-                        continue
-
-                    if k == 'url':
-                        hostname = urlparse(v).hostname
-                        if not hostname:
-                            continue
-
-                        if hostname.startswith('www.'):
-                            hostname = hostname[4:]
-                        all_.append(hostname)
-                    else:
-                        all_.append(v)
-
-                all_ = [v for v in all_ if v]
-
-                data = [
-                    e.id,
-                    e.title,
-                    str(e.year),
-                    u' '.join([d.family for d in e.creators if d.family]),
-                    u' '.join([d.family for d in e.authors if d.family]),
-                    u' '.join([d.family for d in e.editors if d.family]),
-                    tags,
-                    collections,
-                    attachments,
-                    notes,
-                    e.abstract,
-                    u' '.join(all_),
-                ]
-
-                if e.id in index_ids:  # update
-                    i += 1
-                    # Fulltext search
-                    sql = u"""
-                        UPDATE search
-                            SET `title` = ?, `year` = ?, `creators` = ?,
-                                `authors` = ?, `editors` = ?,
-                                `tags` = ?, `collections` = ?,
-                                `attachments` = ?, `notes` = ?,
-                                `abstract` = ?, `all` = ?
-                        WHERE id = ?
-                    """
-                    # log.debug('sql=%s, data=%r', sql, data)
-                    c.execute(sql, data[1:] + [e.id])
+        with self._locked(wait=force) as locked:
+            if not locked:
+                log.debug('[index] already being updated by another '
+                          'process')
+                return False
+
+            # Read the high-water marks first, so changes made during
+            # the update are picked up by the next one
+            version, modified = self.sync_state
+            state = zot.sync_state()
+            if state[1]:
+                # Timestamps have a resolution of one second, so if the
+                # database was modified in the same second as the
+                # latest item, another item may yet get the same
+                # timestamp. Look at that second again next time.
+                latest = sqlite2dt(state[1])
+                if latest >= datetime.utcfromtimestamp(zot.last_updated - 1):
+                    state = (state[0],
+                             dt2sqlite(latest - timedelta(seconds=1)))
+
+            if force or self.empty:
+                return self._rebuild(zot, state)
+
+            with self.attached(zot.dbpath), self.cursor() as c:
+                n_before = c.execute(COUNT_SQL).fetchone()[0]
+                changed = self._load_fingerprints(c)
+
+                # --------------------------------------------------
+                # New and updated entries
+                changed.update(zot.changed_since(version, modified))
+                changed.update(row[0] for row in c.execute(MISSING_SQL))
+                rows = (entry_rows(e, self.codec)
+                        for e in zot.entries(sorted(changed)))
+                written = self._write(c, rows, commit=True)
+                # The FTS index isn't optimised, as that would rewrite
+                # it in one long transaction. Full re-indexes do.
+
+                # --------------------------------------------------
+                # Remove deleted entries from index
+                c.execute(u'DELETE FROM temp.gone')
+                deleted = c.execute(GONE_SQL).rowcount
+                if deleted:
+                    for sql in DELETE_SQL:
+                        c.execute(sql)
+
+                # Fingerprints and high-water marks are saved last, so
+                # if the update is interrupted, the next one repeats it
+                for sql in FINGERPRINTS_UPDATE_SQL:
+                    c.execute(sql)
+                self._save_sync_state(c, state)
+                if written or deleted:
+                    row = c.execute(GENERATION_SQL).fetchone()
+                    self._save_generation(c, int(row[0]) if row else 0)
+
+                new = c.execute(COUNT_SQL).fetchone()[0] + deleted - n_before
+                log.debug('[index] %d updated, %d new, %d deleted entries',
+                          written - new, new, deleted)
 
-                    # JSON data
-                    sql = u'UPDATE data SET json = ? WHERE id = ?'
-                    c.execute(sql, (e.json(), e.id))
+        # Return ``True`` if index was updated
+        return (written + deleted) > 0
 
-                    # Modified time
-                    sql = u'UPDATE modified SET modified = ? WHERE id = ?'
-                    c.execute(sql, (dt2sqlite(e.modified), e.id))
+    def _rebuild(self, zot, state):
+        """Re-index all entries into a new database.
 
-                else:  # new entry
-                    j += 1
-                    # Fulltext search table
-                    sql = u"""
-                        INSERT INTO search
-                            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """
-                    c.execute(sql, data)
+        The entries are written to a "shadow" database next to the
+        index, using `workers` processes to build the rows (see
+        `zothero.parallel`). When it's complete, it is renamed over
+        the index, so searches use the old index until then, and a
+        failed re-index leaves it intact. Connections of other
+        `Index` objects are reopened when they're next used.
+
+        Args:
+            zot (zotero.Zotero): `Zotero` object whose items
+                should be added to the search index.
+            state (tuple): High-water marks to save.
+
+        Returns:
+            boolean: ``True``
 
-                    # JSON data
-                    c.execute('INSERT INTO data VALUES (?, ?)',
-                              (e.id, e.json()))
+        """
+        from .parallel import iter_rows
 
-                    # Modified time
-                    c.execute('INSERT INTO modified VALUES (?, ?)',
-                              (e.id, dt2sqlite(e.modified)))
+        self._detect_fts()
+        path = self.dbpath + SHADOW_SUFFIX
+        delete(path)  # left by an interrupted re-index
+        shadow = Index(path, self.fts, self._new_codec.name, self.workers)
+        try:
+            with shadow.attached(zot.dbpath), shadow.cursor() as c:
+                shadow._load_fingerprints(c)
+                for sql in FINGERPRINTS_UPDATE_SQL:
+                    c.execute(sql)
+
+                rows = chain.from_iterable(
+                    iter_rows(zot, shadow.codec.name, self.workers))
+                written = shadow._write(c, rows)
+                with timed('optimised search index'):
+                    c.execute(OPTIMIZE_SQL)
+
+                shadow._save_sync_state(c, state)
+                shadow._save_generation(c, self.generation)
+
+            shadow.close()
+            self.close()
+            replace(path, self.dbpath)
+        except BaseException:
+            shadow.close()
+            delete(path)
+            raise
+
+        log.debug('[index] re-indexed %d entries', written)
+        return True
 
-            # ------------------------------------------------------
-            # Remove deleted entries from index
-            gone = index_ids - set(zot.ids())
+    def _write(self, c, rows, commit=False):
+        """Write index rows in batches of `BATCH_SIZE`.
 
-            queries = (
-                u'DELETE FROM search WHERE id = ?',
-                u'DELETE FROM data WHERE id = ?',
-                u'DELETE FROM modified WHERE id = ?',
-            )
-            for sql in queries:
-                c.executemany(sql, [(id_,) for id_ in gone])
+        Args:
+            c (sqlite3.Cursor): Index cursor.
+            rows (iterable): Rows from `entry_rows()`.
+            commit (bool, optional): Commit each batch.
 
-            log.debug('[index] %d updated, %d new, %d deleted entries',
-                      i, j, len(gone))
+        Returns:
+            int: Number of entries written.
 
-        # Return ``True`` if index was updated
-        return (len(gone) + i + j) > 0
+        """
+        written = 0
+        for n, batch in enumerate(batched(rows, BATCH_SIZE), 1):
+            with timed('wrote index batch %d (%d entries)' %
+                       (n, len(batch))):
+                for k, sql in enumerate(WRITE_SQL):
+                    c.executemany(sql, [r[k] for r in batch])
+
+                if commit:
+                    c.connection.commit()
+
+            written += len(batch)
+
+        return written
+
+    def _save_sync_state(self, c, state):
+        """Save high-water marks ``state`` (see `sync_state`)."""
+        sql = u'INSERT OR REPLACE INTO dbinfo VALUES (?, ?)'
+        c.executemany(sql, [('sync_version', str(state[0])),
+                            ('sync_modified', state[1])])
+
+    def _save_generation(self, c, generation):
+        """Save the generation after ``generation`` (see `generation`).
+
+        The clock is the minimum, so a reset or deleted index doesn't
+        repeat the generations of the old one.
+        """
+        sql = u'INSERT OR REPLACE INTO dbinfo VALUES (?, ?)'
+        c.execute(sql, ('generation',
+                        str(max(generation + 1, int(time.time())))))
+
+    def _load_fingerprints(self, c):
+        """Load fingerprints of attached database into temp table.
+
+        The stored fingerprints are replaced with the new ones by
+        `FINGERPRINTS_UPDATE_SQL`.
+
+        Args:
+            c (sqlite3.Cursor): Index cursor with the Zotero database
+                attached.
+
+        Returns:
+            set: IDs of items whose fingerprints have changed.
+
+        """
+        from .zotero import FINGERPRINT_SQL
+
+        c.execute(u'DELETE FROM temp.fingerprints')
+        for kind, sql in FINGERPRINT_SQL.items():
+            c.execute(u'INSERT INTO temp.fingerprints '
+                      u'SELECT ?, id, value FROM ({})'.format(sql), (kind,))
+
+        return {row[0] for row in c.execute(FINGERPRINTS_CHANGED_SQL)}
+
+    @contextmanager
+    def _locked(self, wait=True):
+        """Stop other processes updating the index at the same time.
+
+        Args:
+            wait (bool, optional): Wait for another process to finish.
+
+        Yields:
+            bool: ``True`` if the lock was acquired, ``False`` if
+                another process holds it and ``wait`` is ``False``.
+
+        """
+        with open(self.dbpath + '.lock', 'w') as fp:
+            flags = fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(fp, flags)
+            except BlockingIOError:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(fp, fcntl.LOCK_UN)
+
+    @contextmanager
+    def attached(self, dbpath):
+        """Attach Zotero database ``dbpath`` to index connection as "zotero".
+
+        The temporary tables used by `_update` (`TEMP_SCHEMA`) are
+        also created.
+
+        Args:
+            dbpath (str): Path to Zotero database.
+
+        """
+        conn = self.writer
+        conn.execute(u'ATTACH DATABASE ? AS zotero', (dbpath,))
+        try:
+            conn.executescript(TEMP_SCHEMA)
+            yield conn
+        finally:
+            conn.execute(u'DETACH DATABASE zotero')
@@ -10,59 +10,141 @@
 
 from __future__ import print_function, absolute_import
 
+from datetime import datetime
 import json
 import logging
 
-from .util import json_serialise, utf8encode
+from .util import json_serialise
+
+# Format of `datetime` objects serialised by `util.json_serialise`
+ISO_DATE_FMT = '%Y-%m-%dT%H:%M:%S'
 
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
 
-class AttrDict(dict):
-    """Dictionary whose keys are also accessible as attributes."""
+class Model(object):
+    """Base class for ZotHero data models.
+
+    Models keep their data in ``__slots__``, which makes them much
+    smaller than dictionaries. For compatibility with code written
+    for the old dict-based models, attributes are also accessible as
+    dictionary keys, i.e. ``Entry.title`` and ``Entry['title']`` are
+    equivalent.
+
+    Subclasses must list their attributes in ``__slots__`` and set
+    them all in ``__init__``.
+
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, d):
+        """Create a new model from a dictionary.
+
+        Args:
+            d (dict): Data as returned by :meth:`to_dict`.
+
+        Returns:
+            Model: New model object.
+
+        """
+        return cls(**d)
+
+    def to_dict(self):
+        """Convert model to a dictionary.
+
+        Returns:
+            dict: Attribute names and values.
+
+        """
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def keys(self):
+        """Names of model attributes.
+
+        Returns:
+            tuple: Attribute names.
+
+        """
+        return self.__slots__
 
-    def __init__(self, *args, **kwargs):
-        """Create new `AttrDict`.
+    def get(self, key, default=None):
+        """Return attribute ``key`` or ``default``.
 
         Args:
-            *args (objects): Arguments to `dict.__init__()`
-            **kwargs (objects): Keyword arguments to `dict.__init__()`
+            key (str): Attribute name.
+            default (object, optional): Value to return if model
+                has no attribute ``key``.
+
+        Returns:
+            object: Attribute value or ``default``.
 
         """
-        super(AttrDict, self).__init__(*args, **kwargs)
+        return getattr(self, key, default)
 
-    def __getattr__(self, key):
-        """Look up attribute as dictionary key.
+    def __getitem__(self, key):
+        """Look up dictionary key as attribute.
 
         Args:
-            key (str): Dictionary key/attribute name.
+            key (str): Attribute name.
 
         Returns:
-            obj: Dictionary value for `key`.
+            object: Attribute value.
 
         Raises:
-            AttributeError: Raised if `key` isn't in dictionary.
+            KeyError: Raised if ``key`` isn't a model attribute.
 
         """
-        if key not in self:
-            raise AttributeError("AttrDict object has no attribute: %r" % key)
-
-        return self[key]
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
 
-    def __setattr__(self, key, value):
-        """Add `value` to the dictionary under `key`.
+    def __setitem__(self, key, value):
+        """Set attribute ``key`` to ``value``.
 
         Args:
-            key (str): Dictionary key/attribute name.
-            value (obj): Value to store for `key`.
+            key (str): Attribute name.
+            value (object): Value of attribute.
+
+        Raises:
+            KeyError: Raised if ``key`` isn't a model attribute.
 
         """
-        self[key] = value
+        if key not in self.__slots__:
+            raise KeyError(key)
+
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        """Whether model has an attribute called ``key``."""
+        return key in self.__slots__
+
+    def __eq__(self, other):
+        """Models are equal if they are the same type with the same data."""
+        if type(other) is not type(self):
+            return NotImplemented
+
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        """Inverse of `__eq__`."""
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Code-like representation of model."""
+        args = ', '.join('{}={!r}'.format(k, getattr(self, k))
+                         for k in self.__slots__)
+        return '{}({})'.format(self.__class__.__name__, args)
 
 
-class Entry(AttrDict):
+class Entry(Model):
     """A publication from the Zotero database.
 
     Attributes:
@@ -87,28 +169,82 @@ class Entry(AttrDict):
 
     """
 
+    __slots__ = ('id', 'key', 'library', 'type', 'modified', 'title',
+                 'date', 'year', 'abstract', 'zdata', 'collections',
+                 'creators', 'attachments', 'notes', 'tags', 'citekey')
+
     @classmethod
-    def from_json(cls, js):
-        """Deserialise an `Entry` from JSON."""
-        data = json.loads(js)
+    def from_dict(cls, d):
+        """Create an `Entry` from a dictionary.
+
+        Nested creators, collections and attachments are converted to
+        model objects, and an ISO-format ``modified`` string to a
+        `datetime`.
+
+        Args:
+            d (dict): Data as returned by :meth:`to_dict` or decoded
+                from :meth:`json`.
+
+        Returns:
+            Entry: New Entry.
 
-        e = Entry(data)
+        """
+        d = dict(d)
+        d['creators'] = [Creator.from_dict(c) for c in d['creators']]
+        d['collections'] = [Collection.from_dict(c)
+                            for c in d['collections']]
+        d['attachments'] = [Attachment.from_dict(a)
+                            for a in d['attachments']]
+        if isinstance(d['modified'], str):
+            d['modified'] = datetime.strptime(d['modified'], ISO_DATE_FMT)
 
-        e.creators = [Creator(d) for d in e.creators]
-        e.collections = [Collection(d) for d in e.collections]
-        e.attachments = [Attachment(d) for d in e.attachments]
+        return cls(**d)
 
-        return e
+    @classmethod
+    def from_json(cls, js):
+        """Deserialise an `Entry` from JSON."""
+        return cls.from_dict(json.loads(js))
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, id=None, key=None, library=None, type=None,
+                 modified=None, title=u'', date=None, year=0, abstract=u'',
+                 zdata=None, collections=None, creators=None,
+                 attachments=None, notes=None, tags=None, citekey=None):
         """Create new `Entry`.
 
         Args:
-            *args: Optional initialisation data. As for `dict`.
-            **kwargs: Optional initialisation data. As for `dict`.
+            See class attributes. Sequences and ``zdata`` default to
+            new, empty objects.
 
         """
-        super(Entry, self).__init__(*args, **kwargs)
+        self.id = id
+        self.key = key
+        self.library = library
+        self.type = type
+        self.modified = modified
+        self.title = title
+        self.date = date
+        self.year = year
+        self.abstract = abstract
+        self.zdata = {} if zdata is None else zdata
+        self.collections = [] if collections is None else collections
+        self.creators = [] if creators is None else creators
+        self.attachments = [] if attachments is None else attachments
+        self.notes = [] if notes is None else notes
+        self.tags = [] if tags is None else tags
+        self.citekey = citekey
+
+    def to_dict(self):
+        """Convert `Entry` and its creators etc. to dictionaries.
+
+        Returns:
+            dict: Entry data.
+
+        """
+        d = super(Entry, self).to_dict()
+        d['creators'] = [c.to_dict() for c in self.creators]
+        d['collections'] = [c.to_dict() for c in self.collections]
+        d['attachments'] = [a.to_dict() for a in self.attachments]
+        return d
 
     @property
     def authors(self):
@@ -154,18 +290,6 @@ class Entry(AttrDict):
     def __str__(self):
         """Title, year and author(s) of `Entry`.
 
-        Returns:
-            str: UTF8-encoded string.
-
-        """
-        if isinstance(self, str):
-            return self
-        #return str(self).encode('utf-8', 'replace')
-        #return unicode(self).encode('utf-8', 'replace')
-
-    def __unicode__(self):
-        """Title, year and author(s) of `Entry`.
-
         Returns:
             unicode: Description of `Entry`.
 
@@ -174,25 +298,30 @@ class Entry(AttrDict):
         if self.year:
             s += u' ({})'.format(self.year)
 
-        authors = ', '.join([c.family for c in self.creators if c])
+        authors = ', '.join([c.family for c in self.creators if c.family])
 
         if authors:
             s += ' by ' + authors
 
         return s
 
+    def __repr__(self):
+        """Code-like representation of `Entry`."""
+        return 'Entry(id={s.id!r}, key={s.key!r}, title={s.title!r})'.format(
+            s=self)
+
     def json(self):
-        """Serialise `Entry` to JSON.
+        """Serialise `Entry` to compact JSON.
 
         Returns:
             str: JSON-encoded `Entry`.
 
         """
-        return json.dumps(self, indent=2, sort_keys=True,
+        return json.dumps(self.to_dict(), separators=(',', ':'),
                           default=json_serialise)
 
 
-class Attachment(AttrDict):
+class Attachment(Model):
     """File attached to an `Entry`.
 
     NOTE: An Attachment may have either a URL or a path, but not
@@ -206,18 +335,17 @@ class Attachment(AttrDict):
 
     """
 
-    def __init__(self, *args, **kwargs):
-        """Create new `Attachment` object.
-
-        Args:
-            *args: Optional initialisation data. As for `dict`.
-            **kwargs: Optional initialisation data. As for `dict`.
+    __slots__ = ('key', 'name', 'path', 'url')
 
-        """
-        super(Attachment, self).__init__(*args, **kwargs)
+    def __init__(self, key=None, name=None, path=None, url=None):
+        """Create new `Attachment` object."""
+        self.key = key
+        self.name = name
+        self.path = path
+        self.url = url
 
 
-class Collection(AttrDict):
+class Collection(Model):
     """Collection `Entry` belongs to.
 
     Attributes:
@@ -226,18 +354,15 @@ class Collection(AttrDict):
 
     """
 
-    def __init__(self, *args, **kwargs):
-        """Create new `Collection` object.
-
-        Args:
-            *args: Optional initialisation data. As for `dict`.
-            **kwargs: Optional initialisation data. As for `dict`.
+    __slots__ = ('name', 'key')
 
-        """
-        super(Collection, self).__init__(*args, **kwargs)
+    def __init__(self, name=None, key=None):
+        """Create new `Collection` object."""
+        self.name = name
+        self.key = key
 
 
-class Creator(AttrDict):
+class Creator(Model):
     """Author/performer of `Entry`.
 
     Attributes:
@@ -248,44 +373,55 @@ class Creator(AttrDict):
 
     """
 
-    def __init__(self, *args, **kwargs):
-        """Create new `Creator` object.
+    __slots__ = ('index', 'given', 'family', 'type')
 
-        Args:
-            *args: Optional initialisation data. As for `dict`.
-            **kwargs: Optional initialisation data. As for `dict`.
-
-        """
-        super(Creator, self).__init__(*args, **kwargs)
+    def __init__(self, index=0, given=None, family=None, type=None):
+        """Create new `Creator` object."""
+        self.index = index
+        self.given = given
+        self.family = family
+        self.type = type
 
 
-class CSLStyle(AttrDict):
+class CSLStyle(Model):
     """A CSL style configuration.
 
     Attributes:
+        citation_format (unicode): Citation format, e.g. "author-date"
+            or "numeric".
         hidden (bool): Whether the style is hidden (i.e. a parent style).
+        id (unicode): ID of the style (usually the same as ``url``).
+        locale (unicode): Default locale of the style, e.g. "en-US".
         name (unicode): Name of the style (extracted from the stylesheet).
         path (unicode): Path to the .csl file.
         parent_url (unicode): URL of parent style for dependent styles.
             ``None`` for independent styles.
+        updated (unicode): ISO 8601 time the style was last updated.
         url (unicode): Canonical URL of the style.
 
     """
 
+    __slots__ = ('name', 'url', 'path', 'parent_url', 'hidden', 'id',
+                 'citation_format', 'updated', 'locale')
+
     @classmethod
     def from_json(cls, js):
         """Create a `CSLStyle` from a JSON object."""
-        return cls(json.loads(js))
-
-    def __init__(self, *args, **kwargs):
-        """Create a new style.
-
-        Args:
-            *args: Optional initialisation data. As for `dict`.
-            **kwargs: Optional initialisation data. As for `dict`.
-
-        """
-        super(CSLStyle, self).__init__(*args, **kwargs)
+        return cls.from_dict(json.loads(js))
+
+    def __init__(self, name=None, url=None, path=None, parent_url=None,
+                 hidden=False, id=None, citation_format=None, updated=None,
+                 locale=None):
+        """Create a new style."""
+        self.name = name
+        self.url = url
+        self.path = path
+        self.parent_url = parent_url
+        self.hidden = hidden
+        self.id = id
+        self.citation_format = citation_format
+        self.updated = updated
+        self.locale = locale
 
     @property
     def key(self):
@@ -297,16 +433,85 @@ class CSLStyle(AttrDict):
         """
         return self.url
 
-    def __unicode__(self):
+    def json(self):
+        """Serialise `CSLStyle` to JSON.
+
+        Returns:
+            str: JSON-encoded style.
+
+        """
+        return json.dumps(self.to_dict())
+
+    def __str__(self):
         """Return Unicode representation of style."""
         return u'[{}] {}'.format(self.key, self.name)
 
-    def __str__(self):
-        """Return UTF-8 representation of style."""
-        if isinstance(self, str):
-            return self
-        
-        
     def __repr__(self):
         """Code-like representation of style."""
         return 'CSLStyle(name={s.name!r}, path={s.path!r})'.format(s=self)
+
+
+class SearchHit(object):
+    """Search result containing the data needed to display an `Entry`.
+
+    Only the display columns are loaded from the search index. The
+    full `Entry` is retrieved when :attr:`entry` is first accessed.
+
+    Attributes:
+        id (int): Database ID of Entry
+        key (unicode): The unique identifier of the Entry.
+        library (int): Which library the Entry belongs to.
+        type (unicode): The type of Entry, e.g. "journalArticle".
+        title (unicode): The title of the Entry.
+        year (int): The year Entry was published.
+        creators (unicode): Formatted names of the Entry's creators.
+        attachments (int): Number of attachments.
+        notes (unicode): Text of the Entry's notes.
+        citekey (unicode or None): Better Bibtex citekey.
+        score (float): Search rank.
+
+    """
+
+    __slots__ = ('id', 'key', 'library', 'type', 'title', 'year',
+                 'creators', 'attachments', 'notes', 'citekey', 'score',
+                 '_loader', '_entry')
+
+    def __init__(self, id, key, library, type, title, year, creators,
+                 attachments, notes, citekey, score=0.0, loader=None):
+        """Create new `SearchHit`.
+
+        Args:
+            loader (callable, optional): Function that returns the
+                `Entry` for an ID.
+
+        """
+        self.id = id
+        self.key = key
+        self.library = library
+        self.type = type
+        self.title = title
+        self.year = year
+        self.creators = creators
+        self.attachments = attachments
+        self.notes = notes
+        self.citekey = citekey
+        self.score = score
+        self._loader = loader
+        self._entry = None
+
+    @property
+    def entry(self):
+        """Full `Entry` for this search result.
+
+        Returns:
+            Entry: Entry, or ``None`` if it's no longer in the index.
+
+        """
+        if self._entry is None and self._loader:
+            self._entry = self._loader(self.id)
+
+        return self._entry
+
+    def __repr__(self):
+        """Code-like representation of search result."""
+        return 'SearchHit(id={s.id!r}, title={s.title!r})'.format(s=self)
@@ -0,0 +1,283 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-03
+#
+
+"""Extract the text of Zotero notes.
+
+Zotero stores notes as HTML. Notes with lots of annotations can be
+hundreds of KB each, and every note of an item is converted to text
+whenever the item is re-indexed.
+
+`strip_tags()` removes markup from well-formed note HTML with a
+regular expression and decodes entities. Anything it can't handle
+safely (e.g. a stray ``<`` or a ``<script>`` element) is handed to
+`HTMLText`, which is based on Python's `HTMLParser`.
+
+`NoteCache` stores the text of notes keyed by a hash of their HTML,
+so notes that haven't changed are never parsed again.
+
+This module is only needed for indexing, so it isn't imported by
+searches.
+"""
+
+from __future__ import print_function, absolute_import
+
+import hashlib
+from html import unescape
+from html.parser import HTMLParser
+import logging
+import os
+import re
+import sqlite3
+import time
+
+from .util import batched, unicodify
+
+log = logging.getLogger(__name__)
+
+# Tags, comments, declarations and processing instructions. Quoted
+# attribute values may contain ">".
+_markup = re.compile(r"""
+    <(?:
+        /?[a-zA-Z][^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*    # tag
+        | !--.*?--                                          # comment
+        | ![a-zA-Z][^>]*                                    # declaration
+        | \?[^>]*                                           # PI
+    )>
+""", re.VERBOSE | re.DOTALL)
+
+# Elements whose contents `HTMLParser` treats as text
+_cdata = re.compile(r'<(?:script|style)\b', re.IGNORECASE).search
+
+
+class HTMLText(HTMLParser):
+    """Extract text from HTML.
+
+    Strips all tags from HTML.
+
+    Attributes:
+        data (list): Accumlated text content.
+
+    """
+
+    @classmethod
+    def strip(cls, html):
+        """Extract text from HTML.
+
+        Args:
+            html (unicode): HTML to process.
+
+        Returns:
+            unicode: Text content of HTML.
+
+        """
+        p = cls()
+        p.feed(html)
+        return str(p)
+
+    def __init__(self):
+        """Create new HTMLText."""
+        super().__init__()
+        self.reset()
+        self.data = []
+
+    def handle_data(self, s):
+        """Callback for contents of HTML tags.
+
+        Args:
+            s (unicode): Text from between HTML tags.
+        """
+        self.data.append(unicodify(s))
+
+    def __str__(self):
+        """Return text as Unicode."""
+        return u''.join(self.data)
+
+    def __unicode__(self):
+        """Return text as Unicode."""
+        return u''.join(self.data)
+
+
+def strip_tags(html):
+    """Extract text from HTML.
+
+    Gives the same result as `HTMLText.strip()`, but is several
+    times faster for the HTML Zotero writes.
+
+    Args:
+        html (unicode): HTML text.
+
+    Returns:
+        unicode: Text contained in HTML.
+
+    """
+    if u'<' not in html:
+        return unescape(html) if u'&' in html else html
+
+    parts = _markup.split(html)
+    if _cdata(html) or any(u'<' in s for s in parts):
+        return HTMLText.strip(html)
+
+    # Entities are decoded between tags, like `HTMLParser` does
+    return u''.join([unescape(s) if u'&' in s else s for s in parts])
+
+
+def truncate(text, limit):
+    """Shorten ``text`` to at most ``limit`` characters.
+
+    Text is cut at the last whitespace before ``limit``, if there is
+    any in the second half of the shortened text.
+
+    Args:
+        text (unicode): Text to shorten.
+        limit (int): Maximum length of text.
+
+    Returns:
+        unicode: ``text`` or its beginning.
+
+    """
+    if len(text) <= limit:
+        return text
+
+    text = text[:limit]
+    i = max(text.rfind(u' '), text.rfind(u'\n'))
+    if i > limit // 2:
+        text = text[:i]
+
+    return text
+
+
+def _digest(html):
+    """Hash of the HTML of a note."""
+    return hashlib.sha1(html.encode('utf-8')).digest()
+
+
+class NoteCache(object):
+    """Text of notes keyed by a hash of their HTML.
+
+    The cache is an SQLite database, so it can be shared by the
+    worker processes of a parallel reindex (see `zothero.parallel`).
+    Notes that haven't been looked up for `MAX_AGE` days are removed
+    when the cache is opened.
+
+    Attributes:
+        dbpath (str): Path to cache database.
+
+    """
+
+    # Increment when `strip_tags()` changes to empty the cache
+    VERSION = 1
+
+    # Days before unused notes are removed
+    MAX_AGE = 30
+
+    # Shorter notes are converted without the cache, as that's
+    # quicker than looking them up
+    MIN_SIZE = 4096
+
+    SCHEMA = u"""
+    CREATE TABLE IF NOT EXISTS notes (
+        hash BLOB PRIMARY KEY NOT NULL,
+        text TEXT NOT NULL,
+        used INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, dbpath):
+        """Create new `NoteCache` at ``dbpath``.
+
+        Args:
+            dbpath (str): Path to cache database. Created if it
+                doesn't exist.
+
+        """
+        self.dbpath = dbpath
+        self._conn = None
+
+    @property
+    def conn(self):
+        """Connection to the database."""
+        if not self._conn:
+            dirpath = os.path.dirname(self.dbpath)
+            if dirpath and not os.path.exists(dirpath):
+                os.makedirs(dirpath)
+
+            # Wait for other workers' writes
+            conn = sqlite3.connect(self.dbpath, timeout=30)
+            with conn:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version != self.VERSION:
+                    log.debug('[notes] new cache (version %d)', self.VERSION)
+                    conn.execute(u'DROP TABLE IF EXISTS notes')
+                    conn.execute('PRAGMA user_version = %d' % self.VERSION)
+
+                conn.execute(self.SCHEMA)
+                conn.execute(u'DELETE FROM notes WHERE used < ?',
+                             (_today() - self.MAX_AGE,))
+
+            self._conn = conn
+
+        return self._conn
+
+    def texts(self, notes):
+        """Text of notes.
+
+        Notes that aren't in the cache are converted with
+        `strip_tags()` and added to it. Notes shorter than `MIN_SIZE`
+        aren't cached.
+
+        Args:
+            notes (list): HTML of notes.
+
+        Returns:
+            list: Text of each note in ``notes``.
+
+        """
+        digests = [_digest(html) if len(html) >= self.MIN_SIZE else None
+                   for html in notes]
+        cached = {None: None}
+        sql = u'SELECT hash, text FROM notes WHERE hash IN ({})'
+        for batch in batched({d for d in digests if d}, 500):
+            q = sql.format(u', '.join(u'?' * len(batch)))
+            cached.update(self.conn.execute(q, batch))
+
+        today = _today()
+        found = [d for d in cached if d]
+        new = []
+        texts = []
+        for digest, html in zip(digests, notes):
+            if digest is None:
+                texts.append(strip_tags(html))
+                continue
+
+            if digest not in cached:
+                cached[digest] = strip_tags(html)
+                new.append((digest, cached[digest], today))
+
+            texts.append(cached[digest])
+
+        with self.conn as c:
+            c.executemany(u'INSERT OR REPLACE INTO notes VALUES (?, ?, ?)',
+                          new)
+            c.executemany(u'UPDATE notes SET used = ? '
+                          u'WHERE hash = ? AND used < ?',
+                          [(today, d, today) for d in found])
+
+        log.debug('[notes] %d cached, %d new', len(found), len(new))
+        return texts
+
+    def close(self):
+        """Close the database connection."""
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+
+def _today():
+    """Number of days since the epoch."""
+    return int(time.time() // 86400)
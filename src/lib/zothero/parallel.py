@@ -0,0 +1,134 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-02
+#
+
+"""Build index rows in a pool of worker processes.
+
+Most of the time a full reindex takes is spent loading `Entry`
+objects (stripping the HTML from notes, parsing dates) and turning
+them into index rows with `index.entry_rows()`, which only uses one
+core. `iter_rows()` splits the item IDs into ranges of `RANGE_SIZE`
+items and has a pool of worker processes build the rows for each
+range. Each worker opens its own read-only connection to the Zotero
+database. The rows are sent back to the calling process, which is
+the only one that writes to the index.
+"""
+
+from __future__ import print_function, absolute_import
+
+from collections import deque
+from itertools import islice
+import logging
+import multiprocessing
+
+log = logging.getLogger(__name__)
+
+# Number of items in each range of IDs handed to a worker
+RANGE_SIZE = 2000
+
+# Maximum number of workers `default_workers()` returns
+MAX_WORKERS = 4
+
+# Set in each worker process by `_init_worker()`
+_zot = None
+_codec = None
+
+
+def default_workers():
+    """Number of workers to use if the user hasn't set one.
+
+    Returns:
+        int: Number of CPUs, but at most `MAX_WORKERS`.
+
+    """
+    try:
+        n = multiprocessing.cpu_count()
+    except NotImplementedError:
+        n = 1
+
+    return max(1, min(n, MAX_WORKERS))
+
+
+def _init_worker(datadir, dbpath, attachments_dir, notes_cache, codec):
+    """Open Zotero database in worker process."""
+    global _zot, _codec
+    from .serialise import get_codec
+    from .zotero import Zotero
+
+    _zot = Zotero(datadir, dbpath, attachments_dir, readonly=True,
+                  notes_cache=notes_cache)
+    _codec = get_codec(codec)
+
+
+def _range_rows(bounds):
+    """Index rows for entries in range ``bounds``.
+
+    Called in a worker process.
+
+    Args:
+        bounds (tuple): ``(start, end)`` for `Zotero.entries_between()`.
+
+    Returns:
+        list: `index.entry_rows()` for each entry in the range.
+
+    """
+    from .index import entry_rows
+
+    return [entry_rows(e, _codec) for e in _zot.entries_between(*bounds)]
+
+
+def iter_rows(zot, codec, workers=None):
+    """Build index rows for all entries in a pool of processes.
+
+    No pool is started if ``workers`` is 1 or there's only one range
+    of IDs. Each worker has at most two ranges queued, so rows can't
+    pile up in memory if writing them is slower than building them.
+
+    Args:
+        zot (zotero.Zotero): Zotero database to index.
+        codec (str): Name of codec to serialise entries with.
+        workers (int, optional): Number of worker processes.
+            Defaults to `default_workers()`.
+
+    Yields:
+        list: `index.entry_rows()` for the entries in each range of
+            IDs, in order of ID.
+
+    """
+    workers = workers or default_workers()
+    ranges = zot.id_ranges(RANGE_SIZE)
+    args = (zot.datadir, zot.dbpath, zot._attachments_dir, zot.notes_cache,
+            codec)
+
+    if workers < 2 or len(ranges) < 2:
+        log.debug('[parallel] %d range(s), building rows in-process',
+                  len(ranges))
+        from .index import entry_rows
+        from .serialise import get_codec
+        codec = get_codec(codec)
+        for bounds in ranges:
+            yield [entry_rows(e, codec) for e in zot.entries_between(*bounds)]
+        return
+
+    log.debug('[parallel] %d ranges, %d workers', len(ranges), workers)
+    pool = multiprocessing.Pool(workers, _init_worker, args)
+    try:
+        todo = iter(ranges)
+        pending = deque(pool.apply_async(_range_rows, (bounds,))
+                        for bounds in islice(todo, workers * 2))
+        while pending:
+            rows = pending.popleft().get()
+            for bounds in islice(todo, 1):
+                pending.append(pool.apply_async(_range_rows, (bounds,)))
+
+            yield rows
+
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,277 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-06
+#
+
+"""Cache search results between keystrokes.
+
+Alfred runs ``zh.py search`` for every keystroke, and again every
+0.2 seconds while the index is being updated, so the same queries
+are searched for over and over.
+
+`ResultCache` stores the result of a query until the index changes.
+Results are keyed by the normalised query and the generation of the
+index (see `index.Index.generation`), so they needn't be
+invalidated: a new generation simply uses different keys, and the
+old ones are evicted.
+"""
+
+from __future__ import print_function, absolute_import
+
+import json
+import logging
+import os
+import time
+
+from .db import connect
+
+log = logging.getLogger(__name__)
+
+
+def normalise(query):
+    """Normalise whitespace in ``query``.
+
+    Runs of whitespace are collapsed and leading whitespace is
+    removed. Trailing whitespace is kept, as it stops the last term
+    being searched for as a prefix.
+
+    Args:
+        query (unicode): User query.
+
+    Returns:
+        unicode: Normalised query.
+
+    """
+    s = u' '.join(query.split())
+    if s and query[-1:].isspace():
+        s += u' '
+    return s
+
+
+class ResultCache(object):
+    """Least-recently used cache of search results.
+
+    Values are stored as JSON in an SQLite database, so they're
+    shared by ``zh.py`` processes. When a new value is stored,
+    values of other generations, values that haven't been used for
+    `MAX_AGE` seconds and, if the values are larger than `MAX_SIZE`
+    in total, the least-recently used ones are removed.
+
+    The number of hits and misses and the time taken by each are
+    counted per name (see `stats()`). So that hits don't write to the
+    database, a value's last-used time is only updated if it's more
+    than `TOUCH_AGE` seconds old, and the statistics are kept in
+    memory until a miss (or such an update) writes to the database
+    anyway, or the cache is closed. Hits counted by a process that
+    exits without writing are lost.
+
+    Attributes:
+        dbpath (str): Path to cache database.
+
+    """
+
+    # Increment when the format of cached values changes
+    VERSION = 1
+
+    # Seconds before unused values are removed
+    MAX_AGE = 86400
+
+    # Seconds before the last-used time of a value is updated
+    TOUCH_AGE = 60
+
+    # Maximum size of all values in bytes
+    MAX_SIZE = 4 * 1024 * 1024
+
+    SCHEMA = u"""
+    CREATE TABLE IF NOT EXISTS results (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        generation INTEGER NOT NULL,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        used REAL NOT NULL,
+        PRIMARY KEY (name, key, generation)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS stats (
+        name TEXT PRIMARY KEY NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        misses INTEGER NOT NULL DEFAULT 0,
+        hit_time REAL NOT NULL DEFAULT 0,
+        miss_time REAL NOT NULL DEFAULT 0
+    );
+    """
+
+    def __init__(self, dbpath):
+        """Create new `ResultCache` at ``dbpath``.
+
+        Args:
+            dbpath (str): Path to cache database. Created if it
+                doesn't exist.
+
+        """
+        self.dbpath = dbpath
+        self._conn = None
+        # Statistics that haven't been saved:
+        # {name: [hits, misses, hit_time, miss_time]}
+        self._stats = {}
+
+    @property
+    def conn(self):
+        """Connection to the database."""
+        if not self._conn:
+            dirpath = os.path.dirname(self.dbpath)
+            if dirpath and not os.path.exists(dirpath):
+                os.makedirs(dirpath)
+
+            conn = connect(self.dbpath)
+            with conn:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version != self.VERSION:
+                    log.debug('[results] new cache (version %d)',
+                              self.VERSION)
+                    conn.execute(u'DROP TABLE IF EXISTS results')
+                    conn.execute(u'DROP TABLE IF EXISTS stats')
+                    conn.execute('PRAGMA user_version = %d' % self.VERSION)
+
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+
+        return self._conn
+
+    def fetch(self, name, key, generation, func):
+        """Return cached result of ``func``.
+
+        If there is no value for ``key`` in generation ``generation``,
+        ``func`` is called and its result is cached.
+
+        Args:
+            name (str): Kind of value, e.g. "search". Values of each
+                name are counted separately.
+            key (unicode): Key of value, e.g. a normalised query.
+            generation (int): Generation of the index.
+            func (callable): Function that returns the value. It must
+                be serialisable as JSON.
+
+        Returns:
+            object: Cached or new value.
+
+        """
+        start = time.time()
+        sql = u"""
+            SELECT value, used FROM results
+            WHERE name = ? AND key = ? AND generation = ?
+        """
+        row = self.conn.execute(sql, (name, key, generation)).fetchone()
+        if row:
+            value = json.loads(row[0])
+            now = time.time()
+            self._count(name, True, now - start)
+            # Hits are read-only unless the value's last-used time is
+            # too old to be left as it is
+            if now - row[1] > self.TOUCH_AGE:
+                with self.conn as c:
+                    c.execute(u'UPDATE results SET used = ? WHERE name = ? '
+                              u'AND key = ? AND generation = ?',
+                              (now, name, key, generation))
+                    self._flush(c)
+        else:
+            value = func()
+            js = json.dumps(value)
+            now = time.time()
+            self._count(name, False, now - start)
+            with self.conn as c:
+                c.execute(u'INSERT OR REPLACE INTO results '
+                          u'VALUES (?, ?, ?, ?, ?, ?)',
+                          (name, key, generation, js, len(js), now))
+                self._evict(c, generation, now)
+                self._flush(c)
+
+        log.debug('[results] %s %s %r in %0.1fms', name,
+                  'hit' if row else 'miss', key, (now - start) * 1000)
+        return value
+
+    def _count(self, name, hit, duration):
+        """Add a hit or miss to the statistics that aren't saved yet."""
+        counts = self._stats.setdefault(name, [0, 0, 0.0, 0.0])
+        i = 0 if hit else 1
+        counts[i] += 1
+        counts[i + 2] += duration
+
+    def _flush(self, c):
+        """Save statistics counted by `fetch()` to the database."""
+        for name, (hits, misses, hit_time, miss_time) in self._stats.items():
+            c.execute(u'INSERT OR IGNORE INTO stats (name) VALUES (?)',
+                      (name,))
+            c.execute(u'UPDATE stats SET hits = hits + ?, '
+                      u'misses = misses + ?, hit_time = hit_time + ?, '
+                      u'miss_time = miss_time + ? WHERE name = ?',
+                      (hits, misses, hit_time, miss_time, name))
+
+        self._stats = {}
+
+    def _evict(self, c, generation, now):
+        """Remove outdated and least-recently used values."""
+        c.execute(u'DELETE FROM results WHERE generation != ? OR used < ?',
+                  (generation, now - self.MAX_AGE))
+
+        size = c.execute(u'SELECT SUM(size) FROM results').fetchone()[0] or 0
+        if size <= self.MAX_SIZE:
+            return
+
+        rows = c.execute(u'SELECT name, key, generation, size FROM results '
+                         u'ORDER BY used ASC').fetchall()
+        evict = []
+        for row in rows:
+            if size <= self.MAX_SIZE:
+                break
+            evict.append(tuple(row)[:3])
+            size -= row['size']
+
+        c.executemany(u'DELETE FROM results '
+                      u'WHERE name = ? AND key = ? AND generation = ?', evict)
+        log.debug('[results] evicted %d value(s)', len(evict))
+
+    def stats(self):
+        """Hit rate and latency of cache.
+
+        Returns:
+            dict: Statistics for each name, a `dict` with the keys
+                ``hits``, ``misses``, ``hit_rate`` (0.0-1.0), and
+                ``hit_ms`` and ``miss_ms`` (mean latency).
+
+        """
+        counts = {}
+        for row in self.conn.execute(u'SELECT * FROM stats'):
+            counts[row['name']] = [row['hits'], row['misses'],
+                                   row['hit_time'], row['miss_time']]
+
+        for name, values in self._stats.items():
+            total = counts.setdefault(name, [0, 0, 0.0, 0.0])
+            for i, n in enumerate(values):
+                total[i] += n
+
+        stats = {}
+        for name, (hits, misses, hit_time, miss_time) in counts.items():
+            stats[name] = dict(
+                hits=hits,
+                misses=misses,
+                hit_rate=hits / float(hits + misses or 1),
+                hit_ms=hit_time * 1000 / (hits or 1),
+                miss_ms=miss_time * 1000 / (misses or 1),
+            )
+
+        return stats
+
+    def close(self):
+        """Save statistics and close the database connection."""
+        if self._conn:
+            if self._stats:
+                with self._conn as c:
+                    self._flush(c)
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,273 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-28
+#
+
+"""Codecs for storing `Entry` objects in the search index.
+
+Each codec converts an `Entry` to a ``str`` or ``bytes`` value for
+the index's ``data`` table and back again. Codecs are looked up by
+name with `get_codec()`:
+
+- ``json``: Indented JSON with sorted keys (the original format).
+- ``json-compact``: JSON without whitespace (`Entry.json()`).
+- ``pickle``: Pickle protocol 5 (or the highest the Python supports).
+- ``binary``: Length-prefixed strings, see `BinaryCodec`.
+"""
+
+from __future__ import print_function, absolute_import
+
+from datetime import datetime, timedelta
+import json
+import pickle
+import struct
+
+from .models import Attachment, Collection, Creator, Entry
+from .util import json_serialise
+
+# Codec used for new indexes. ``binary`` is the smallest and decodes
+# almost as fast as ``pickle`` (see bench/bench_codecs.py). Pickle is
+# opt-in: unpickling executes whatever a modified index contains.
+DEFAULT_CODEC = 'binary'
+
+
+class Codec(object):
+    """Base class for `Entry` codecs.
+
+    Attributes:
+        name (str): Name the codec is registered under.
+
+    """
+
+    name = None
+
+    def encode(self, entry):
+        """Serialise `Entry`.
+
+        Args:
+            entry (models.Entry): Entry to serialise.
+
+        Returns:
+            str or bytes: Serialised Entry.
+
+        """
+        raise NotImplementedError()
+
+    def decode(self, data):
+        """Deserialise `Entry`.
+
+        Args:
+            data (str or bytes): Output of :meth:`encode`.
+
+        Returns:
+            models.Entry: Deserialised Entry.
+
+        """
+        raise NotImplementedError()
+
+
+class JSONCodec(Codec):
+    """Serialise entries as indented, key-sorted JSON."""
+
+    name = 'json'
+
+    def encode(self, entry):
+        """Serialise `Entry` to JSON."""
+        return json.dumps(entry.to_dict(), indent=2, sort_keys=True,
+                          default=json_serialise)
+
+    def decode(self, data):
+        """Deserialise `Entry` from JSON."""
+        return Entry.from_json(data)
+
+
+class CompactJSONCodec(JSONCodec):
+    """Serialise entries as JSON without whitespace."""
+
+    name = 'json-compact'
+
+    def encode(self, entry):
+        """Serialise `Entry` to compact JSON."""
+        return entry.json()
+
+
+class PickleCodec(Codec):
+    """Serialise entries with `pickle`."""
+
+    name = 'pickle'
+
+    # Protocol 5 is available from Python 3.8
+    protocol = min(5, pickle.HIGHEST_PROTOCOL)
+
+    def encode(self, entry):
+        """Pickle `Entry`."""
+        return pickle.dumps(entry, self.protocol)
+
+    def decode(self, data):
+        """Unpickle `Entry`."""
+        return pickle.loads(data)
+
+
+class BinaryCodec(Codec):
+    """Serialise entries to a compact binary format.
+
+    The format is a fixed header of integers and counts, the
+    ``index`` of each `Creator`, the length of each string (in
+    characters, `NONE` for ``None``), and finally all the strings as
+    one block of UTF-8. Decoding takes one call to `struct` per
+    section and one UTF-8 decode, and needs no C extensions.
+
+    The strings are stored in this order: `STRINGS`, ``zdata`` keys
+    and values, then the attributes of each creator, collection and
+    attachment, then the notes and the tags.
+
+    Only string values are supported in ``zdata``, which is all
+    Zotero stores there.
+    """
+
+    name = 'binary'
+
+    # Format version, ID, library, year, modified (seconds since EPOCH),
+    # and number of zdata items, creators, collections, attachments,
+    # notes and tags
+    HEADER = struct.Struct('<BqqqqIIIIII')
+    VERSION = 1
+
+    # Length of ``None`` strings, and value of `modified` if it's ``None``
+    NONE = 0xffffffff
+    NO_TIME = -2 ** 63
+
+    EPOCH = datetime(1970, 1, 1)
+
+    # String attributes of `Entry`
+    STRINGS = ('key', 'type', 'title', 'date', 'abstract', 'citekey')
+
+    def encode(self, entry):
+        """Serialise `Entry` to bytes."""
+        e = entry
+        strings = [e.key, e.type, e.title, e.date, e.abstract, e.citekey]
+        for k, v in e.zdata.items():
+            strings += (k, v)
+        for c in e.creators:
+            strings += (c.given, c.family, c.type)
+        for c in e.collections:
+            strings += (c.name, c.key)
+        for a in e.attachments:
+            strings += (a.key, a.name, a.path, a.url)
+        strings += e.notes
+        strings += e.tags
+
+        for s in strings:
+            if s is not None and not isinstance(s, str):
+                raise TypeError('cannot encode %r for entry %r' % (s, e.id))
+
+        if e.modified is None:
+            modified = self.NO_TIME
+        else:
+            modified = int((e.modified - self.EPOCH).total_seconds())
+
+        header = self.HEADER.pack(
+            self.VERSION, e.id, e.library, e.year or 0, modified,
+            len(e.zdata), len(e.creators), len(e.collections),
+            len(e.attachments), len(e.notes), len(e.tags))
+
+        n = len(e.creators)
+        indexes = struct.pack('<%dq' % n, *[c.index for c in e.creators])
+
+        n = len(strings)
+        lengths = struct.pack('<%dI' % n, *[self.NONE if s is None
+                                            else len(s) for s in strings])
+        text = u''.join([s for s in strings if s]).encode('utf-8')
+
+        return header + indexes + lengths + text
+
+    def decode(self, data):
+        """Deserialise `Entry` from bytes."""
+        (version, id_, library, year, modified, nzdata, ncreators,
+         ncollections, nattachments, nnotes, ntags) = \
+            self.HEADER.unpack_from(data)
+
+        if version != self.VERSION:
+            raise ValueError('unknown binary format: %r' % version)
+
+        off = self.HEADER.size
+        indexes = struct.unpack_from('<%dq' % ncreators, data, off)
+        off += 8 * ncreators
+
+        nstrings = (len(self.STRINGS) + 2 * nzdata + 3 * ncreators +
+                    2 * ncollections + 4 * nattachments + nnotes + ntags)
+        lengths = struct.unpack_from('<%dI' % nstrings, data, off)
+        off += 4 * nstrings
+
+        text = str(memoryview(data)[off:], 'utf-8')
+        strings = []
+        i = 0
+        for n in lengths:
+            if n == self.NONE:
+                strings.append(None)
+            else:
+                strings.append(text[i:i + n])
+                i += n
+
+        key, type_, title, date, abstract, citekey = strings[:6]
+
+        i, j = 6, 6 + 2 * nzdata
+        zdata = dict(zip(strings[i:j:2], strings[i + 1:j:2]))
+
+        i, j = j, j + 3 * ncreators
+        creators = [Creator(*t) for t in zip(indexes, strings[i:j:3],
+                                             strings[i + 1:j:3],
+                                             strings[i + 2:j:3])]
+
+        i, j = j, j + 2 * ncollections
+        collections = [Collection(*t) for t in zip(strings[i:j:2],
+                                                   strings[i + 1:j:2])]
+
+        i, j = j, j + 4 * nattachments
+        attachments = [Attachment(*t) for t in zip(strings[i:j:4],
+                                                   strings[i + 1:j:4],
+                                                   strings[i + 2:j:4],
+                                                   strings[i + 3:j:4])]
+
+        i, j = j, j + nnotes
+        notes = strings[i:j]
+        tags = strings[j:]
+
+        if modified == self.NO_TIME:
+            modified = None
+        else:
+            modified = self.EPOCH + timedelta(seconds=modified)
+
+        return Entry(id=id_, key=key, library=library, type=type_,
+                     modified=modified, title=title, date=date, year=year,
+                     abstract=abstract, zdata=zdata, collections=collections,
+                     creators=creators, attachments=attachments,
+                     notes=notes, tags=tags, citekey=citekey)
+
+
+# Registered codecs, keyed by name
+CODECS = {c.name: c() for c in (JSONCodec, CompactJSONCodec,
+                                PickleCodec, BinaryCodec)}
+
+
+def get_codec(name):
+    """Return codec called ``name``.
+
+    Args:
+        name (str): Name of codec.
+
+    Returns:
+        Codec: The named codec.
+
+    Raises:
+        ValueError: Raised if there's no codec called ``name``.
+
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError('unknown codec: %r' % name)
@@ -0,0 +1,556 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-31
+#
+
+"""Keep a private copy of Zotero's database up to date.
+
+Zotero locks ``zotero.sqlite``, so ZotHero reads a copy of it (a
+snapshot). Copying the whole database every time its mtime changes is
+slow for large libraries, so `Snapshot` only refreshes the copy when
+the database's content has changed, and then copies as little as
+possible.
+
+Whether the content has changed is decided by the database's
+`Signature`: the change counter in its header (which SQLite increments
+on every write transaction in rollback-journal mode), its size, and
+the size and header of its write-ahead log. The WAL header's checkpoint
+sequence number and salts change whenever SQLite restarts the WAL, so
+a WAL rewritten to the same size is noticed, too. ``PRAGMA
+data_version`` would be the API
+for this, but it only reports changes to other connections of the
+same process. The signature the snapshot was taken from is stored in
+a JSON file next to it (``<snapshot>.json``).
+
+The snapshot is refreshed with the first of these methods that works:
+
+- ``pages``: Compare the database to the snapshot page by page and
+  write only the pages that differ. Only used when the database has
+  no WAL and nothing is being written to it, and only if its
+  signature is the same after copying as before. Other processes may
+  be reading the snapshot, so the pages are written to a copy of it
+  (or, for a new snapshot or one with a WAL, a new file) that then
+  replaces it.
+- ``backup``: Copy the database with SQLite's backup API, a few pages
+  at a time, into a new file that replaces the snapshot. The database
+  is opened read-only, or if Zotero has it locked, with
+  ``immutable=1`` when that is safe (as for ``pages``).
+- ``copy``: Copy the database file (and its WAL, if any).
+"""
+
+from __future__ import print_function, absolute_import
+
+from contextlib import contextmanager
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import struct
+import time
+
+from .util import shortpath
+
+# Methods used to update snapshots, in the order they're tried
+METHODS = ('pages', 'backup', 'copy')
+
+# Number of pages copied by each step of an SQLite backup
+BACKUP_STEP = 4096
+
+# Number of times a backup step may find the database locked before
+# the backup is abandoned. Python waits 250ms between attempts.
+BACKUP_BUSY_TRIES = 4
+
+# SQLITE_BUSY and SQLITE_LOCKED result codes
+_busy = (5, 6)
+
+# Number of pages compared at a time by the ``pages`` method
+CHUNK_PAGES = 256
+
+# Times to try the ``pages`` method if the database changes while
+# it's being copied
+RETRIES = 3
+
+# Magic string at the start of an SQLite database
+MAGIC = b'SQLite format 3\x00'
+
+# Magic string at the start of a rollback journal that is in use.
+# Zotero keeps its journal between transactions (as SQLite does in
+# exclusive locking mode), but zeroes this header.
+JOURNAL_MAGIC = b'\xd9\xd5\x05\xf9\x20\xa1\x63\xd7'
+
+# Database header fields (all big-endian): page size (offset 16),
+# file change counter (24) and size in pages (28)
+_header = struct.Struct('>16sH6xII')
+
+log = logging.getLogger(__name__)
+
+
+class SnapshotError(Exception):
+    """Raised if a snapshot method can't be used."""
+
+
+class Signature(object):
+    """Identifies the content of an SQLite database file.
+
+    Attributes:
+        counter (int): File change counter from the database header.
+        pages (int): Size of the database in pages, from its header.
+        page_size (int): Size of pages in bytes.
+        size (int): Size of database file in bytes.
+        mtime (float): Modification time of database file.
+        wal (int): Size of the write-ahead log in bytes.
+        wal_id (str): Checkpoint sequence number and salts from the
+            header of the write-ahead log (hex) or an empty string.
+        journal (bool): ``True`` if the rollback journal is in use,
+            i.e. changes are being written to the database file.
+
+    """
+
+    __slots__ = ('counter', 'pages', 'page_size', 'size', 'mtime',
+                 'wal', 'wal_id', 'journal')
+
+    # Attributes that change when the content changes
+    CONTENT = ('counter', 'pages', 'page_size', 'size', 'wal', 'wal_id')
+
+    def __init__(self, counter=0, pages=0, page_size=0, size=0, mtime=0.0,
+                 wal=0, wal_id='', journal=False):
+        """Create new `Signature`."""
+        self.counter = counter
+        self.pages = pages
+        self.page_size = page_size
+        self.size = size
+        self.mtime = mtime
+        self.wal = wal
+        self.wal_id = wal_id
+        self.journal = journal
+
+    @classmethod
+    def read(cls, path):
+        """Read the signature of database at ``path``.
+
+        Args:
+            path (str): Path to SQLite database.
+
+        Returns:
+            Signature: Signature of database.
+
+        Raises:
+            ValueError: Raised if ``path`` isn't an SQLite database.
+
+        """
+        with open(path, 'rb') as fp:
+            st = os.fstat(fp.fileno())
+            header = fp.read(_header.size)
+
+        if len(header) < _header.size or not header.startswith(MAGIC):
+            raise ValueError('not an SQLite database: %r' % path)
+
+        _, page_size, counter, pages = _header.unpack(header)
+        if page_size == 1:  # 65536 doesn't fit in 2 bytes
+            page_size = 65536
+
+        wal = path + '-wal'
+        return cls(counter, pages, page_size, st.st_size, st.st_mtime,
+                   _filesize(wal), _wal_id(wal), _journal_in_use(path))
+
+    @property
+    def clean(self):
+        """``True`` if the database file contains all its data.
+
+        That is, there is no write-ahead log and the rollback journal
+        isn't in use, so it's safe to read the file directly.
+        """
+        return not self.wal and not self.journal
+
+    def same_content(self, other):
+        """Return ``True`` if ``other`` has the same content.
+
+        Args:
+            other (Signature): Signature to compare to.
+
+        Returns:
+            bool: Whether the signatures have the same content.
+
+        """
+        return all(getattr(self, k) == getattr(other, k)
+                   for k in self.CONTENT)
+
+    def to_dict(self):
+        """Signature as a `dict`."""
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __eq__(self, other):
+        """Compare signatures."""
+        if not isinstance(other, Signature):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        """Compare signatures."""
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Code-like representation."""
+        return 'Signature({})'.format(', '.join(
+            '{}={!r}'.format(k, getattr(self, k)) for k in self.__slots__))
+
+
+def _journal_in_use(path):
+    """Return ``True`` if the rollback journal of ``path`` is in use."""
+    try:
+        with open(path + '-journal', 'rb') as fp:
+            return fp.read(len(JOURNAL_MAGIC)) == JOURNAL_MAGIC
+    except (IOError, OSError):
+        return False
+
+
+def _wal_id(path):
+    """Return checkpoint sequence and salts of WAL at ``path`` as hex.
+
+    Returns an empty string if there is no WAL (or it has no header).
+    """
+    try:
+        with open(path, 'rb') as fp:
+            header = fp.read(24)
+    except (IOError, OSError):
+        return ''
+
+    return header[12:24].hex()
+
+
+def _filesize(path):
+    """Size of file at ``path`` or 0 if it doesn't exist."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class Snapshot(object):
+    """A copy of an SQLite database that is updated when it changes.
+
+    Attributes:
+        source (str): Path to original database.
+        path (str): Path to the copy.
+        methods (tuple): Names of methods to update the copy with, in
+            the order they're tried. See module docstring.
+        signature (Signature): Signature of `source` the copy was
+            taken from or ``None``.
+        method (str): Name of method used for the last update.
+        written (int): Number of bytes copied from `source` by the
+            last update.
+
+    """
+
+    def __init__(self, source, path, methods=METHODS):
+        """Create new `Snapshot`.
+
+        Args:
+            source (str): Path to original database.
+            path (str): Path to store the copy at.
+            methods (tuple, optional): Methods to update copy with.
+
+        """
+        for name in methods:
+            if name not in METHODS:
+                raise ValueError('unknown snapshot method: %r' % name)
+
+        self.source = source
+        self.path = path
+        self.methods = tuple(methods)
+        self.signature = None
+        self.method = None
+        self.written = 0
+
+    @property
+    def meta_path(self):
+        """Path to file the snapshot's `Signature` is stored in."""
+        return self.path + '.json'
+
+    @property
+    def stale(self):
+        """``True`` if `source` has changed since the snapshot was taken."""
+        if self.signature is None:
+            self.signature = self._load_signature()
+
+        if not self.signature or not os.path.exists(self.path):
+            return True
+
+        return not Signature.read(self.source).same_content(self.signature)
+
+    def update(self, force=False):
+        """Update the snapshot if `source` has changed.
+
+        Args:
+            force (bool, optional): Copy `source` even if it hasn't
+                changed.
+
+        Returns:
+            bool: ``True`` if the snapshot was updated.
+
+        """
+        with self._lock():
+            # Another process may have updated the snapshot
+            self.signature = self._load_signature()
+            sig = Signature.read(self.source)
+
+            if not force and self.signature and os.path.exists(self.path) \
+                    and sig.same_content(self.signature):
+                if sig.mtime != self.signature.mtime:  # only touched
+                    self._save_signature(sig)
+                return False
+
+            start = time.time()
+            for name in self.methods:
+                try:
+                    sig, written = getattr(self, '_update_' + name)(sig)
+                except (SnapshotError, sqlite3.Error) as err:
+                    log.debug('[snapshot] %s failed: %s', name, err)
+                    continue
+
+                self.method, self.written = name, written
+                self._save_signature(sig)
+                log.debug('[snapshot] updated %r with %s in %0.3fs, '
+                          '%d byte(s) written', shortpath(self.path), name,
+                          time.time() - start, written)
+                return True
+
+        raise SnapshotError('could not copy %r' % self.source)
+
+    def _update_pages(self, sig):
+        """Write pages of `source` that differ from `path`.
+
+        Args:
+            sig (Signature): Signature of `source` before copying.
+
+        Returns:
+            tuple: Signature of `source` and number of bytes written.
+
+        Raises:
+            SnapshotError: Raised if `source` is in WAL mode, is being
+                written to, or keeps changing while it's copied.
+
+        """
+        for _ in range(RETRIES):
+            if not sig.clean:
+                raise SnapshotError('database is being written to')
+
+            written = self._copy_pages(sig.page_size)
+            after = Signature.read(self.source)
+            if after.same_content(sig):
+                return after, written
+
+            log.debug('[snapshot] database changed during copy, retrying')
+            sig = after
+
+        raise SnapshotError('database keeps changing')
+
+    def _copy_pages(self, page_size):
+        """Copy pages of `source` that differ from those in `path`.
+
+        The pages are written to a copy of the snapshot, which then
+        replaces it. Other processes may be reading the snapshot, so
+        it's never written to in place.
+
+        Args:
+            page_size (int): Page size of `source`.
+
+        Returns:
+            int: Number of bytes copied from `source`.
+
+        """
+        from shutil import copyfile
+
+        tmp = self.path + '.tmp'
+        try:
+            if os.path.exists(self.path) and \
+                    not os.path.exists(self.path + '-wal'):
+                copyfile(self.path, tmp)
+                written = self._write_pages(tmp, 'r+b', page_size)
+            else:
+                written = self._write_pages(tmp, 'w+b', page_size)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+        os.rename(tmp, self.path)
+        self._discard_wal()
+        return written
+
+    def _write_pages(self, path, mode, page_size):
+        """Write pages of `source` that differ from those in ``path``.
+
+        Args:
+            path (str): File to write to.
+            mode (str): Mode to open ``path`` with.
+            page_size (int): Page size of `source`.
+
+        Returns:
+            int: Number of bytes written.
+
+        """
+        size = page_size * CHUNK_PAGES
+        written = 0
+        with open(self.source, 'rb') as src, open(path, mode) as dst:
+            offset = 0
+            while True:
+                data = src.read(size)
+                if not data:
+                    break
+
+                old = dst.read(len(data))
+                if data != old:
+                    for i in range(0, len(data), page_size):
+                        page = data[i:i + page_size]
+                        if page != old[i:i + page_size]:
+                            dst.seek(offset + i)
+                            dst.write(page)
+                            written += len(page)
+
+                offset += len(data)
+                dst.seek(offset)
+
+            dst.truncate(offset)
+
+        return written
+
+    def _update_backup(self, sig):
+        """Copy `source` with SQLite's backup API.
+
+        Args:
+            sig (Signature): Signature of `source` before copying.
+
+        Returns:
+            tuple: Signature of `source` and number of bytes written.
+
+        """
+        try:
+            return self._backup(sig, False)
+        except sqlite3.OperationalError as err:
+            if 'locked' not in str(err) or not sig.clean:
+                raise
+
+        # Zotero has the database locked. Read it anyway, and
+        # check it didn't change while it was being copied.
+        _, written = self._backup(sig, True)
+        if not Signature.read(self.source).same_content(sig):
+            raise SnapshotError('database changed during backup')
+
+        return sig, written
+
+    def _backup(self, sig, immutable):
+        """Copy `source` to `path` with SQLite's backup API.
+
+        Args:
+            sig (Signature): Signature of `source` before copying.
+            immutable (bool): Open `source` with ``immutable=1``, so
+                SQLite ignores locks.
+
+        Returns:
+            tuple: Signature of `source` and number of bytes written.
+
+        """
+        from urllib.parse import quote
+
+        busy = [0]
+
+        def progress(status, remaining, total):
+            # Python retries locked steps forever, and Zotero never
+            # releases its lock
+            if status in _busy:
+                busy[0] += 1
+                if busy[0] >= BACKUP_BUSY_TRIES:
+                    raise sqlite3.OperationalError('database is locked')
+                return
+
+            busy[0] = 0
+            log.debug('[snapshot] backup: %d/%d pages copied',
+                      total - remaining, total)
+
+        uri = 'file:{}?mode=ro'.format(quote(os.path.abspath(self.source)))
+        if immutable:
+            uri += '&immutable=1'
+
+        tmp = self.path + '.tmp'
+        src = sqlite3.connect(uri, timeout=0.25, uri=True)
+        try:
+            dst = sqlite3.connect(tmp)
+            try:
+                src.backup(dst, pages=BACKUP_STEP, progress=progress)
+            finally:
+                dst.close()
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        finally:
+            src.close()
+
+        written = os.path.getsize(tmp)
+        os.rename(tmp, self.path)
+        self._discard_wal()
+        # The backup is at least as new as `sig` (and includes the WAL,
+        # if any). Any later changes are picked up by the next update.
+        return sig, written
+
+    def _update_copy(self, sig):
+        """Copy `source` and its write-ahead log, if any.
+
+        Args:
+            sig (Signature): Signature of `source` before copying.
+
+        Returns:
+            tuple: Signature of `source` and number of bytes written.
+
+        """
+        from shutil import copyfile
+
+        copyfile(self.source, self.path)
+        written = os.path.getsize(self.path)
+        self._discard_wal()
+        # SQLite applies the WAL when the copy is opened
+        if sig.wal:
+            copyfile(self.source + '-wal', self.path + '-wal')
+            written += sig.wal
+
+        return sig, written
+
+    def _discard_wal(self):
+        """Delete the WAL of the previous snapshot, if any."""
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.unlink(self.path + suffix)
+
+    def _load_signature(self):
+        """Load `Signature` from `meta_path`."""
+        try:
+            with open(self.meta_path) as fp:
+                return Signature(**json.load(fp))
+        except (IOError, OSError, ValueError, TypeError):
+            return None
+
+    def _save_signature(self, sig):
+        """Save `Signature` to `meta_path`."""
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(sig.to_dict(), fp)
+        os.rename(tmp, self.meta_path)
+        self.signature = sig
+
+    @contextmanager
+    def _lock(self):
+        """Stop other processes updating the snapshot at the same time."""
+        with open(self.path + '.lock', 'w') as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp, fcntl.LOCK_UN)
@@ -0,0 +1,232 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-30
+#
+
+"""Measure how long ``zh.py`` takes to start.
+
+Every keystroke in Alfred starts a new ``zh.py search`` process, so
+import time is paid on every query. Run ``zh.py`` with the
+``--profile-startup`` option (or set ``ZH_PROFILE_STARTUP=1``) to
+re-run the command with ``python -X importtime`` and print a report of
+the slowest imports, total import time and the time spent in
+``main()`` to STDERR. The command's own output still goes to STDOUT.
+
+Budget: ``zh.py search`` must not import any of the modules in
+`SEARCH_FORBIDDEN` (they are only needed by other commands).
+``tests/test_startup.py`` enforces this. The modules Alfred-Workflow
+imports (including ``workflow.update`` and so ``urllib.request``, via
+`Workflow.version`) are out of ZotHero's hands: the library is vendored
+unchanged.
+
+This module must stay cheap to import: it only uses modules that
+``zh.py`` imports anyway.
+"""
+
+from __future__ import print_function, absolute_import
+
+from collections import namedtuple
+import os
+import re
+import sys
+import time
+
+# Command-line option and environment variable that enable profiling
+PROFILE_OPTION = '--profile-startup'
+PROFILE_ENV = 'ZH_PROFILE_STARTUP'
+
+# Set in the environment of the profiled process, which writes
+# ``MAIN_MARKER <seconds>`` to STDERR after `main()` returns
+CHILD_ENV = 'ZH_STARTUP_CHILD'
+MAIN_MARKER = 'zh startup: main'
+
+# Modules ``zh.py search`` must not import
+SEARCH_FORBIDDEN = (
+    'cite',
+    'html.parser',
+    'multiprocessing',
+    'rtfunicode',
+    'workflow.notify',
+    'zothero.daemon',
+    'zothero.filtering',
+)
+
+ImportTime = namedtuple('ImportTime', 'name self cumulative depth')
+ImportTime.__doc__ = """Time taken to import a module.
+
+Attributes:
+    name (str): Name of module.
+    self (float): Seconds spent importing the module, excluding
+        the modules it imports.
+    cumulative (float): Seconds spent importing the module,
+        including the modules it imports.
+    depth (int): Nesting level. Modules imported by ``zh.py``
+        itself have depth 0.
+"""
+
+# Line written by `python -X importtime`
+_line = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)').match
+
+
+def wanted(argv=None, env=None):
+    """Return ``True`` if startup profiling was requested.
+
+    Args:
+        argv (list, optional): Command-line arguments. Defaults to
+            `sys.argv`.
+        env (dict, optional): Environment. Defaults to `os.environ`.
+
+    Returns:
+        bool: Whether to profile startup.
+
+    """
+    argv = sys.argv if argv is None else argv
+    env = os.environ if env is None else env
+    if env.get(CHILD_ENV):
+        return False
+
+    return PROFILE_OPTION in argv or env.get(PROFILE_ENV) in ('1', 'true')
+
+
+def parse_importtime(text):
+    """Parse the output of ``python -X importtime``.
+
+    Args:
+        text (str): STDERR of a process. Lines that aren't from
+            ``-X importtime`` are ignored.
+
+    Returns:
+        list: `ImportTime` for each module in the order imports
+        finished.
+
+    """
+    times = []
+    for line in text.splitlines():
+        m = _line(line)
+        if m:
+            self_us, cum_us, indent, name = m.groups()
+            # Each level of nesting is indented by 2 more spaces
+            depth = (len(indent) - 1) // 2
+            times.append(ImportTime(name, int(self_us) / 1e6,
+                                    int(cum_us) / 1e6, depth))
+
+    return times
+
+
+def import_total(times):
+    """Total seconds spent importing modules.
+
+    Args:
+        times (list): `ImportTime` objects from `parse_importtime()`.
+
+    Returns:
+        float: Sum of the cumulative times of top-level imports.
+
+    """
+    return sum(t.cumulative for t in times if t.depth == 0)
+
+
+def main_time(text):
+    """Read time reported by the profiled process's `main()`.
+
+    Args:
+        text (str): STDERR of profiled process.
+
+    Returns:
+        float: Seconds spent in `main()` or ``None`` if not reported.
+
+    """
+    for line in text.splitlines():
+        if line.startswith(MAIN_MARKER):
+            return float(line[len(MAIN_MARKER):])
+
+    return None
+
+
+def report_main(seconds):
+    """Write time spent in `main()` to STDERR if being profiled.
+
+    Called by ``zh.py``.
+
+    Args:
+        seconds (float): Duration of `main()`.
+
+    """
+    if os.getenv(CHILD_ENV):
+        sys.stderr.write('{} {:f}\n'.format(MAIN_MARKER, seconds))
+
+
+def format_report(times, wall, main=None, top=20):
+    """Format startup report.
+
+    Args:
+        times (list): `ImportTime` objects from `parse_importtime()`.
+        wall (float): Runtime of the whole process in seconds.
+        main (float, optional): Seconds spent in `main()`.
+        top (int, optional): Number of modules to list.
+
+    Returns:
+        str: Human-readable report.
+
+    """
+    total = import_total(times)
+    lines = [
+        u'process   : {:7.1f} ms'.format(wall * 1000),
+        u'imports   : {:7.1f} ms ({} modules)'.format(
+            total * 1000, len(times)),
+    ]
+    if main is not None:
+        lines.append(u'main()    : {:7.1f} ms (incl. imports in main)'.format(
+            main * 1000))
+
+    lines += [u'', u'slowest imports (cumulative ms, self ms, module):']
+    for t in sorted(times, key=lambda t: -t.cumulative)[:top]:
+        lines.append(u'{:8.1f} {:8.1f}  {}{}'.format(
+            t.cumulative * 1000, t.self * 1000, u'  ' * t.depth, t.name))
+
+    return u'\n'.join(lines)
+
+
+def profile(script, argv, top=20):
+    """Run ``script`` with ``-X importtime`` and print a report.
+
+    The child's STDOUT is passed through. The report is written to
+    STDERR.
+
+    Args:
+        script (str): Path to ``zh.py``.
+        argv (list): Arguments for ``script``. `PROFILE_OPTION` is
+            removed.
+        top (int, optional): Number of modules to list.
+
+    Returns:
+        int: Exit status of child process.
+
+    """
+    import subprocess
+
+    argv = [a for a in argv if a != PROFILE_OPTION]
+    env = dict(os.environ)
+    env.pop(PROFILE_ENV, None)
+    env[CHILD_ENV] = '1'
+
+    cmd = [sys.executable, '-X', 'importtime', script] + argv
+    start = time.time()
+    p = subprocess.Popen(cmd, stderr=subprocess.PIPE, env=env)
+    _, stderr = p.communicate()
+    wall = time.time() - start
+
+    stderr = stderr.decode('utf-8', 'replace')
+    others = [line for line in stderr.splitlines()
+              if not line.startswith(('import time:', MAIN_MARKER))]
+    if others:
+        sys.stderr.write(u'\n'.join(others) + u'\n\n')
+
+    report = format_report(parse_importtime(stderr), wall,
+                           main_time(stderr), top)
+    sys.stderr.write(report + u'\n')
+    return p.returncode
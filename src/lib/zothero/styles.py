@@ -17,9 +17,9 @@ from __future__ import print_function, absolute_import
 import logging
 import json
 import os
-
-# RTF codec that registers itself
-import rtfunicode
+import re
+import time
+from unicodedata import normalize
 
 from .cache import Cache
 from .models import CSLStyle
@@ -32,6 +32,249 @@ log.addHandler(logging.NullHandler())
 # CSL stylesheet namespace
 NS = 'http://purl.org/net/xbiblio/csl'
 
+# Elements of the style's <info> header
+STYLE = '{%s}style' % NS
+INFO = '{%s}info' % NS
+TITLE = '{%s}title' % NS
+ID = '{%s}id' % NS
+LINK = '{%s}link' % NS
+CATEGORY = '{%s}category' % NS
+UPDATED = '{%s}updated' % NS
+
+# Bytes of a .csl file `read_info` parses at a time. The <info>
+# header is usually 1-3 KB, the rest of the file up to 200 KB.
+CHUNK_SIZE = 2048
+
+# Minimum number of changed files `load_styles` parses in a pool of
+# processes. Parsing the header of a style only takes ~50µs.
+MIN_PARALLEL = 2000
+
+# Seconds after which `Styles.stale` is ``True``, so files edited in
+# place (which doesn't change their directory's modtime) are re-read
+CHECK_INTERVAL = 60
+
+# Increment when `read_info` extracts new data, so styles are re-read
+VERSION = 3
+
+# Maximum number of styles `Styles.search` returns
+SEARCH_LIMIT = 100
+
+# Index of style names for `Styles.search`. `names` contains the
+# normalised name of each style (see `tokenise`), and `tokens` the
+# words of each name (kind 0) and its initials (kind 1).
+NAMES_SCHEMA = u"""
+CREATE TABLE IF NOT EXISTS `names` (
+    `key` TEXT PRIMARY KEY NOT NULL,
+    `name` TEXT NOT NULL,
+    `hidden` INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS `tokens` (
+    `kind` INTEGER NOT NULL,
+    `token` TEXT NOT NULL,
+    `key` TEXT NOT NULL,
+    PRIMARY KEY (`kind`, `token`, `key`)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS `tokens_key` ON `tokens` (`key`);
+CREATE INDEX IF NOT EXISTS `names_name` ON `names` (`name`);
+"""
+
+WORD, INITIALS = 0, 1
+
+# Keys of styles with a token of kind ? that starts with ?. The second
+# ? is the upper bound of tokens with that prefix (see `_prefix`).
+TOKEN_SQL = u"""
+SELECT `key` FROM `tokens` WHERE `kind` = ? AND `token` >= ? AND `token` < ?
+"""
+
+# Rank styles whose keys are returned by {keys}, which must be a query
+# with the same parameters as `TOKEN_SQL`. Names that start with the
+# query come first, then names whose initials do, then the others.
+# Shorter names are ranked higher.
+SEARCH_SQL = u"""
+SELECT `key` FROM `names`
+WHERE `key` IN ({keys}) AND `hidden` <= ?
+ORDER BY CASE
+    WHEN `name` >= ? AND `name` < ? THEN 0
+    WHEN `key` IN ({initials}) THEN 1
+    ELSE 2 END,
+    length(`name`), `name`
+LIMIT ?
+"""
+
+# All styles in order of name
+LIST_SQL = u"""
+SELECT `key` FROM `names` WHERE `hidden` <= ? ORDER BY `name` LIMIT ?
+"""
+
+
+def tokenise(s):
+    """Split ``s`` into lowercase ASCII words.
+
+    Args:
+        s (unicode): Style name or query.
+
+    Returns:
+        list: Words in ``s``, e.g. ``["zeitschrift", "fur",
+            "okonomie"]`` for "Zeitschrift für Ökonomie".
+
+    """
+    s = normalize('NFKD', s).encode('ascii', 'ignore').decode('ascii')
+    return re.findall(r'[a-z0-9]+', s.lower())
+
+
+def initials(name):
+    """Initials ``name`` can be searched for by.
+
+    Args:
+        name (unicode): Style name.
+
+    Returns:
+        set: Initials of all words and of capitalised words, e.g.
+            "joap" and "jap" for "Journal of Applied Physics".
+
+    """
+    words = re.findall(r'\w+', name, re.UNICODE)
+    caps = [w for w in words if w[0].isupper() or w[0].isdigit()]
+    return {u''.join(tokenise(u''.join(w[0] for w in ws)))
+            for ws in (words, caps) if ws} - {u''}
+
+
+def _prefix(s):
+    """Bounds of strings starting with ``s`` for ``>=`` and ``<``."""
+    return s, s + u'\U0010ffff'
+
+
+def read_info(path):
+    """Read metadata from the <info> header of a .csl file.
+
+    Only the header is parsed: the file is fed to the parser in
+    `CHUNK_SIZE` pieces, and reading stops as soon as </info> is
+    reached, which is before the formatting rules that make up most
+    of an independent style.
+
+    Args:
+        path (unicode): Path to a .csl file.
+
+    Returns:
+        dict: Any of the keys ``name``, ``url``, ``parent_url``, ``id``,
+            ``citation_format``, ``updated`` and ``locale`` that were
+            found.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: Raised if the header isn't
+            valid XML.
+
+    """
+    # Not imported at module level: `Styles.get()` is called by searches
+    import xml.etree.ElementTree as ET
+
+    info = {}
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    with open(path, 'rb') as fp:
+        for data in iter(lambda: fp.read(CHUNK_SIZE), b''):
+            parser.feed(data)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if elem.tag == STYLE:
+                        info['locale'] = elem.get('default-locale')
+                    continue
+
+                tag = elem.tag
+                if tag == INFO:
+                    return info
+
+                if tag == TITLE:
+                    info.setdefault('name', unicodify(elem.text))
+                elif tag == ID:
+                    info['id'] = elem.text
+                elif tag == UPDATED:
+                    info['updated'] = elem.text
+                elif tag == CATEGORY and elem.get('citation-format'):
+                    info['citation_format'] = elem.get('citation-format')
+                elif tag == LINK:
+                    rel = elem.get('rel')
+                    if rel == 'self':  # style's own URL
+                        info['url'] = elem.get('href')
+                    elif rel == 'independent-parent':  # canonical style
+                        info['parent_url'] = elem.get('href')
+
+    parser.close()  # raises ParseError if XML is incomplete
+    return info
+
+
+def _mtime(path):
+    """Return modtime of ``path`` or 0 if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def load_style(path):
+    """Extract style info from a .csl file.
+
+    Args:
+        path (unicode): Path to a .csl file.
+
+    Returns:
+        models.CSLStyle: Style parsed from .csl file or ``None`` if
+            the file couldn't be parsed.
+    """
+    from xml.etree.ElementTree import ParseError
+
+    try:
+        info = read_info(path)
+    except (ParseError, IOError, OSError) as err:
+        log.error(u'[styles] could not parse "%s": %s', shortpath(path), err)
+        return None
+
+    if not info.get('name'):  # invalid style
+        log.error(u'[styles] no title found: %s', shortpath(path))
+        return None
+
+    # Styles without a "self" link are identified by their ID
+    info.setdefault('url', info.get('id'))
+    return CSLStyle(path=path, **info)
+
+
+def load_styles(paths, workers=None):
+    """Load styles from .csl files.
+
+    If there are at least `MIN_PARALLEL` files, they are parsed in a
+    pool of ``workers`` processes.
+
+    Args:
+        paths (list): Paths to .csl files.
+        workers (int, optional): Number of worker processes. Defaults
+            to `parallel.default_workers()`.
+
+    Returns:
+        list: `CSLStyle` for each file that could be parsed, in the
+            same order as ``paths``.
+    """
+    from .parallel import default_workers
+
+    workers = workers or default_workers()
+    if workers < 2 or len(paths) < MIN_PARALLEL:
+        styles = [load_style(p) for p in paths]
+    else:
+        import multiprocessing
+
+        log.debug(u'[styles] parsing %d files in %d processes', len(paths),
+                  workers)
+        pool = multiprocessing.Pool(workers)
+        try:
+            styles = pool.map(load_style, paths,
+                              len(paths) // (workers * 4) + 1)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    return [s for s in styles if s]
+
 
 # class RTFFormatter(object):
 #     """citeproc-py formatter for RTF.
@@ -94,21 +337,25 @@ class Styles(object):
 
     Reads (and caches) .csl files from disk and fetches them from URLs.
 
-    Styles are loaded and the cache updated on instantiation.
+    Styles are read from the cache. Call `update()` to load new or
+    changed styles into the cache (e.g. if `stale` is ``True``).
 
     Attributes:
         cachedir (unicode): Directory to store metadata database in.
         dirpath (unicode): Directory to load .csl style definitions from.
         dldir (unicode): Directory CSL external stylesheets are downloaded to.
         store (cache.Store): `CSLStyle` cache.
+        workers (int): Number of processes to parse styles with.
     """
 
-    def __init__(self, stylesdir, cachedir):
+    def __init__(self, stylesdir, cachedir, workers=None):
         """New Styles containing styles from ``stylesdir``.
 
         Args:
             stylesdir (unicode): Directory to load styles from.
             cachedir (unicode): Top-level cache directory.
+            workers (int, optional): Number of processes to parse
+                styles with (see `load_styles()`).
 
         Raises:
             ValueError: Raised if ``stylesdir`` doesn't exist.
@@ -126,14 +373,58 @@ class Styles(object):
         self.dirpath = stylesdir
         self.cachedir = cachedir
         self.dldir = dldir
+        self.workers = workers
         # Parent cache object
         self._cache = Cache(os.path.join(self.cachedir, 'styles.sqlite'))
+        # Discard styles read by other versions of `read_info`
+        meta = self._meta = self._cache.open('meta', json.dumps, json.loads)
+        if meta.get('version') != VERSION:
+            log.debug('[styles] new cache (version %d)', VERSION)
+            for name in ('styles', 'modtimes', 'names', 'tokens'):
+                if name in self._cache.stores:
+                    self._cache.clear(name)
+            meta.set('version', VERSION)
+
+        with self._cache.conn as c:
+            c.executescript(NAMES_SCHEMA)
+
         # Store for CSLStyle objects, keyed by URL
-        self.store = self._cache.open('styles', json.dumps, CSLStyle.from_json)
+        self.store = self._cache.open('styles', CSLStyle.json,
+                                      CSLStyle.from_json)
         # Store for modtimes of the files the styles are loaded from,
         # keyed by filepath
         self._mtimes = self._cache.open('modtimes', json.dumps, json.loads)
-        self.update()
+
+    @property
+    def empty(self):
+        """Return ``True`` if no styles have been loaded."""
+        return next(self.store.keys(), None) is None
+
+    @property
+    def stale(self):
+        """Return ``True`` if styles should be re-read with `update()`.
+
+        That's the case if no styles have been loaded, if files have
+        been added to or removed from a style directory since it was
+        last read, or if the files haven't been checked for changes
+        for `CHECK_INTERVAL` seconds. Comparing the modtime of every
+        file is left to `update()`.
+        """
+        if self.empty:
+            return True
+
+        if time.time() - (self._meta.get('checked') or 0) > CHECK_INTERVAL:
+            return True
+
+        cached = self._mtimes.get_many(p for p, _ in self._dirs)
+        return any(cached.get(p, 0) != _mtime(p) for p, _ in self._dirs)
+
+    @property
+    def _dirs(self):
+        """Directories styles are read from and whether they're hidden."""
+        # Zotero stores parent stylesheets in a "hidden" directory.
+        return ((os.path.join(self.dirpath, 'hidden'), True),
+                (self.dirpath, False))
 
     def get(self, key):
         """Return `CSLStyle` for key.
@@ -173,13 +464,54 @@ class Styles(object):
         Args:
             hidden (bool, optional): Also return hidden styles.
         """
-        for k in self.store.keys():
-            style = self.store.get(k)
+        for style in self.store.values():
             if style.hidden and not hidden:
                 continue
 
             yield style
 
+    def search(self, query, hidden=False, limit=SEARCH_LIMIT):
+        """Styles whose names match ``query``.
+
+        Each word of ``query`` must be the start of a word in the name,
+        or the whole query the start of the name's initials (see
+        `initials()`), so "j phys" and "jap" both find "Journal of
+        Applied Physics".
+
+        Styles are looked up in the index of names that `update()`
+        keeps, so only the returned styles are loaded.
+
+        Args:
+            query (unicode): Search query. If empty, the first
+                ``limit`` styles in order of name are returned.
+            hidden (bool, optional): Also return hidden styles.
+            limit (int, optional): Maximum number of styles to return.
+
+        Returns:
+            list: Matching `CSLStyle` objects, best matches first.
+
+        """
+        words = tokenise(query or u'')
+        if not words:
+            params = [int(hidden), limit]
+            sql = LIST_SQL
+        else:
+            initials_ = [INITIALS] + list(_prefix(u''.join(words)))
+            keys = [TOKEN_SQL] * len(words) + [u'UNION ' + TOKEN_SQL]
+            params = []
+            for w in words:
+                params.extend([WORD] + list(_prefix(w)))
+            params.extend(initials_ + [int(hidden)])
+            params.extend(_prefix(u' '.join(words)))
+            params.extend(initials_ + [limit])
+            sql = SEARCH_SQL.format(
+                keys=u'INTERSECT'.join(keys[:-1]) + keys[-1],
+                initials=TOKEN_SQL)
+
+        keys = [row['key'] for row in self._cache.conn.execute(sql, params)]
+        styles = self.store.get_many(keys)
+        return [styles[k] for k in keys if k in styles]
+
     def cite(self, entry, style, bibliography=False, locale=None):
         """Formatted citation for an Entry.
 
@@ -202,6 +534,8 @@ class Styles(object):
         """
         import cite
         from cite import locales
+        # RTF codec that registers itself
+        import rtfunicode  # noqa: F401
 
         key = style.key
         style = self.canonical(key)
@@ -229,138 +563,125 @@ class Styles(object):
         Reads styles from :attr:`dirpath` and its ``hidden`` subdirectory,
         if it exists.
 
-        Any files that haven't been changed since they were last read
-        are ignored.
-
-        After all styles have been read from disk, download any missing
-        "parent" styles of dependent styles, and load those, too.
+        Files whose modtime differs from the one they were last read
+        with are parsed with `load_styles()`. After all styles
+        have been read from disk, download any missing "parent" styles
+        of dependent styles, and load those, too.
 
         Finally, remove any cached styles that have disappeared from
         disk.
         """
-        # Parent URLs of dependent styles. After all styles are loaded,
-        # any unresolved URLs are retrieved and loaded.
-        parent_urls = []
-
-        # Zotero stores parent stylesheets in a "hidden" directory.
-        hidden = os.path.join(self.dirpath, 'hidden')
-        if os.path.exists(hidden):
-            parent_urls.extend(self._readdir(hidden, True))
+        # Modtimes of style files and directories, keyed by path
+        manifest = dict(self._mtimes.items())
+        styles, mtimes = [], {}
+        # .csl files in the style directories
+        found = set()
+        scanned = set()
+
+        for dirpath, is_hidden in self._dirs:
+            # modtime is 0 if the directory doesn't exist
+            mtime = _mtime(dirpath)
+            if manifest.get(dirpath) != mtime:
+                mtimes[dirpath] = mtime
+            scanned.add(dirpath)
+            files = self._scandir(dirpath) if mtime else {}
+            found.update(files)
 
-        # Load user styles
-        parent_urls.extend(self._readdir(self.dirpath))
+            # Ignore unchanged files
+            changed = sorted(p for p, m in files.items()
+                             if m != manifest.get(p))
+            mtimes.update((p, files[p]) for p in changed)
+            for style in load_styles(changed, self.workers):
+                style.hidden = is_hidden
+                styles.append(style)
+                log.info(u'[styles] loaded %s', style)
 
         # --------------------------------------------------------------
         # Find unresolved URLs and retrieve them
-        parent_urls = [u for u in parent_urls if not self.get(u)]
-        for url in parent_urls:
+        urls = {s.parent_url for s in styles if s.parent_url}
+        urls -= {s.key for s in styles}
+        urls -= set(self.store.get_many(urls))
+        for url in urls:
             style = self._fetch_style(url)
             if style:
                 style.hidden = True
-                self._mtimes.set(style.path, os.path.getmtime(style.path))
-                self.store.set(style.key, style)
+                styles.append(style)
+                mtimes[style.path] = os.path.getmtime(style.path)
                 log.info(u'[styles] loaded %s', style.name)
-                #log.info(u'[styles] loaded "%s"', style.name)
-
-        # --------------------------------------------------------------
-        # Purge deleted styles from cache
-        for style in self.all(True):
-            if not os.path.exists(style.path):
-                self._mtimes.delete(style.path)
-                if self.store.delete(style.key):
-                    log.debug(u'[styles] removed %s', style)
 
-    def _readdir(self, dirpath, hidden=False):
-        """Load CSL styles from ``dirpath``.
+        # Save styles before modtimes, so any styles that couldn't be
+        # saved are read again next time.
+        self.store.set_many((s.key, s) for s in styles)
+        self._index_names(styles)
+        self._mtimes.set_many(mtimes)
+        self._meta.set('checked', time.time())
 
-        Read any .csl files in ``dirpath``, ignoring those that haven't
-        been modified since they were last loaded.
-
-        Parse the files to extract title, URL and the URL of any parent
-        style (for dependent stylesheets).
-
-        Return a list of any parent URLs.
+        # --------------------------------------------------------------
+        # Purge deleted styles from cache. The style directories were
+        # listed, so only downloaded styles need to be checked. Every
+        # style's file is in the manifest, so styles only need to be
+        # loaded if files have gone.
+        def _exists(path):
+            if path in found:
+                return True
+            if os.path.dirname(path) in scanned:
+                return False
+            return os.path.exists(path)
+
+        stale = {p for p in manifest
+                 if p.lower().endswith('.csl') and not _exists(p)}
+        if not stale:
+            return
+
+        self._mtimes.delete_many(stale)
+        gone = [style for _, style in self.store.items()
+                if style.path in stale]
+        if gone:
+            self.store.delete_many([style.key for style in gone])
+            self._index_names([], [style.key for style in gone])
+            for style in gone:
+                log.debug(u'[styles] removed %s', style)
+
+    def _index_names(self, styles, deleted=()):
+        """Update index of style names for `search()`.
 
         Args:
-            dirpath (unicode): Directory to read .csl files from.
-            hidden (bool, optional): Mark loaded `CSLStyle` objects as
-                hidden.
+            styles (list): New or changed `CSLStyle` objects.
+            deleted (list, optional): Keys of deleted styles.
 
-        Returns:
-            list: URLs to parents of any dependent styles loaded.
         """
-        parent_urls = []
-        # Read styles in the styles directory and add them to or update
-        # them in the cache
-        for fn in os.listdir(dirpath):
-            if not fn.lower().endswith('.csl'):
-                continue
-
-            path = os.path.join(dirpath, fn)
-
-            # Ignore unchanged files
-            mtime = os.path.getmtime(path)
-            if mtime <= (self._mtimes.get(path) or 0):
-                continue
-
-            self._mtimes.set(path, mtime)
-
-            # ----------------------------------------------------------
-            # Parse style definition
-            log.debug(u'[styles] reading "%s" ...', shortpath(path))
-
-            style = self._load_style(path)
-            if not style:
-                log.warning(u'[styles] could not read style: %s',
-                            shortpath(path))
-                continue
-
-            if style.parent_url:
-                parent_urls.append(style.parent_url)
-
-            style.hidden = hidden
-            self.store.set(style.key, style)
-            log.info(u'[styles] loaded %s', style)
-
-        return parent_urls
-
-    def _load_style(self, path):
-        """Extract style info from a .csl file.
+        # Later styles replace earlier ones with the same key, as in
+        # the cache
+        styles = {s.key: s for s in styles}
+        names, tokens = [], []
+        for key, style in styles.items():
+            name = style.name or u''
+            names.append((key, u' '.join(tokenise(name)), int(style.hidden)))
+            tokens.extend((WORD, t, key) for t in set(tokenise(name)))
+            tokens.extend((INITIALS, t, key) for t in initials(name))
+
+        keys = [(k,) for k in list(styles) + list(deleted)]
+        with self._cache.conn as c:
+            c.executemany(u'DELETE FROM `names` WHERE `key` = ?', keys)
+            c.executemany(u'DELETE FROM `tokens` WHERE `key` = ?', keys)
+            c.executemany(u'INSERT INTO `names` VALUES (?, ?, ?)', names)
+            c.executemany(u'INSERT INTO `tokens` VALUES (?, ?, ?)', tokens)
+
+    def _scandir(self, dirpath):
+        """Modtimes of the .csl files in ``dirpath``.
 
         Args:
-            path (unicode): Path to a .csl file.
+            dirpath (unicode): Directory to read .csl files from.
 
         Returns:
-            models.CSLStyle: Style parsed from .csl file or ``None`` if
-                the file couldn't be parsed.
+            dict: Path -> modtime mapping.
         """
-        try:
-            import xml.etree.cElementTree as ET
-        except ImportError:  # pragma: no cover
-            import xml.etree.ElementTree as ET
-
-        name = parent_url = url = None
-
-        root = ET.parse(path)
-        elem = root.find('.//{%s}title' % NS)
-
-        if elem is None:  # invalid style
-            log.error(u'[styles] no title found: %s', shortpath(path))
-            return None
-
-        name = unicodify(elem.text)
-
-        # Find own URL and possible URL of parent style
-        for elem in root.findall('.//{%s}link' % NS):
-
-            rel = elem.attrib.get('rel')
-            if rel == 'self':  # style's own URL
-                url = elem.attrib.get('href')
-
-            elif rel == 'independent-parent':  # URL of canonical definition
-                parent_url = elem.attrib.get('href')
+        files = {}
+        for entry in os.scandir(dirpath):
+            if entry.name.lower().endswith('.csl') and entry.is_file():
+                files[entry.path] = entry.stat().st_mtime
 
-        return CSLStyle(name=name, url=url, path=path, parent_url=parent_url)
+        return files
 
     def _fetch_style(self, url):
         """Generate `CSLStyle` from a remote .csl file.
@@ -388,4 +709,4 @@ class Styles(object):
                 log.error('[styles] error retrieving "%s": %s', url, err)
                 return None
 
-        return self._load_style(path)
+        return load_style(path)
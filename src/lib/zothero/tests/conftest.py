@@ -0,0 +1,54 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Fixtures shared by the unit tests.
+
+The synthetic Zotero databases have `N_ITEMS` items. A test module
+can set its own ``N_ITEMS`` to change that.
+"""
+
+from __future__ import print_function, absolute_import
+
+import os
+
+import pytest
+
+from zothero.tests.fixtures import make_zotero_db
+from zothero.zotero import Zotero
+
+# Default number of items in synthetic databases
+N_ITEMS = 60
+
+
+def _n_items(request):
+    """Number of items for the databases of ``request``'s module."""
+    return getattr(request.module, 'N_ITEMS', N_ITEMS)
+
+
+@pytest.fixture
+def zotero_db(request, tmpdir):
+    """Path to a synthetic ``zotero.sqlite`` in its own directory."""
+    path = str(tmpdir.mkdir('zotero').join('zotero.sqlite'))
+    make_zotero_db(path, n_items=_n_items(request))
+    return path
+
+
+@pytest.fixture
+def zot(zotero_db):
+    """`Zotero` instance with a synthetic database."""
+    return Zotero(os.path.dirname(zotero_db))
+
+
+@pytest.fixture(scope='module')
+def entries(request, tmpdir_factory):
+    """Entries from a synthetic Zotero database."""
+    datadir = str(tmpdir_factory.mktemp('zotero'))
+    make_zotero_db(os.path.join(datadir, 'zotero.sqlite'),
+                   n_items=_n_items(request))
+    return list(Zotero(datadir).all_entries())
@@ -0,0 +1,422 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-15
+#
+
+"""Synthetic Zotero databases for tests and benchmarks.
+
+`make_zotero_db()` creates a ``zotero.sqlite`` containing the subset
+of Zotero's schema that ZotHero reads, filled with deterministic,
+randomly-generated items, notes, attachments, tags and collections.
+
+`make_styles()` fills a directory with synthetic CSL styles, like
+Zotero's ``styles`` directory.
+"""
+
+from __future__ import print_function, absolute_import
+
+import io
+import os
+import random
+import sqlite3
+
+# Subset of Zotero 5's schema used by `zothero.zotero`
+ZOTERO_SCHEMA = u"""
+CREATE TABLE itemTypes (
+    itemTypeID INTEGER PRIMARY KEY,
+    typeName TEXT,
+    templateItemTypeID INT,
+    display INT DEFAULT 1
+);
+
+CREATE TABLE items (
+    itemID INTEGER PRIMARY KEY,
+    itemTypeID INT NOT NULL,
+    dateAdded TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    dateModified TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    clientDateModified TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    libraryID INT NOT NULL,
+    key TEXT NOT NULL,
+    version INT NOT NULL DEFAULT 0,
+    synced INT NOT NULL DEFAULT 0,
+    UNIQUE (libraryID, key)
+);
+
+CREATE TABLE fields (
+    fieldID INTEGER PRIMARY KEY,
+    fieldName TEXT,
+    fieldFormatID INT
+);
+
+CREATE TABLE itemDataValues (
+    valueID INTEGER PRIMARY KEY,
+    value UNIQUE
+);
+
+CREATE TABLE itemData (
+    itemID INT,
+    fieldID INT,
+    valueID,
+    PRIMARY KEY (itemID, fieldID)
+);
+
+CREATE TABLE itemNotes (
+    itemID INTEGER PRIMARY KEY,
+    parentItemID INT,
+    note TEXT,
+    title TEXT
+);
+CREATE INDEX itemNotes_parentItemID ON itemNotes(parentItemID);
+
+CREATE TABLE itemAttachments (
+    itemID INTEGER PRIMARY KEY,
+    parentItemID INT,
+    linkMode INT,
+    contentType TEXT,
+    charsetID INT,
+    path TEXT,
+    syncState INT DEFAULT 0
+);
+CREATE INDEX itemAttachments_parentItemID ON itemAttachments(parentItemID);
+
+CREATE TABLE creators (
+    creatorID INTEGER PRIMARY KEY,
+    firstName TEXT,
+    lastName TEXT,
+    fieldMode INT,
+    UNIQUE (lastName, firstName, fieldMode)
+);
+
+CREATE TABLE creatorTypes (
+    creatorTypeID INTEGER PRIMARY KEY,
+    creatorType TEXT
+);
+
+CREATE TABLE itemCreators (
+    itemID INT NOT NULL,
+    creatorID INT NOT NULL,
+    creatorTypeID INT NOT NULL DEFAULT 1,
+    orderIndex INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (itemID, creatorID, creatorTypeID, orderIndex)
+);
+
+CREATE TABLE collections (
+    collectionID INTEGER PRIMARY KEY,
+    collectionName TEXT NOT NULL,
+    parentCollectionID INT DEFAULT NULL,
+    clientDateModified TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    libraryID INT NOT NULL,
+    key TEXT NOT NULL,
+    version INT NOT NULL DEFAULT 0,
+    synced INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE collectionItems (
+    collectionID INT NOT NULL,
+    itemID INT NOT NULL,
+    orderIndex INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (collectionID, itemID)
+);
+CREATE INDEX collectionItems_itemID ON collectionItems(itemID);
+
+CREATE TABLE tags (
+    tagID INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE itemTags (
+    itemID INT NOT NULL,
+    tagID INT NOT NULL,
+    type INT NOT NULL,
+    PRIMARY KEY (itemID, tagID)
+);
+
+CREATE TABLE deletedItems (
+    itemID INTEGER PRIMARY KEY,
+    dateDeleted DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+"""
+
+# Item types. IDs 1 (note) and 14 (attachment) are excluded
+# from searches by `zothero.zotero.ITEMS_SQL`.
+ITEM_TYPES = (
+    (1, 'note'),
+    (2, 'book'),
+    (3, 'bookSection'),
+    (4, 'journalArticle'),
+    (10, 'conferencePaper'),
+    (13, 'webpage'),
+    (14, 'attachment'),
+)
+
+# Types of top-level items to generate
+ENTRY_TYPES = (2, 3, 4, 4, 4, 10, 13)
+
+FIELDS = (
+    (1, 'url'),
+    (6, 'abstractNote'),
+    (14, 'date'),
+    (38, 'publicationTitle'),
+    (110, 'title'),
+)
+
+CREATOR_TYPES = ((1, 'author'), (2, 'contributor'), (3, 'editor'))
+
+WORDS = (
+    u'analysis', u'bayesian', u'climate', u'data', u'dynamics', u'effect',
+    u'evidence', u'français', u'growth', u'history', u'inference',
+    u'language', u'learning', u'markets', u'memory', u'model', u'network',
+    u'ökonomie', u'policy', u'quantum', u'review', u'social', u'statistics',
+    u'structure', u'survey', u'systems', u'theory', u'urban', u'variation',
+    u'zeitgeist',
+)
+
+SURNAMES = (
+    u'Adams', u'Brown', u'Chen', u'Dupont', u'Evans', u'Fischer',
+    u'García', u'Huang', u'Ivanova', u'Jones', u'Kim', u'López',
+    u'Müller', u'Nguyen', u'Okafor', u'Patel', u'Smith', u'Smithson',
+    u'Tanaka', u'Williams',
+)
+
+GIVEN_NAMES = (u'Ann', u'Bo', u'Carla', u'Dean', u'Eve', u'Femi', u'Gus')
+
+HOSTS = (u'https://www.example.com/', u'https://doi.org/', u'http://arxiv.org/')
+
+NOTE_TEMPLATE = (u'<div class="zotero-note znv1"><h1>{title}</h1>'
+                 u'<p>{body} &amp; <em>more</em></p></div>')
+
+# Synthetic CSL styles. Most installed styles are small "dependent"
+# styles that refer to an independent parent, which contains the
+# actual formatting rules (``macros``).
+CSL_HEADER = u"""<?xml version="1.0" encoding="utf-8"?>
+<style xmlns="http://purl.org/net/xbiblio/csl" class="{class_}" \
+version="1.0" default-locale="{locale}">
+  <info>
+    <title>{title}</title>
+    <id>http://www.zotero.org/styles/{name}</id>
+    <link href="http://www.zotero.org/styles/{name}" rel="self"/>
+{parent}    <link href="http://example.com/{name}" rel="documentation"/>
+    <author><name>{author}</name></author>
+    <category citation-format="{format}"/>
+    <category field="{field}"/>
+    <updated>2017-{month:02d}-{day:02d}T12:00:00+00:00</updated>
+    <rights license="http://creativecommons.org/licenses/by-sa/3.0/">\
+This work is licensed under a Creative Commons Attribution-ShareAlike \
+3.0 License</rights>
+  </info>
+"""
+
+CSL_PARENT = (u'    <link href="http://www.zotero.org/styles/{parent}" '
+              u'rel="independent-parent"/>\n')
+
+CSL_MACRO = u"""  <macro name="{name}">
+    <names variable="author">
+      <name name-as-sort-order="all" and="symbol" initialize-with=". "/>
+      <label form="short" prefix=" (" suffix=")"/>
+      <substitute><text macro="{other}"/></substitute>
+    </names>
+  </macro>
+"""
+
+CSL_FORMATS = (u'author-date', u'numeric', u'note', u'label')
+CSL_LOCALES = (u'en-US', u'en-GB', u'de-DE', u'fr-FR')
+
+
+def _key(i):
+    """Zotero-style 8-character item key for integer ``i``."""
+    chars = u'23456789ABCDEFGHIJKLMNPQRSTUVWXYZ'
+    s = u''
+    for _ in range(8):
+        i, r = divmod(i, len(chars))
+        s += chars[r]
+    return s
+
+
+def _sentence(rnd, n):
+    """Random sentence of ``n`` words."""
+    return u' '.join(rnd.choice(WORDS) for _ in range(n))
+
+
+def make_zotero_db(path, n_items=100, seed=1, note_size=3, deleted=0.02):
+    """Create a synthetic Zotero database at ``path``.
+
+    Args:
+        path (str): Where to create ``zotero.sqlite``.
+        n_items (int, optional): Number of top-level items to generate.
+        seed (int, optional): Random seed. The same seed and arguments
+            always produce the same database.
+        note_size (int, optional): Paragraphs per note.
+        deleted (float, optional): Fraction of items to put in the trash.
+
+    Returns:
+        str: ``path``
+
+    """
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(ZOTERO_SCHEMA)
+
+    with conn as c:
+        c.executemany('INSERT INTO itemTypes (itemTypeID, typeName) '
+                      'VALUES (?, ?)', ITEM_TYPES)
+        c.executemany('INSERT INTO fields (fieldID, fieldName) '
+                      'VALUES (?, ?)', FIELDS)
+        c.executemany('INSERT INTO creatorTypes VALUES (?, ?)',
+                      CREATOR_TYPES)
+
+        names = [(i + 1, g, s) for i, (g, s) in enumerate(
+                 (g, s) for s in SURNAMES for g in GIVEN_NAMES)]
+        c.executemany('INSERT INTO creators (creatorID, firstName, lastName) '
+                      'VALUES (?, ?, ?)', names)
+
+        c.executemany('INSERT INTO tags VALUES (?, ?)',
+                      list(enumerate(WORDS, 1)))
+
+        collections = [(i, u'{} {}'.format(w.title(), i), 1, _key(10 ** 6 + i))
+                       for i, w in enumerate(WORDS[:12], 1)]
+        c.executemany('INSERT INTO collections (collectionID, collectionName, '
+                      'libraryID, key) VALUES (?, ?, ?, ?)', collections)
+
+        values = {}  # itemDataValues value -> valueID
+
+        def value_id(v):
+            if v not in values:
+                values[v] = len(values) + 1
+            return values[v]
+
+        items, data, notes, atts = [], [], [], []
+        creators, colls, tags, trash = [], [], [], []
+        item_id = 0
+
+        for i in range(n_items):
+            item_id += 1
+            parent = item_id
+            month = rnd.randint(1, 12)
+            year = rnd.randint(1950, 2020)
+            modified = u'2019-{:02d}-{:02d} 12:00:00'.format(
+                month, rnd.randint(1, 28))
+            items.append((parent, rnd.choice(ENTRY_TYPES), modified,
+                          modified, 1, _key(parent), i))
+
+            fields = [
+                (110, _sentence(rnd, rnd.randint(3, 8)).capitalize()),
+                (14, u'{}-{:02d}-00 {}'.format(year, month, year)),
+                (6, _sentence(rnd, rnd.randint(10, 40))),
+                (38, _sentence(rnd, 2).title()),
+            ]
+            if rnd.random() < 0.3:
+                fields.append((1, rnd.choice(HOSTS) + _key(i)))
+
+            for fid, v in fields:
+                data.append((parent, fid, value_id(v)))
+
+            for j, cid in enumerate(rnd.sample(range(1, len(names) + 1),
+                                               rnd.randint(1, 4))):
+                ctype = 3 if j and rnd.random() < 0.2 else 1
+                creators.append((parent, cid, ctype, j))
+
+            for cid in rnd.sample(range(1, len(collections) + 1),
+                                  rnd.randint(0, 2)):
+                colls.append((cid, parent))
+
+            for tid in rnd.sample(range(1, len(WORDS) + 1),
+                                  rnd.randint(0, 3)):
+                tags.append((parent, tid, 0))
+
+            for _ in range(rnd.randint(0, 2)):
+                item_id += 1
+                items.append((item_id, 1, modified, modified, 1,
+                              _key(item_id), i))
+                body = u'</p><p>'.join(_sentence(rnd, 30)
+                                       for _ in range(note_size))
+                notes.append((item_id, parent, NOTE_TEMPLATE.format(
+                    title=_sentence(rnd, 3), body=body)))
+
+            for _ in range(rnd.randint(0, 2)):
+                item_id += 1
+                items.append((item_id, 14, modified, modified, 1,
+                              _key(item_id), i))
+                path = u'storage:{}.pdf'.format(_sentence(rnd, 2))
+                atts.append((item_id, parent, 0, u'application/pdf', path))
+                data.append((item_id, 110, value_id(u'Full Text PDF')))
+
+            if rnd.random() < deleted:
+                trash.append((parent,))
+
+        c.executemany('INSERT INTO items (itemID, itemTypeID, dateModified, '
+                      'clientDateModified, libraryID, key, version) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?)', items)
+        c.executemany('INSERT INTO itemDataValues VALUES (?, ?)',
+                      [(vid, v) for v, vid in values.items()])
+        c.executemany('INSERT INTO itemData VALUES (?, ?, ?)', data)
+        c.executemany('INSERT INTO itemNotes (itemID, parentItemID, note) '
+                      'VALUES (?, ?, ?)', notes)
+        c.executemany('INSERT INTO itemAttachments (itemID, parentItemID, '
+                      'linkMode, contentType, path) VALUES (?, ?, ?, ?, ?)',
+                      atts)
+        c.executemany('INSERT INTO itemCreators VALUES (?, ?, ?, ?)',
+                      creators)
+        c.executemany('INSERT INTO collectionItems (collectionID, itemID) '
+                      'VALUES (?, ?)', colls)
+        c.executemany('INSERT INTO itemTags VALUES (?, ?, ?)', tags)
+        c.executemany('INSERT INTO deletedItems (itemID) VALUES (?)', trash)
+
+    conn.close()
+    return path
+
+
+def make_styles(dirpath, n_styles=100, seed=1, dependent=0.8):
+    """Create ``n_styles`` synthetic .csl files in ``dirpath``.
+
+    Dependent styles are about 1 KB and independent ones 10-150 KB, like
+    the styles in Zotero's repository. Every dependent style's parent
+    is one of the independent styles.
+
+    Args:
+        dirpath (str): Directory to create styles in. Created if it
+            doesn't exist.
+        n_styles (int, optional): Number of styles to generate.
+        seed (int, optional): Random seed.
+        dependent (float, optional): Fraction of dependent styles.
+
+    Returns:
+        list: Paths of the new .csl files.
+
+    """
+    rnd = random.Random(seed)
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+
+    paths, parents = [], []
+    for i in range(n_styles):
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(2, 5))]
+        name = u'{}-{}'.format(u'-'.join(words), i)
+        parent = u''
+        if parents and rnd.random() < dependent:
+            parent = CSL_PARENT.format(parent=rnd.choice(parents))
+
+        xml = CSL_HEADER.format(
+            class_=u'in-text', locale=rnd.choice(CSL_LOCALES),
+            title=u' '.join(w.title() for w in words) + u' {}'.format(i),
+            name=name, parent=parent,
+            author=u'{} {}'.format(rnd.choice(GIVEN_NAMES),
+                                   rnd.choice(SURNAMES)),
+            format=rnd.choice(CSL_FORMATS), field=rnd.choice(WORDS),
+            month=rnd.randint(1, 12), day=rnd.randint(1, 28))
+
+        if not parent:
+            parents.append(name)
+            xml += u''.join(CSL_MACRO.format(name=u'm%d' % j,
+                                             other=u'm%d' % (j + 1))
+                            for j in range(rnd.randint(30, 450)))
+
+        path = os.path.join(dirpath, name + u'.csl')
+        with io.open(path, 'w', encoding='utf-8') as fp:
+            fp.write(xml + u'</style>\n')
+        paths.append(path)
+
+    return paths
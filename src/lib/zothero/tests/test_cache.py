@@ -0,0 +1,72 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Unit tests for cache.py"""
+
+from __future__ import print_function, absolute_import
+
+import json
+
+import pytest
+
+from zothero import cache as cachemod
+from zothero.cache import Cache
+
+
+@pytest.fixture
+def store(tmpdir):
+    """Empty `Store` of JSON values."""
+    c = Cache(str(tmpdir.join('cache.sqlite')))
+    return c.open('test', json.dumps, json.loads)
+
+
+def test_set(store):
+    """Values are inserted and updated."""
+    assert store.get(u'a') is None
+    assert store.get(u'a', 1) == 1
+    store.set(u'a', [1, 2])
+    assert store.get(u'a') == [1, 2]
+    updated = store.updated(u'a')
+    store.set(u'a', {u'x': 1})
+    assert store.get(u'a') == {u'x': 1}
+    assert store.updated(u'a') >= updated
+    assert list(store.keys()) == [u'a']
+
+
+def test_set_many(store):
+    """Many values are set at once."""
+    assert store.set_many({u'a': 1, u'b': 2}) == 2
+    assert store.set_many([(u'b', 3), (u'c', 4)]) == 2
+    assert store.set_many([]) == 0
+    assert sorted(store.items()) == [(u'a', 1), (u'b', 3), (u'c', 4)]
+    assert sorted(store.values()) == [1, 3, 4]
+
+
+def test_get_many(store, monkeypatch):
+    """Values are fetched in batches."""
+    monkeypatch.setattr(cachemod, 'BATCH_SIZE', 2)
+    store.set_many((str(i), i) for i in range(5))
+    keys = [str(i) for i in range(7)]
+    assert store.get_many(keys) == {str(i): i for i in range(5)}
+    assert store.get_many([]) == {}
+    with pytest.raises(TypeError):
+        store.get_many([1])
+
+
+def test_delete_many(store):
+    """Values are deleted."""
+    store.set_many({u'a': 1, u'b': 2, u'c': 3})
+    assert store.delete(u'a') is True
+    assert store.delete(u'a') is False
+    assert store.delete_many([u'b', u'c', u'd']) == 2
+    assert list(store.items()) == []
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
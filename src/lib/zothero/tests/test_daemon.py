@@ -0,0 +1,86 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-29
+#
+
+"""Unit tests for daemon.py"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from zothero.daemon import Server, parse_request
+
+
+def _request(path, argv, env):
+    """Send request to `Server` at ``path`` as ``zhc.py`` does."""
+    fields = [str(len(argv))] + argv
+    fields += [u'{}={}'.format(k, v) for k, v in env.items()]
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        sock.connect(path)
+        sock.sendall(u'\0'.join(fields).encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        data = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+
+    return data.decode('utf-8')
+
+
+def _handler(argv, env):
+    """Echo request. Fail if first argument is "fail"."""
+    if argv[0] == u'fail':
+        raise ValueError(u'failed')
+    return u'{} {}'.format(u'|'.join(argv), env[u'QUERY'])
+
+
+@pytest.fixture
+def server(tmpdir):
+    """`Server` running in a thread with a short idle timeout."""
+    path = str(tmpdir.join('zh.sock'))
+    server = Server(path, _handler, timeout=0.5)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    yield server
+    thread.join()
+
+
+def test_parse_request():
+    """Empty arguments and values containing "=" survive."""
+    data = u'2\0search\0\0A=b=c\0B=ü'.encode('utf-8')
+    assert parse_request(data) == ([u'search', u''],
+                                   {u'A': u'b=c', u'B': u'ü'})
+
+
+def test_server(server):
+    """Requests are answered until the server is idle."""
+    env = {u'QUERY': u'größe = x'}
+    assert _request(server.path, [u'search', u'a b'], env) == \
+        u'0\nsearch|a b größe = x'
+    assert _request(server.path, [u'fail'], env) == u'1\n'
+
+    # Only one server can run
+    assert Server(server.path, _handler).serve_forever() is False
+
+    time.sleep(1)
+    assert not os.path.exists(server.path)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
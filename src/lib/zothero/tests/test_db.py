@@ -0,0 +1,117 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-04
+#
+
+"""Unit tests for db.py"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import sqlite3
+
+import pytest
+
+from zothero import db
+from zothero.index import Index
+
+
+def _pragma(conn, name):
+    """Value of PRAGMA ``name``."""
+    return conn.execute('PRAGMA %s' % name).fetchone()[0]
+
+
+def test_connect(tmpdir):
+    """Connections are tuned."""
+    path = str(tmpdir.join('test.sqlite'))
+    conn = db.connect(path)
+    assert _pragma(conn, 'journal_mode') == 'wal'
+    assert _pragma(conn, 'temp_store') == 2  # memory
+    assert _pragma(conn, 'query_only') == 0
+    conn.execute('CREATE TABLE t (x)')
+
+    reader = db.connect(path, readonly=True)
+    assert _pragma(reader, 'query_only') == 1
+    assert _pragma(reader, 'mmap_size') > 0
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute('INSERT INTO t VALUES (1)')
+
+
+def test_read_during_write(tmpdir):
+    """Readers aren't blocked by a write transaction."""
+    path = str(tmpdir.join('test.sqlite'))
+    writer = db.connect(path)
+    with writer:
+        writer.execute('CREATE TABLE t (x)')
+        writer.execute('INSERT INTO t VALUES (1)')
+
+    writer.execute('BEGIN IMMEDIATE')
+    writer.execute('INSERT INTO t VALUES (2)')
+    reader = db.connect(path, readonly=True, timeout=0)
+    assert reader.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 1
+    writer.commit()
+    assert reader.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 2
+
+
+def test_wal_files(tmpdir):
+    """Modification time and deletion include WAL files."""
+    path = str(tmpdir.join('test.sqlite'))
+    assert db.wal_mtime(path) == 0.0
+    conn = db.connect(path)
+    with conn:
+        conn.execute('CREATE TABLE t (x)')
+
+    assert os.path.exists(path + '-wal')
+    os.utime(path, (0, 0))
+    assert db.wal_mtime(path) == os.path.getmtime(path + '-wal')
+
+    conn.close()
+    db.delete(path)
+    assert not os.listdir(str(tmpdir))
+
+
+def test_replace(tmpdir):
+    """Replaced database doesn't get the old one's WAL."""
+    src, dst = str(tmpdir.join('new.sqlite')), str(tmpdir.join('db.sqlite'))
+    old = db.connect(dst)
+    with old:
+        old.execute('CREATE TABLE old (x)')
+    assert os.path.exists(dst + '-wal')
+
+    new = db.connect(src, journal_mode='DELETE')
+    with new:
+        new.execute('CREATE TABLE new (x)')
+    new.close()
+
+    db.replace(src, dst)
+    assert sorted(os.listdir(str(tmpdir))) == ['db.sqlite']
+    conn = db.connect(dst, readonly=True, journal_mode='DELETE')
+    tables = [r[0] for r in conn.execute('SELECT name FROM sqlite_master')]
+    assert tables == ['new']
+    # Old connection still reads the old file
+    assert old.execute('SELECT COUNT(*) FROM old').fetchone()[0] == 0
+
+
+def test_search_during_update(tmpdir, zot):
+    """Index can be searched while it's being updated."""
+    path = str(tmpdir.join('search.sqlite'))
+    Index(path).update(zot)
+
+    searcher = Index(path)
+    n = len(searcher.search(u'the'))
+    assert n
+    updater = Index(path)
+    with updater.cursor() as c:
+        c.execute('DELETE FROM entries')
+        assert len(Index(path).search(u'the')) == n
+        assert len(searcher.search(u'the')) == n
+
+    assert searcher.search(u'the') == []
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
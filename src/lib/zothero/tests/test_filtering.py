@@ -0,0 +1,122 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Unit tests for filtering.py"""
+
+from __future__ import print_function, absolute_import
+
+import pickle
+
+import pytest
+
+from workflow import Workflow
+from workflow.workflow import MATCH_ATOM, MATCH_CAPITALS, MATCH_SUBSTRING
+
+from zothero.filtering import FilterIndex
+
+ITEMS = [
+    u'Journal of Applied Physics',
+    u'journal of applied physics',
+    u'Applied Linguistics',
+    u'American Psychological Association 6th edition',
+    u'Zeitschrift für Ökonomie',
+    u'Ökologie & Umwelt',
+    u'Straße',
+    u'OmniFocus',
+    u'How I Met Your Mother',
+    u'The Dukes of Hazzard',
+    u'  ',
+    u'a' * 200,
+    u'',
+    u'Nature',
+    u'Nature Reviews Genetics',
+    u'First line\nsecond line',
+]
+
+QUERIES = [
+    u'app', u'jap', u'J. Appl. Phys.', u'apa', u'of', u'himym', u'doh',
+    u'oko', u'öko', u'ÖKON', u'strasse', u'nature', u'nat gen', u'ntr',
+    u'a', u'applied  physics', u'physics linguistics', u'xyz', u'  ',
+    u'fsl', u'tsl', u'lnsc', u'jphy', u'yhp', u'zfk', u'ßtr',
+]
+
+
+@pytest.fixture
+def wf(tmpdir, monkeypatch):
+    """`Workflow` with data and cache directories in ``tmpdir``."""
+    for name in ('cache', 'data'):
+        monkeypatch.setenv('alfred_workflow_' + name,
+                           str(tmpdir.mkdir(name)))
+    monkeypatch.setenv('alfred_workflow_bundleid', 'net.deanishe.zothero.test')
+    return Workflow()
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_same_as_filter(wf, query):
+    """Results and scores are the same as those of `Workflow.filter()`."""
+    index = FilterIndex(ITEMS)
+    for kwargs in (dict(),
+                   dict(min_score=30),
+                   dict(max_results=3),
+                   dict(ascending=True, max_results=2),
+                   dict(fold_diacritics=False),
+                   dict(match_on=MATCH_ATOM | MATCH_CAPITALS),
+                   dict(match_on=MATCH_SUBSTRING, min_score=50)):
+        assert index.search(query, include_score=True, **kwargs) == \
+            wf.filter(query, ITEMS, include_score=True, **kwargs), kwargs
+        assert index.search(query, **kwargs) == \
+            wf.filter(query, ITEMS, **kwargs), kwargs
+
+
+def test_diacritic_setting(wf):
+    """Results match `Workflow.filter()` with diacritic folding off."""
+    index = FilterIndex(ITEMS)
+    wf.settings['__workflow_diacritic_folding'] = False
+    fold = wf.settings.get('__workflow_diacritic_folding', True)
+    # The setting overrides `Workflow.filter()`'s argument
+    assert index.search(u'oko', fold_diacritics=fold) == \
+        wf.filter(u'oko', ITEMS) != index.search(u'oko')
+    for query in QUERIES:
+        assert index.search(query, include_score=True,
+                            fold_diacritics=fold) == \
+            wf.filter(query, ITEMS, include_score=True), query
+
+
+def test_key(wf):
+    """Items are searched by ``key``."""
+    items = [dict(name=s) for s in ITEMS[1:]]
+    index = FilterIndex(items, key=lambda d: d['name'])
+    assert len(index) == len(items)
+    assert index.search(u'app') == wf.filter(u'app', items,
+                                             key=lambda d: d['name'])
+    assert index.search(u'') == items
+
+    # Items with the same key and score needn't be comparable
+    items = [dict(name=u'Nature'), dict(name=u'nature')]
+    index = FilterIndex(items, key=lambda d: d['name'])
+    assert index.search(u'nat') == items
+
+
+def test_cache(wf):
+    """Indices are cached by the workflow."""
+    index = FilterIndex(ITEMS)
+    wf.cache_data('filter', index)
+    cached = wf.cached_data('filter', max_age=0)
+    assert cached.items == ITEMS
+    for query in QUERIES:
+        assert cached.search(query, include_score=True) == \
+            index.search(query, include_score=True)
+
+    # Folded keys of ASCII items aren't stored twice
+    data = pickle.loads(pickle.dumps(index))
+    assert data._keys[0][0] is data._keys[1][0]
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
@@ -0,0 +1,418 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-15
+#
+
+"""Unit tests for index.py"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import random
+import struct
+
+import pytest
+
+from zothero import index
+from zothero.index import Index
+from zothero.serialise import CODECS
+
+
+@pytest.fixture(params=['fts5', 'fts4'])
+def idx(request, tmpdir, zot):
+    """`Index` populated from ``zot``."""
+    idx = Index(str(tmpdir.join('search.sqlite')), request.param)
+    idx.update(zot)
+    return idx
+
+
+def _count(idx, table):
+    """Number of rows in ``table``."""
+    sql = 'SELECT COUNT(*) AS n FROM {}'.format(table)
+    return idx.conn.execute(sql).fetchone()['n']
+
+
+def test_full_index(zot, idx):
+    """All entries are indexed."""
+    n = len(list(zot.ids()))
+    assert not idx.empty
+    for table in ('search', 'data', 'modified'):
+        assert _count(idx, table) == n
+
+
+def test_batched_reindex(zot, idx, monkeypatch):
+    """Re-indexing in batches replaces existing rows."""
+    monkeypatch.setattr(index, 'BATCH_SIZE', 7)
+    n = _count(idx, 'search')
+    assert idx._update(zot, force=True)
+    for table in ('search', 'data', 'modified'):
+        assert _count(idx, table) == n
+
+
+def test_entry(zot, idx):
+    """Entries are retrievable from the index."""
+    for e in zot.all_entries():
+        assert idx.entry(e.id).json() == e.json()
+
+
+def test_search(zot, idx):
+    """Entries are found by title."""
+    e = next(zot.all_entries())
+    word = e.title.split()[0]
+    assert e.id in [r.id for r in idx.search(word)]
+    assert e.id in [r.id for r in idx.search(u'title:' + word)]
+    assert e.id in [r.id for r in idx.search(word[:3])]
+
+
+def test_search_hits(zot, idx):
+    """Search results contain display data and load their Entry."""
+    e = next(zot.all_entries())
+    hit = [r for r in idx.search(e.title) if r.id == e.id][0]
+    assert (hit.key, hit.title, hit.year, hit.type) == \
+        (e.key, e.title, e.year, e.type)
+    assert hit.attachments == len(e.attachments)
+    assert hit.notes == u'\n\n'.join(e.notes)
+    assert hit.entry.json() == e.json()
+    assert not hasattr(hit, '__dict__')
+
+
+def test_search_prefix(zot, idx):
+    """Exact matches rank above prefix matches, without duplicates."""
+    # "smith" is a prefix of "smithson"
+    results = idx.search(u'smith')
+    ids = [e.id for e in results]
+    assert len(ids) == len(set(ids))
+
+    exact = [u'Smith' in [c.family for c in r.entry.creators]
+             for r in results]
+    assert any(exact) and not all(exact)
+    assert exact == sorted(exact, reverse=True)
+
+
+def test_narrows():
+    """Queries that only add to the last term narrow the previous one."""
+    for previous, query in [(u'smith 20', u'smith 201'),
+                            (u'smith 20', u'smith 2019'),
+                            (u'sm', u'smi'),
+                            (u'title:sm', u'title:smi'),
+                            (u'smith AN', u'smith ANt')]:
+        assert index.narrows(previous, query), (previous, query)
+
+    for previous, query in [(u'', u's'),
+                            (u'smith', u'smith'),
+                            (u'smith', u'smit'),
+                            (u'smith', u'smith 2'),
+                            (u'smith ', u'smith 2'),
+                            (u'smith', u'smith*'),
+                            (u'smith', u'smith:'),
+                            (u'title', u'title:'),
+                            (u'title:', u'title:s'),
+                            (u'foo:sm', u'foo:smi'),
+                            (u'smith AN', u'smith AND'),
+                            (u'smith O', u'smith OR'),
+                            (u'smith -x', u'smith -xy'),
+                            (u'-smith 20', u'-smith 201'),
+                            (u'title:quantum NOT title:review',
+                             u'title:quantum NOT title:reviews'),
+                            (u'smith NOT jo', u'smith NOT jon'),
+                            (u'"smith', u'"smith"'),
+                            (u'jones', u'smith')]:
+        assert not index.narrows(previous, query), (previous, query)
+
+
+def test_search_within(zot, idx):
+    """Searching the results of a narrower query finds the same hits."""
+    e = next(zot.all_entries())
+    word = e.title.split()[0].lower()
+    for n in range(2, len(word)):
+        previous, query = word[:n], word[:n + 1]
+        assert index.narrows(previous, query)
+        ids = [h.id for h in idx.search(previous)]
+        if len(ids) == index.SEARCH_LIMIT:  # not all results
+            continue
+
+        full = [(h.id, h.score) for h in idx.search(query)]
+        assert [(h.id, h.score) for h in idx.search(query, ids)] == full
+        assert e.id in [h.id for h in idx.search(query, ids)]
+
+    assert idx.search(word, []) == []
+    assert [h.id for h in idx.search(word, [e.id])] == [e.id]
+
+
+def test_deleted(zot, idx):
+    """Deleted entries are removed from the full-text index."""
+    e = next(zot.all_entries())
+    with zot.conn as c:
+        c.execute('INSERT INTO deletedItems (itemID) VALUES (?)', (e.id,))
+
+    assert idx._update(zot, force=True)
+    assert idx.entry(e.id) is None
+    assert e.id not in [r.id for r in idx.search(e.title.split()[0])]
+
+
+def _reindexed(zot, idx, monkeypatch):
+    """IDs of entries loaded by an incremental update."""
+    ids = []
+    entries = zot.entries
+
+    def _entries(id_list):
+        ids.extend(id_list)
+        return entries(id_list)
+
+    monkeypatch.setattr(zot, 'entries', _entries)
+    monkeypatch.setattr(zot, 'all_entries', None)  # no full reindex
+    idx._update(zot)
+    return sorted(ids)
+
+
+def test_sync_unchanged(zot, idx, monkeypatch):
+    """Nothing is re-indexed if nothing has changed."""
+    assert _reindexed(zot, idx, monkeypatch) == []
+
+
+def test_sync_note_changed(zot, idx, monkeypatch):
+    """Only the parent of an edited note is re-indexed."""
+    note_id, parent = zot.conn.execute(
+        'SELECT itemID, parentItemID FROM itemNotes').fetchone()
+    with zot.conn as c:
+        c.execute('UPDATE itemNotes SET note = ? WHERE itemID = ?',
+                  (u'<p>edited note</p>', note_id))
+        c.execute("UPDATE items SET clientDateModified = "
+                  "'2030-01-01 00:00:00' WHERE itemID = ?", (note_id,))
+
+    assert _reindexed(zot, idx, monkeypatch) == [parent]
+    assert u'edited note' in idx.entry(parent).notes
+
+
+def test_sync_children_removed(zot, idx, monkeypatch):
+    """Items whose notes or tags were deleted are re-indexed."""
+    note_id, parent = zot.conn.execute(
+        'SELECT itemID, parentItemID FROM itemNotes').fetchone()
+    tagged, tag_id = zot.conn.execute(
+        'SELECT itemID, tagID FROM itemTags WHERE itemID != ?',
+        (parent,)).fetchone()
+    with zot.conn as c:
+        c.execute('DELETE FROM itemNotes WHERE itemID = ?', (note_id,))
+        c.execute('DELETE FROM items WHERE itemID = ?', (note_id,))
+        c.execute('DELETE FROM itemTags WHERE itemID = ? AND tagID = ?',
+                  (tagged, tag_id))
+
+    assert _reindexed(zot, idx, monkeypatch) == sorted([parent, tagged])
+    n = zot.conn.execute('SELECT COUNT(*) FROM itemNotes '
+                         'WHERE parentItemID = ?', (parent,)).fetchone()[0]
+    assert len(idx.entry(parent).notes) == n
+
+
+def test_sync_collection_renamed(zot, idx, monkeypatch):
+    """Items in a renamed collection are re-indexed."""
+    coll_id = zot.conn.execute(
+        'SELECT collectionID FROM collectionItems').fetchone()[0]
+    with zot.conn as c:
+        c.execute("UPDATE collections SET collectionName = 'Renamed', "
+                  "clientDateModified = '2030-01-01 00:00:00' "
+                  "WHERE collectionID = ?", (coll_id,))
+
+    ids = [row[0] for row in zot.conn.execute(
+        'SELECT itemID FROM collectionItems WHERE collectionID = ? '
+        'AND itemID NOT IN (SELECT itemID FROM deletedItems)', (coll_id,))]
+    assert _reindexed(zot, idx, monkeypatch) == sorted(ids)
+    for id_ in ids:
+        assert u'Renamed' in [c.name for c in idx.entry(id_).collections]
+
+
+def test_sync_restored(zot, idx, monkeypatch):
+    """Items restored from the trash are re-indexed."""
+    id_ = next(zot.all_entries()).id
+    with zot.conn as c:
+        c.execute('INSERT INTO deletedItems (itemID) VALUES (?)', (id_,))
+
+    assert _reindexed(zot, idx, monkeypatch) == []
+    assert idx.entry(id_) is None
+
+    with zot.conn as c:
+        c.execute('DELETE FROM deletedItems WHERE itemID = ?', (id_,))
+
+    assert id_ in _reindexed(zot, idx, monkeypatch)
+    assert idx.entry(id_).id == id_
+
+
+def test_sync_deleted(zot, idx, monkeypatch):
+    """Deleted items are removed without loading every item ID."""
+    monkeypatch.setattr(zot, 'ids', None)
+    id_ = next(zot.all_entries()).id
+    with zot.conn as c:
+        c.execute('DELETE FROM items WHERE itemID = ?', (id_,))
+
+    n = _count(idx, 'data')
+    assert _reindexed(zot, idx, monkeypatch) == []
+    assert idx.entry(id_) is None
+    assert _count(idx, 'data') == n - 1
+    assert _count(idx, 'hits') == n - 1
+    # Zotero database is detached afterwards
+    dbs = [row[1] for row in idx.conn.execute('PRAGMA database_list')]
+    assert 'zotero' not in dbs
+
+
+def test_rebuild_replaces_index(zot, idx):
+    """A full re-index replaces the database file."""
+    searcher = Index(idx.dbpath, idx.fts)
+    word = next(zot.all_entries()).title.split()[0]
+    hits = [h.id for h in searcher.search(word)]
+    assert hits
+    conn = searcher.conn
+    ino = os.stat(idx.dbpath).st_ino
+    assert Index(idx.dbpath, idx.fts)._update(zot, force=True)
+    assert os.stat(idx.dbpath).st_ino != ino
+    assert sorted(os.listdir(os.path.dirname(idx.dbpath))) == [
+        'search.sqlite', 'search.sqlite.lock', 'zotero']
+
+    # Open connections are reopened
+    assert [h.id for h in searcher.search(word)] == hits
+    assert searcher.conn is not conn
+
+
+def test_rebuild_failed(zot, idx, monkeypatch):
+    """A failed re-index leaves the index intact."""
+    from zothero import parallel
+
+    def _fail(*args):
+        raise ValueError('failed')
+
+    monkeypatch.setattr(parallel, 'iter_rows', _fail)
+    n = _count(idx, 'data')
+    ino = os.stat(idx.dbpath).st_ino
+    with pytest.raises(ValueError):
+        idx._update(zot, force=True)
+
+    assert os.stat(idx.dbpath).st_ino == ino
+    assert _count(idx, 'data') == n
+    assert not os.path.exists(idx.dbpath + index.SHADOW_SUFFIX)
+
+
+def test_update_locked(zot, idx, monkeypatch):
+    """Only a full re-index waits for another update."""
+    monkeypatch.setattr(zot, 'entries', None)
+    with Index(idx.dbpath, idx.fts)._locked() as locked:
+        assert locked
+        assert idx._update(zot) is False
+
+
+def test_generation(zot, idx, monkeypatch):
+    """Updates that change the index start a new generation."""
+    generation = idx.generation
+    assert generation > 0
+    id_ = next(zot.all_entries()).id
+    assert _reindexed(zot, idx, monkeypatch) == []
+    assert idx.generation == generation
+
+    with zot.conn as c:
+        c.execute('DELETE FROM items WHERE itemID = ?', (id_,))
+    _reindexed(zot, idx, monkeypatch)
+    assert idx.generation > generation
+
+    generation = idx.generation
+    monkeypatch.undo()
+    idx._update(zot, force=True)
+    assert idx.generation > generation
+
+
+def test_hits(zot, idx):
+    """Hits are loaded in the order of their IDs."""
+    e = next(zot.all_entries())
+    hits = idx.search(e.title.split()[0])
+    results = [(h.id, h.score) for h in reversed(hits)] + [(-1, 0.0)]
+    loaded = idx.hits(results)
+    assert [h.id for h in loaded] == [h.id for h in reversed(hits)]
+    assert [h.title for h in loaded] == [h.title for h in reversed(hits)]
+    assert [h.score for h in loaded] == [h.score for h in reversed(hits)]
+    assert idx.hits([]) == []
+
+
+def test_fts_module_change(tmpdir, zot):
+    """Index is rebuilt if the full-text module changes."""
+    path = str(tmpdir.join('search.sqlite'))
+    idx = Index(path, 'fts4')
+    idx.update(zot)
+    assert not idx.empty
+
+    idx = Index(path, 'fts5')
+    assert idx.empty
+
+
+@pytest.mark.parametrize('codec', sorted(CODECS))
+def test_codec(tmpdir, zot, codec):
+    """Entries are stored with the codec in ``dbinfo``."""
+    path = str(tmpdir.join('search.sqlite'))
+    idx = Index(path, codec=codec)
+    idx.update(zot)
+    for e in zot.all_entries():
+        assert idx.entry(e.id) == e
+
+    # Existing databases are read with their own codec
+    other = 'json' if codec != 'json' else 'binary'
+    idx = Index(path, codec=other)
+    for e in zot.all_entries():
+        assert idx.entry(e.id) == e
+    assert idx.codec.name == codec
+
+    # A full re-index creates a new database with the new codec
+    idx.update(zot, force=True)
+    assert idx.entry(e.id) == e
+    assert idx.codec.name == other
+
+
+def _reference_rank(weights):
+    """Original implementation of `index.make_rank_func`."""
+    def rank(matchinfo):
+        bufsize = len(matchinfo)
+        matchinfo = [struct.unpack(b'I', matchinfo[i:i + 4])[0]
+                     for i in range(0, bufsize, 4)]
+        it = iter(matchinfo[2:])
+        return sum(x[0] * w / x[1]
+                   for x, w in zip(zip(it, it, it), weights)
+                   if x[1])
+
+    return rank
+
+
+def test_rank_matches_reference():
+    """Ranking function gives identical scores to the original."""
+    rnd = random.Random(4)
+    for _ in range(2000):
+        weights = [rnd.choice((0.0, 0.1, 0.3, 0.5, 1.0, 2.5))
+                   for _ in range(rnd.randint(1, 14))]
+        phrases, cols = rnd.randint(1, 5), rnd.randint(1, 14)
+        values = [phrases, cols]
+        for _ in range(phrases * cols):
+            total = rnd.choice((0, rnd.randint(1, 10 ** 6)))
+            values += [rnd.randint(0, total), total, rnd.randint(0, total)]
+        # Truncated blobs, too
+        values = values[:rnd.randint(2, len(values))]
+        blob = struct.pack('%dI' % len(values), *values)
+
+        score = index.make_rank_func(weights)(blob)
+        assert score == _reference_rank(weights)(blob)
+
+
+def test_fts5_query():
+    """User queries are converted to FTS5 syntax."""
+    data = [
+        (u'smith', u'"smith"'),
+        (u'smi*', u'"smi"*'),
+        (u"o'brien 2019-01", u'"o\'brien" "2019-01"'),
+        (u'title:bayes', u'title:"bayes"'),
+        (u'nocolumn:bayes', u'"nocolumn:bayes"'),
+        (u'"exact phrase" OR x', u'"exact phrase" OR "x"'),
+        (u'title:', u''),
+        (u'"unbalanced', u'"""unbalanced"'),
+    ]
+    for query, x in data:
+        assert index.fts5_query(query) == x
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
@@ -0,0 +1,80 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-27
+#
+
+"""Unit tests for models.py"""
+
+from __future__ import print_function, absolute_import
+
+from datetime import datetime
+import pickle
+
+import pytest
+
+from zothero.models import Attachment, Collection, Creator, CSLStyle, Entry
+
+
+def _entry():
+    """`Entry` with nested models."""
+    return Entry(
+        id=1, key=u'ABCD1234', library=1, type=u'journalArticle',
+        modified=datetime(2019, 3, 1, 12, 30), title=u'Über Bayes',
+        date=u'2019-03', year=2019, zdata={u'title': u'Über Bayes'},
+        creators=[Creator(0, u'Ann', u'Smith', u'author')],
+        collections=[Collection(u'Stats', u'COLL1234')],
+        attachments=[Attachment(u'ATT12345', u'paper.pdf', u'/x.pdf')],
+        notes=[u'a note'], tags=[u'bayesian'])
+
+
+def test_defaults():
+    """Unset attributes get fresh, empty values."""
+    a, b = Entry(id=1), Entry(id=2)
+    assert a.title == u'' and a.year == 0 and a.citekey is None
+    a.notes.append(u'x')
+    assert b.notes == []
+    assert not hasattr(a, '__dict__')
+
+
+def test_dict_access():
+    """Attributes are also accessible as dictionary keys."""
+    e = _entry()
+    assert e['title'] == e.title
+    e['title'] = u'New'
+    assert e.title == u'New'
+    assert 'title' in e and 'nothing' not in e
+    assert e.get('nothing', 1) == 1
+
+    with pytest.raises(KeyError):
+        e['nothing']
+    with pytest.raises(KeyError):
+        e['nothing'] = 1
+    with pytest.raises(AttributeError):
+        e.nothing = 1
+
+
+def test_round_trip():
+    """Models survive conversion to dicts, JSON and pickles."""
+    e = _entry()
+    assert Entry.from_dict(e.to_dict()) == e
+    assert Entry.from_json(e.json()) == e
+    assert pickle.loads(pickle.dumps(e, pickle.HIGHEST_PROTOCOL)) == e
+    assert Entry.from_json(e.json()).modified == e.modified
+    assert e != Entry.from_dict(dict(e.to_dict(), year=2018))
+
+    s = CSLStyle(name=u'APA', url=u'http://x', path=u'/apa.csl')
+    assert CSLStyle.from_json(s.json()) == s
+    assert str(s) == u'[http://x] APA'
+
+
+def test_str():
+    """Entries describe themselves."""
+    assert str(_entry()) == u'Über Bayes (2019) by Smith'
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
@@ -0,0 +1,140 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-03
+#
+
+"""Unit tests for notes.py"""
+
+from __future__ import print_function, absolute_import
+
+import os
+
+import pytest
+
+from zothero import notes
+from zothero.notes import HTMLText, NoteCache, strip_tags, truncate
+from zothero.zotero import Zotero
+
+HTML = [
+    u'',
+    u'plain text',
+    u'Tom &amp; Jerry &lt;3 &copy; &#8212; &#x2014;',
+    u'<p>Test</p>',
+    u'The <em>best</em> ever',
+    u'<h1>Fööbär</h1>',
+    u'<div class="zotero-note znv1"><h1>Title</h1><p>a &amp; b</p></div>',
+    u'<p>one</p>\n<p>two</p>',
+    u'<a href="http://x.com/?a=1&amp;b=2" title="a > b">link</a>',
+    u"<span title='it&apos;s > 1'>quoted</span>",
+    u'<!-- comment <b>bold</b> -->after',
+    u'<!DOCTYPE html><html><body>doc</body></html>',
+    u'<p>br<br/>br<br />br</p>',
+    u'<span class="highlight" data-annotation="%7B%22a%22%3A1%7D">'
+    u'&ldquo;quoted&rdquo;</span> <span class="citation">(Smith, p. 3)'
+    u'</span>',
+    # Handled by `HTMLParser`
+    u'a < b and c > d',
+    u'<p>x<y</p>',
+    u'<script>var x = "<p>";</script>text',
+    u'<STYLE>p > a {}</STYLE>text',
+    u'unclosed <b',
+]
+
+
+@pytest.mark.parametrize('html', HTML)
+def test_strip_tags(html):
+    """Result is the same as `HTMLParser`'s."""
+    assert strip_tags(html) == HTMLText.strip(html)
+
+
+def test_strip_tags_notes(zot):
+    """Result is the same as `HTMLParser`'s for synthetic notes."""
+    for row in zot.conn.execute('SELECT note FROM itemNotes'):
+        assert strip_tags(row['note']) == HTMLText.strip(row['note'])
+
+
+def test_truncate():
+    """Text is cut at whitespace."""
+    assert truncate(u'short', 10) == u'short'
+    assert truncate(u'one two three', 9) == u'one two'
+    assert truncate(u'abcdefghijkl', 5) == u'abcde'
+
+
+@pytest.fixture(autouse=True)
+def cache_all(monkeypatch):
+    """Cache notes of any size."""
+    monkeypatch.setattr(NoteCache, 'MIN_SIZE', 0)
+
+
+def test_note_cache(tmpdir, monkeypatch):
+    """Notes are only parsed once."""
+    path = str(tmpdir.join('notes.sqlite'))
+    html = [u'<p>one</p>', u'<p>two &amp; three</p>', u'<p>one</p>']
+    cache = NoteCache(path)
+    assert cache.texts(html) == [u'one', u'two & three', u'one']
+    cache.close()
+
+    def _fail(html):
+        raise AssertionError('parsed %r' % html)
+
+    monkeypatch.setattr(notes, 'strip_tags', _fail)
+    cache = NoteCache(path)
+    assert cache.texts(html[:2]) == [u'one', u'two & three']
+    with pytest.raises(AssertionError):
+        cache.texts([u'<p>four</p>'])
+
+
+def test_note_cache_small(tmpdir, monkeypatch):
+    """Short notes aren't cached."""
+    monkeypatch.setattr(NoteCache, 'MIN_SIZE', 15)
+    cache = NoteCache(str(tmpdir.join('notes.sqlite')))
+    html = [u'<p>short</p>', u'<p>long enough</p>']
+    assert cache.texts(html) == [u'short', u'long enough']
+    rows = cache.conn.execute('SELECT text FROM notes').fetchall()
+    assert [row[0] for row in rows] == [u'long enough']
+
+
+def test_note_cache_expiry(tmpdir, monkeypatch):
+    """Old and outdated notes are removed."""
+    path = str(tmpdir.join('notes.sqlite'))
+    cache = NoteCache(path)
+    cache.texts([u'<p>old</p>'])
+    cache.close()
+
+    def _count():
+        cache = NoteCache(path)
+        n = cache.conn.execute('SELECT COUNT(*) FROM notes').fetchone()[0]
+        cache.close()
+        return n
+
+    assert _count() == 1
+    monkeypatch.setattr(notes, '_today',
+                        lambda: NoteCache.MAX_AGE + 1e6)
+    assert _count() == 0
+
+    monkeypatch.undo()
+    monkeypatch.setattr(NoteCache, 'MIN_SIZE', 0)
+    cache = NoteCache(path)
+    cache.texts([u'<p>new</p>'])
+    cache.close()
+    monkeypatch.setattr(NoteCache, 'VERSION', NoteCache.VERSION + 1)
+    assert _count() == 0
+
+
+def test_zotero_notes_cache(tmpdir, zot):
+    """Entries are the same with and without the cache."""
+    cache = str(tmpdir.join('cache', 'notes.sqlite'))
+    plain = [e.notes for e in zot.all_entries()]
+    for _ in range(2):
+        zot = Zotero(zot.datadir, notes_cache=cache)
+        assert [e.notes for e in zot.all_entries()] == plain
+
+    assert os.path.exists(cache)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
@@ -0,0 +1,58 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-02
+#
+
+"""Unit tests for parallel.py"""
+
+from __future__ import print_function, absolute_import
+
+import pytest
+
+from zothero import parallel
+from zothero.index import Index
+
+
+# Items in the synthetic database (see conftest.py)
+N_ITEMS = 80
+
+
+def _dump(idx):
+    """Contents of the index's tables."""
+    tables = {}
+    for table in ('entries', 'data', 'hits', 'modified'):
+        sql = 'SELECT * FROM {} ORDER BY id'.format(table)
+        tables[table] = [tuple(row) for row in idx.conn.execute(sql)]
+    return tables
+
+
+def test_id_ranges(zot):
+    """Ranges cover all entries exactly once."""
+    ranges = zot.id_ranges(25)
+    assert len(ranges) > 2
+    assert ranges[-1][1] is None
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+
+    ids = [e.id for bounds in ranges for e in zot.entries_between(*bounds)]
+    assert ids == sorted(e.id for e in zot.all_entries())
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_iter_rows(tmpdir, zot, monkeypatch, workers):
+    """Index built by worker processes is the same as a serial one."""
+    serial = Index(str(tmpdir.join('serial.sqlite')), workers=1)
+    serial.update(zot)
+
+    monkeypatch.setattr(parallel, 'RANGE_SIZE', 30)
+    idx = Index(str(tmpdir.join('parallel.sqlite')), workers=workers)
+    idx.update(zot)
+    assert _dump(idx) == _dump(serial)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
@@ -0,0 +1,132 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-06
+#
+
+"""Unit tests for results.py"""
+
+from __future__ import print_function, absolute_import
+
+import pytest
+
+from zothero.results import ResultCache, normalise
+
+
+def test_normalise():
+    """Whitespace is normalised."""
+    assert normalise(u'') == u''
+    assert normalise(u'   ') == u''
+    assert normalise(u'smith') == u'smith'
+    assert normalise(u'  smith   2017') == u'smith 2017'
+    assert normalise(u'smith  ') == u'smith '
+    assert normalise(u'Smith OR Jones') == u'Smith OR Jones'
+
+
+@pytest.fixture
+def cache(tmpdir):
+    """Empty `ResultCache`."""
+    return ResultCache(str(tmpdir.join('results.sqlite')))
+
+
+def _keys(cache):
+    """Keys in cache."""
+    rows = cache.conn.execute('SELECT key FROM results ORDER BY key')
+    return [row[0] for row in rows]
+
+
+def test_fetch(cache):
+    """Values are cached per generation."""
+    calls = []
+
+    def _func():
+        calls.append(1)
+        return [[1, 0.5], [2, 0.25]]
+
+    for _ in range(3):
+        assert cache.fetch('search', u'a', 1, _func) == [[1, 0.5], [2, 0.25]]
+    assert len(calls) == 1
+
+    cache.fetch('search', u'a', 2, _func)
+    cache.fetch('items', u'a', 2, _func)
+    assert len(calls) == 3
+
+    stats = cache.stats()
+    assert stats['search']['hits'] == 2
+    assert stats['search']['misses'] == 2
+    assert stats['search']['hit_rate'] == 0.5
+    assert stats['items']['misses'] == 1
+    assert stats['items']['hit_rate'] == 0.0
+
+
+def test_hit_read_only(cache, monkeypatch):
+    """Hits don't write to the database."""
+    cache.fetch('search', u'a', 1, list)
+    changes = cache.conn.total_changes
+    cache.fetch('search', u'a', 1, list)
+    assert cache.conn.total_changes == changes
+    assert cache.stats()['search']['hits'] == 1
+
+    # Old last-used times are updated, and the statistics saved
+    monkeypatch.setattr(cache, 'TOUCH_AGE', -1)
+    cache.fetch('search', u'a', 1, list)
+    assert cache.conn.total_changes > changes
+    other = ResultCache(cache.dbpath)
+    assert other.stats()['search']['hits'] == 2
+
+    # Unsaved statistics are saved when the cache is closed
+    monkeypatch.setattr(cache, 'TOUCH_AGE', 60)
+    cache.fetch('search', u'a', 1, list)
+    assert other.stats()['search']['hits'] == 2
+    cache.close()
+    assert other.stats()['search']['hits'] == 3
+
+
+def test_evict_generation(cache):
+    """Values of other generations are removed."""
+    cache.fetch('search', u'a', 1, list)
+    cache.fetch('search', u'b', 1, list)
+    assert _keys(cache) == [u'a', u'b']
+    cache.fetch('search', u'c', 2, list)
+    assert _keys(cache) == [u'c']
+
+
+def test_evict_age(cache, monkeypatch):
+    """Unused values are removed."""
+    cache.fetch('search', u'a', 1, list)
+    monkeypatch.setattr(cache, 'MAX_AGE', -1)
+    cache.fetch('search', u'b', 1, list)
+    assert _keys(cache) == []
+
+
+def test_evict_size(cache, monkeypatch):
+    """Least-recently used values are removed."""
+    monkeypatch.setattr(cache, 'MAX_SIZE', 30)
+    monkeypatch.setattr(cache, 'TOUCH_AGE', -1)
+
+    def _value():
+        return u'x' * 10
+
+    for key in (u'a', u'b', u'c'):
+        cache.fetch('search', key, 1, _value)
+    assert _keys(cache) == [u'b', u'c']
+
+    cache.fetch('search', u'b', 1, _value)  # b is used more recently
+    cache.fetch('search', u'd', 1, _value)
+    assert _keys(cache) == [u'b', u'd']
+
+
+def test_version(cache, monkeypatch):
+    """Cache is emptied when its version changes."""
+    cache.fetch('search', u'a', 1, list)
+    cache.close()
+    monkeypatch.setattr(ResultCache, 'VERSION', ResultCache.VERSION + 1)
+    assert _keys(cache) == []
+    assert cache.stats() == {}
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
@@ -0,0 +1,56 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-28
+#
+
+"""Unit tests for serialise.py"""
+
+from __future__ import print_function, absolute_import
+
+from datetime import datetime
+
+import pytest
+
+from zothero.models import Attachment, Creator, Entry
+from zothero.serialise import CODECS, get_codec
+
+
+@pytest.fixture(params=sorted(CODECS))
+def codec(request):
+    """Each registered codec."""
+    return get_codec(request.param)
+
+
+def test_round_trip(codec, entries):
+    """Entries are unchanged by encoding and decoding."""
+    for e in entries:
+        assert codec.decode(codec.encode(e)) == e
+
+
+def test_edge_cases(codec):
+    """Empty and ``None`` values, and non-ASCII text survive."""
+    entries = [
+        Entry(id=1, library=1, key=u'AAAA1111', modified=None, year=0),
+        Entry(id=2 ** 40, library=3, key=u'BBBB2222', type=u'book',
+              modified=datetime(1901, 12, 31, 23, 59, 59), title=u'',
+              zdata={u'title': u'', u'extra': u'𝔘𝔫𝔦𝔠𝔬𝔡𝔢 ünïcödé'},
+              creators=[Creator(-1, None, u'Ønly'), Creator(7)],
+              attachments=[Attachment(u'CCCC3333', u'x', None, u'http://x')],
+              notes=[u'', u'中文'], tags=[u'a', u''], citekey=u'k€y'),
+    ]
+    for e in entries:
+        assert codec.decode(codec.encode(e)) == e
+
+
+def test_unknown_codec():
+    """Unknown codec names are rejected."""
+    with pytest.raises(ValueError):
+        get_codec('xml')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
@@ -0,0 +1,203 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-31
+#
+
+"""Unit tests for snapshot.py"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import sqlite3
+
+import pytest
+
+from zothero.snapshot import METHODS, Signature, Snapshot, SnapshotError
+
+TITLE_SQL = """
+    SELECT value FROM itemDataValues
+    WHERE valueID = (SELECT MIN(valueID) FROM itemDataValues)
+"""
+
+UPDATE_SQL = """
+    UPDATE itemDataValues SET value = ?
+    WHERE valueID = (SELECT MIN(valueID) FROM itemDataValues)
+"""
+
+
+# Items in the synthetic database (see conftest.py)
+N_ITEMS = 200
+
+
+@pytest.fixture
+def source(zotero_db):
+    """Path to a synthetic ``zotero.sqlite``."""
+    return zotero_db
+
+
+def _snapshot(tmpdir, source, methods=METHODS):
+    """`Snapshot` of ``source`` in ``tmpdir``."""
+    return Snapshot(source, str(tmpdir.join('copy.sqlite')), methods)
+
+
+def _write(path, value, exclusive=False):
+    """Change one value in database at ``path``.
+
+    Returns:
+        sqlite3.Connection: Connection used, so ``exclusive`` locks are
+            held until it's closed.
+
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    if exclusive:  # like Zotero
+        conn.execute('PRAGMA locking_mode = EXCLUSIVE')
+    conn.execute(UPDATE_SQL, (value,))
+    return conn
+
+
+def _title(path):
+    """Value changed by `_write()`."""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(TITLE_SQL).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_signature(source):
+    """Signature changes with content, not mtime."""
+    sig = Signature.read(source)
+    assert sig.page_size in (1024, 4096, 65536)
+    assert sig.size == sig.pages * sig.page_size
+    assert sig.clean
+
+    os.utime(source, (0, 0))
+    touched = Signature.read(source)
+    assert touched.same_content(sig) and touched != sig
+
+    _write(source, u'changed').close()
+    assert not Signature.read(source).same_content(sig)
+
+
+def test_signature_wal(source):
+    """A WAL rewritten to the same size changes the signature."""
+    header = b'7\x7f\x06\x82\x00-\xe2\x18\x00\x00\x10\x00'
+    with open(source + '-wal', 'wb') as fp:
+        fp.write(header + b'\x00\x00\x00\x01' + b'\x11' * 8 + b'\x00' * 8)
+    sig = Signature.read(source)
+    assert sig.wal == 32 and not sig.clean
+
+    with open(source + '-wal', 'wb') as fp:  # next checkpoint
+        fp.write(header + b'\x00\x00\x00\x02' + b'\x22' * 8 + b'\x00' * 8)
+    after = Signature.read(source)
+    assert after.wal == sig.wal
+    assert not after.same_content(sig)
+
+
+def test_signature_not_sqlite(tmpdir):
+    """Signature of a file that isn't an SQLite database."""
+    path = str(tmpdir.join('text.txt'))
+    with open(path, 'w') as fp:
+        fp.write('hello' * 100)
+
+    with pytest.raises(ValueError):
+        Signature.read(path)
+
+
+def test_update(tmpdir, source):
+    """Snapshot is only updated when the content changes."""
+    snap = _snapshot(tmpdir, source)
+    assert snap.stale
+    assert snap.update()
+    assert not snap.stale
+    assert _title(snap.path) == _title(source)
+
+    os.utime(source, (0, 0))
+    assert not snap.stale
+    assert not snap.update()
+    assert snap.signature.mtime == 0
+
+    # New instance uses saved signature
+    snap = _snapshot(tmpdir, source)
+    assert not snap.stale
+    assert not snap.update()
+    assert snap.update(force=True)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_method(tmpdir, source, method):
+    """Each method copies a changed database."""
+    snap = _snapshot(tmpdir, source, (method,))
+    assert snap.update()
+    _write(source, u'changed').close()
+    assert snap.stale
+    assert snap.update()
+    assert snap.method == method
+    assert _title(snap.path) == u'changed'
+    with sqlite3.connect(snap.path) as conn:
+        assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+
+
+def test_pages_written(tmpdir, source):
+    """Only changed pages are written."""
+    snap = _snapshot(tmpdir, source)
+    snap.update()
+    assert snap.written == os.path.getsize(source)
+
+    _write(source, u'changed').close()
+    snap.update()
+    assert snap.method == 'pages'
+    assert 0 < snap.written <= 4 * snap.signature.page_size
+
+
+def test_pages_reader(tmpdir, source):
+    """The snapshot isn't written to while it's being read."""
+    snap = _snapshot(tmpdir, source, ('pages',))
+    snap.update()
+    inode = os.stat(snap.path).st_ino
+    reader = sqlite3.connect(snap.path, isolation_level=None)
+    try:
+        reader.execute('BEGIN')
+        title = reader.execute(TITLE_SQL).fetchone()[0]
+        _write(source, u'changed').close()
+        assert snap.update()
+        assert snap.method == 'pages'
+        # The reader still has the old file
+        assert os.stat(snap.path).st_ino != inode
+        assert reader.execute(TITLE_SQL).fetchone()[0] == title
+        assert reader.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    finally:
+        reader.close()
+
+    assert _title(snap.path) == u'changed'
+    assert not os.path.exists(snap.path + '.tmp')
+
+
+def test_locked(tmpdir, source):
+    """Database locked by another process is copied."""
+    snap = _snapshot(tmpdir, source, ('backup',))
+    conn = _write(source, u'locked', exclusive=True)
+    try:
+        assert snap.update()
+        assert _title(snap.path) == u'locked'
+
+        # Changes being written can't be read
+        conn.execute('BEGIN')
+        conn.execute(UPDATE_SQL, (u'uncommitted',))
+        conn.execute('PRAGMA cache_size = 1')  # spill pages to the file
+        conn.execute('UPDATE itemDataValues SET value = value || "x"')
+        if not Signature.read(source).journal:  # pragma: no cover
+            pytest.skip('SQLite did not write to database file')
+        with pytest.raises(SnapshotError):
+            snap.update(force=True)
+        conn.execute('ROLLBACK')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
@@ -0,0 +1,108 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-30
+#
+
+"""Unit tests for startup.py and the startup budget of zh.py"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from zothero import startup
+from zothero.styles import read_info
+from zothero.tests.fixtures import make_styles, make_zotero_db
+
+ZH = os.path.join(os.path.dirname(__file__), '../../../zh.py')
+
+IMPORTTIME = u"""\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _json
+import time:       800 |        920 | json
+debug: not an import
+import time:        60 |         60 |     _sre
+import time:       300 |        360 |   re
+import time:      1000 |       1360 | zothero
+zh startup: main 0.025000
+"""
+
+
+def test_parse_importtime():
+    """Output of ``-X importtime`` is parsed."""
+    times = startup.parse_importtime(IMPORTTIME)
+    assert [t.name for t in times] == \
+        ['_json', 'json', '_sre', 're', 'zothero']
+    assert [t.depth for t in times] == [1, 0, 2, 1, 0]
+    assert times[1] == ('json', 0.0008, 0.00092, 0)
+    assert startup.import_total(times) == pytest.approx(0.00228)
+    assert startup.main_time(IMPORTTIME) == 0.025
+    assert startup.main_time(u'') is None
+
+
+def test_wanted():
+    """Profiling is enabled by option or environment variable."""
+    assert startup.wanted(['zh.py', 'search', '--profile-startup'], {})
+    assert startup.wanted(['zh.py'], {startup.PROFILE_ENV: '1'})
+    assert not startup.wanted(['zh.py', 'search'], {})
+    # Profiled process doesn't profile itself
+    assert not startup.wanted(['zh.py', '--profile-startup'],
+                              {startup.CHILD_ENV: '1'})
+
+
+@pytest.fixture(scope='module')
+def workflow_env(tmpdir_factory):
+    """Environment to run ``zh.py`` in with a synthetic library."""
+    root = tmpdir_factory.mktemp('workflow')
+    datadir = str(root.mkdir('zotero'))
+    make_zotero_db(os.path.join(datadir, 'zotero.sqlite'))
+    paths = make_styles(os.path.join(datadir, 'styles'), 20)
+
+    env = dict(os.environ)
+    # Test with bytecode cached, as it is when run by Alfred
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env.update(
+        alfred_workflow_bundleid='net.deanishe.alfred.zothero',
+        alfred_workflow_cache=str(root.mkdir('cache')),
+        alfred_workflow_data=str(root.mkdir('data')),
+        alfred_workflow_name='ZotHero',
+        alfred_workflow_version='0.0',
+        ZOTERO_DIR=datadir,
+        # Searches look up the user's style to show citations
+        CITE_STYLE=read_info(paths[0])['url'],
+    )
+    # The index is built and styles are read before the user searches
+    for cmd in ('reindex', 'update-styles'):
+        subprocess.check_call([sys.executable, ZH, cmd], env=env,
+                              stderr=subprocess.DEVNULL)
+    return env
+
+
+def _search_imports(env):
+    """Run ``zh.py search`` and return its `ImportTime` objects."""
+    cmd = [sys.executable, '-X', 'importtime', ZH, 'search', 'bayes']
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         env=env)
+    stdout, stderr = p.communicate()
+    assert p.returncode == 0, stderr
+    assert b'"items"' in stdout
+    return startup.parse_importtime(stderr.decode('utf-8'))
+
+
+def test_search_imports(workflow_env):
+    """``zh.py search`` doesn't import modules it doesn't need."""
+    names = {t.name for t in _search_imports(workflow_env)}
+    assert 'zothero.index' in names
+    assert 'zothero.styles' in names  # user's style is looked up
+    assert sorted(names.intersection(startup.SEARCH_FORBIDDEN)) == []
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
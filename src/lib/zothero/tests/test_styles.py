@@ -0,0 +1,270 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2018-01-07
+#
+
+"""Unit tests for styles.py"""
+
+from __future__ import print_function, absolute_import
+
+import os
+
+import pytest
+
+from zothero import styles as stylesmod
+from zothero.styles import (
+    Styles,
+    initials,
+    load_style,
+    load_styles,
+    read_info,
+    tokenise,
+)
+from zothero.tests.fixtures import make_styles
+
+STYLE = u"""<?xml version="1.0" encoding="utf-8"?>
+<style xmlns="http://purl.org/net/xbiblio/csl" version="1.0"
+       default-locale="de-DE">
+  <info>
+    <title>Zeitschrift für Ökonomie</title>
+    <title-short>ZfÖ</title-short>
+    <id>http://www.zotero.org/styles/zfo</id>
+    <link href="http://www.zotero.org/styles/apa" rel="independent-parent"/>
+    <category citation-format="author-date"/>
+    <category field="economics"/>
+    <updated>2017-06-01T12:00:00+00:00</updated>
+  </info>
+  <macro name="broken">
+"""
+
+NAMES = (
+    u'Journal of Applied Physics',
+    u'Applied Linguistics',
+    u'American Psychological Association 6th edition',
+    u'Zeitschrift für Ökonomie',
+)
+
+
+def _write_style(dirpath, name, title):
+    """Write a style called ``title`` to ``dirpath/name.csl``."""
+    xml = (u'<style xmlns="http://purl.org/net/xbiblio/csl"><info>'
+           u'<title>{}</title>'
+           u'<link href="http://www.zotero.org/styles/{}" rel="self"/>'
+           u'</info></style>').format(title, name)
+    path = os.path.join(dirpath, name + '.csl')
+    with open(path, 'wb') as fp:
+        fp.write(xml.encode('utf-8'))
+    return path
+
+
+@pytest.fixture
+def stylesdir(tmpdir):
+    """Directory containing synthetic styles."""
+    path = str(tmpdir.join('styles'))
+    make_styles(path, 20)
+    return path
+
+
+def _load(stylesdir, cachedir):
+    """`Styles` updated from ``stylesdir``."""
+    styles = Styles(stylesdir, cachedir)
+    styles.update()
+    return styles
+
+
+def test_load(stylesdir, tmpdir):
+    """Styles are loaded from disk."""
+    styles = Styles(stylesdir, str(tmpdir.join('cache')))
+    assert styles.empty
+    assert list(styles.all()) == []
+    styles.update()
+    assert not styles.empty
+    all_ = list(styles.all())
+    assert len(all_) == 20
+    for s in all_:
+        assert styles.get(s.key).path == s.path
+        assert not s.hidden
+        if s.parent_url:
+            assert styles.canonical(s.key).key == s.parent_url
+
+
+def test_read_info(tmpdir):
+    """Metadata are read from the header only."""
+    path = tmpdir.join('zfo.csl')
+    path.write_text(STYLE, encoding='utf-8')
+    assert read_info(str(path)) == dict(
+        name=u'Zeitschrift für Ökonomie',
+        id=u'http://www.zotero.org/styles/zfo',
+        parent_url=u'http://www.zotero.org/styles/apa',
+        citation_format=u'author-date',
+        updated=u'2017-06-01T12:00:00+00:00',
+        locale=u'de-DE',
+    )
+
+    style = load_style(str(path))
+    assert style.url == style.id  # no "self" link
+
+    path.write_text(u'<style><info>', encoding='utf-8')
+    assert load_style(str(path)) is None
+
+
+def test_load_styles(stylesdir, monkeypatch):
+    """Styles parsed in worker processes are the same."""
+    paths = sorted(os.path.join(stylesdir, fn) for fn in os.listdir(stylesdir))
+    paths.append(os.path.join(stylesdir, 'missing.csl'))
+    styles = load_styles(paths, 1)
+    assert len(styles) == 20
+    monkeypatch.setattr(stylesmod, 'MIN_PARALLEL', 1)
+    assert load_styles(paths, 2) == styles
+
+
+def test_tokenise():
+    """Names are split into words and initials."""
+    assert tokenise(u'Zeitschrift für Ökonomie (2nd ed.)') == [
+        u'zeitschrift', u'fur', u'okonomie', u'2nd', u'ed']
+    assert tokenise(u'  ') == []
+    assert initials(u'Journal of Applied Physics') == {u'joap', u'jap'}
+    assert initials(u'Zeitschrift für Ökonomie') == {u'zfo', u'zo'}
+    assert initials(u'') == set()
+
+
+def test_search(tmpdir):
+    """Styles are found by words and initials."""
+    dirpath = str(tmpdir.mkdir('styles'))
+    paths = [_write_style(dirpath, 's%d' % i, name)
+             for i, name in enumerate(NAMES)]
+    _write_style(str(tmpdir.mkdir('styles', 'hidden')), 'h', u'Applied Hidden')
+    styles = _load(dirpath, str(tmpdir.join('cache')))
+
+    def _search(query, **kwargs):
+        return [s.name for s in styles.search(query, **kwargs)]
+
+    assert _search(u'') == sorted(NAMES)
+    assert _search(u'', limit=1) == [u'American Psychological Association '
+                                     u'6th edition']
+    assert _search(u'app') == [u'Applied Linguistics',
+                               u'Journal of Applied Physics']
+    assert _search(u'app', hidden=True) == [u'Applied Hidden',
+                                            u'Applied Linguistics',
+                                            u'Journal of Applied Physics']
+    assert _search(u'jap') == [u'Journal of Applied Physics']
+    assert _search(u'J. Appl. Phys.') == [u'Journal of Applied Physics']
+    assert _search(u'apa') == [u'American Psychological Association '
+                               u'6th edition']
+    assert _search(u'ÖKON') == [u'Zeitschrift für Ökonomie']
+    assert _search(u'physics linguistics') == []
+
+    # The index is updated with the styles
+    os.unlink(paths[1])
+    _write_style(dirpath, 's0', u'Journal of Physics')
+    mtime = os.path.getmtime(paths[0]) + 10
+    os.utime(paths[0], (mtime, mtime))
+    styles.update()
+    assert _search(u'app') == []
+    assert _search(u'jop') == [u'Journal of Physics']
+
+
+def test_version(stylesdir, tmpdir, monkeypatch):
+    """Styles are re-read when the cache version changes."""
+    cachedir = str(tmpdir.join('cache'))
+    _load(stylesdir, cachedir)
+    monkeypatch.setattr(stylesmod, 'VERSION', stylesmod.VERSION + 1)
+    assert Styles(stylesdir, cachedir).empty
+
+
+def test_update(stylesdir, tmpdir):
+    """Changed and deleted styles are updated."""
+    cachedir = str(tmpdir.join('cache'))
+    styles = _load(stylesdir, cachedir)
+    paths = sorted(s.path for s in styles.all())
+
+    os.unlink(paths[0])
+    # rewrite style with a new title and mtime
+    with open(paths[1]) as fp:
+        xml = fp.read()
+    with open(paths[1], 'w') as fp:
+        fp.write(xml.replace('<title>', '<title>New '))
+    mtime = os.path.getmtime(paths[1]) + 10
+    os.utime(paths[1], (mtime, mtime))
+
+    styles = _load(stylesdir, cachedir)
+    all_ = {s.path: s for s in styles.all()}
+    assert sorted(all_) == paths[1:]
+    assert all_[paths[1]].name.startswith(u'New ')
+    assert sorted(k for k in styles._mtimes.keys()
+                  if k.endswith('.csl')) == paths[1:]
+
+
+def test_unchanged_files(stylesdir, tmpdir, monkeypatch):
+    """Only changed files are parsed."""
+    cachedir = str(tmpdir.join('cache'))
+    _load(stylesdir, cachedir)
+    parsed = []
+
+    def _load_styles(paths, workers=None):
+        parsed.extend(paths)
+        return load_styles(paths, workers)
+
+    monkeypatch.setattr(stylesmod, 'load_styles', _load_styles)
+    assert len(list(_load(stylesdir, cachedir).all())) == 20
+    assert parsed == []
+
+    make_styles(stylesdir, 1, seed=2, dependent=0)
+    assert len(list(_load(stylesdir, cachedir).all())) == 21
+    assert len(parsed) == 1
+
+
+def test_edited_in_place(stylesdir, tmpdir, monkeypatch):
+    """Styles edited without changing their directory are re-read."""
+    cachedir = str(tmpdir.join('cache'))
+    styles = _load(stylesdir, cachedir)
+    style = next(s for s in styles.all() if not s.parent_url)
+    dirmtime = os.path.getmtime(stylesdir)
+
+    with open(style.path) as fp:
+        xml = fp.read()
+    with open(style.path, 'w') as fp:
+        fp.write(xml.replace('<title>', '<title>Edited '))
+    mtime = os.path.getmtime(style.path) + 10
+    os.utime(style.path, (mtime, mtime))
+    os.utime(stylesdir, (dirmtime, dirmtime))
+
+    # Files are only checked every `CHECK_INTERVAL` seconds
+    assert not styles.stale
+    monkeypatch.setattr(stylesmod, 'CHECK_INTERVAL', -1)
+    assert styles.stale
+    styles.update()
+    assert styles.get(style.key).name.startswith(u'Edited ')
+
+
+def test_stale(stylesdir, tmpdir):
+    """Styles are stale if a directory has changed."""
+    cachedir = str(tmpdir.join('cache'))
+    styles = Styles(stylesdir, cachedir)
+    assert styles.stale
+    styles.update()
+    assert not styles.stale
+
+    hidden = os.path.join(stylesdir, 'hidden')
+    make_styles(hidden, 1, seed=2, dependent=0)
+    assert styles.stale
+    styles.update()
+    assert not styles.stale
+    assert len(list(styles.all(True))) == 21
+
+    # removing a directory removes its styles
+    for fn in os.listdir(hidden):
+        os.unlink(os.path.join(hidden, fn))
+    os.rmdir(hidden)
+    assert styles.stale
+    styles.update()
+    assert not styles.stale
+    assert len(list(styles.all(True))) == 20
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
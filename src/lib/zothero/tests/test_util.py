@@ -13,7 +13,8 @@ from __future__ import print_function, absolute_import
 
 import pytest
 
-from zothero.util import asciify, HTMLText, safename
+from zothero.notes import HTMLText
+from zothero.util import asciify, safename
 
 
 def test_strip_tags():
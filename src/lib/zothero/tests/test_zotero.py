@@ -0,0 +1,80 @@
+# encoding: utf-8
+#
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-15
+#
+
+"""Unit tests for zotero.py"""
+
+from __future__ import print_function, absolute_import
+
+from datetime import datetime
+
+import pytest
+
+from zothero import zotero
+
+
+def _dump(e):
+    """Comparable representation of an `Entry`."""
+    return e.json()
+
+
+def test_all_entries(zot):
+    """All top-level, non-deleted items are loaded."""
+    sql = """
+        SELECT COUNT(*) FROM items
+        WHERE itemTypeID NOT IN (1, 14)
+        AND itemID NOT IN (SELECT itemID FROM deletedItems)
+    """
+    n = zot.conn.execute(sql).fetchone()[0]
+    entries = list(zot.all_entries())
+    assert len(entries) == n
+    assert len({e.id for e in entries}) == n
+
+    for e in entries:
+        assert e.title
+        assert e.year
+        assert e.creators
+        assert [c.index for c in e.creators] == sorted(c.index
+                                                       for c in e.creators)
+        for note in e.notes:
+            assert '<' not in note
+        for a in e.attachments:
+            assert a.name == u'Full Text PDF'
+            assert a.path.startswith(zot.storage_dir)
+
+
+def test_batches_match_single_entries(zot, monkeypatch):
+    """Batched loading gives the same results as loading each entry."""
+    monkeypatch.setattr(zotero, 'BATCH_SIZE', 7)
+    entries = list(zot.all_entries())
+    assert len(entries) > 7
+
+    for e in entries:
+        assert _dump(zot.entry(e.key)) == _dump(e)
+
+
+def test_entry_missing(zot):
+    """Unknown keys return ``None``."""
+    assert zot.entry(u'NOTAKEY1') is None
+
+
+def test_modified_since(zot):
+    """Entries with modified attachments are returned once."""
+    row = zot.conn.execute(
+        'SELECT itemID, parentItemID FROM itemAttachments').fetchone()
+    att_id, parent_id = row
+    with zot.conn as c:
+        c.execute("UPDATE items SET dateModified = '2020-06-01 00:00:00' "
+                  "WHERE itemID IN (?, ?)", (att_id, parent_id))
+
+    entries = list(zot.modified_since(datetime(2020, 1, 1)))
+    assert [e.id for e in entries] == [parent_id]
+
+
+if __name__ == '__main__':  # pragma: no cover
+    pytest.main([__file__])
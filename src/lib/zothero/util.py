@@ -13,13 +13,11 @@ from __future__ import print_function, absolute_import
 
 from contextlib import contextmanager
 from datetime import date, datetime
-#from HTMLParser import HTMLParser
-from html.parser import HTMLParser
+from itertools import islice
 import logging
 import os
-from os.path import getmtime
 import re
-from shutil import copyfile
+import sys
 import time
 from unicodedata import normalize
 
@@ -64,65 +62,11 @@ def sqlite2dt(s):
     return datetime.strptime(s, SQLITE_DATE_FMT)
 
 
-class HTMLText(HTMLParser):
-    """Extract text from HTML.
-
-    Strips all tags from HTML.
-
-    Attributes:
-        data (list): Accumlated text content.
-
-    """
-
-    @classmethod
-    def strip(cls, html):
-        """Extract text from HTML.
-
-        Args:
-            html (unicode): HTML to process.
-            decode (bool, optional): Decode from UTF-8 to Unicode.
-
-        Returns:
-            unicode: Text content of HTML.
-
-        """
-        p = cls()
-        p.feed(html)
-        #log.debug ("=====================")
-        #log.debug (html)
-        return str(p)
-        #return unicode(p)
-
-    def __init__(self):
-        """Create new HTMLText."""
-        super().__init__()
-        self.reset()
-        self.data = []
-
-    def handle_data(self, s):
-        """Callback for contents of HTML tags.
-
-        Args:
-            s (unicode): Text from between HTML tags.
-        """
-        self.data.append(unicodify(s))
-
-    # def __str__(self):
-    #     """Return text UTF-8 encoded."""
-    #     if isinstance(self, str):
-    #          return self
-        #return str(self)
-        #return str(self).encode('utf-8', 'replace')
-        #return unicode(self).encode('utf-8', 'replace')
-
-    def __unicode__(self):
-        """Return text as Unicode."""
-        return u''.join(self.data)
-
-
 def strip_tags(html):
     """Strip tags from HTML.
 
+    See `zothero.notes.strip_tags()`.
+
     Args:
         html (unicode): HTML text.
 
@@ -130,29 +74,8 @@ def strip_tags(html):
         unicode: Text contained in HTML.
 
     """
-    return HTMLText.strip(html)
-
-
-def copyifnewer(source, copy):
-    """Replace path `copy` with a copy of file at `source`.
-
-    Returns path to `copy`, overwriting it first with a copy of
-    `source` if `source` is newer or if `copy` doesn't exist.
-
-    Args:
-        source (str): Path to original file
-        copy (str): Path to copy
-
-    Returns:
-        str: Path to copy
-
-    """
-    if not os.path.exists(copy) or getmtime(source) > getmtime(copy):
-        log.debug('[util] copying %r to %r ...',
-                  shortpath(source), shortpath(copy))
-        copyfile(source, copy)
-
-    return copy
+    from .notes import strip_tags
+    return strip_tags(html)
 
 
 def unicodify(s, encoding='utf-8'):
@@ -275,13 +198,54 @@ def shortpath(p):
     return p.replace(h, '~')
 
 
+def batched(iterable, size):
+    """Split ``iterable`` into lists of (at most) ``size`` items.
+
+    Args:
+        iterable (iterable): Items to split into batches.
+        size (int): Maximum length of each batch.
+
+    Yields:
+        list: Next batch of items.
+
+    """
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+
+        yield batch
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes.
+
+    Returns:
+        int: Peak memory usage or 0 if it can't be determined.
+
+    """
+    try:
+        import resource
+    except ImportError:  # pragma: no cover
+        return 0
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    if sys.platform != 'darwin':
+        rss *= 1024
+
+    return rss
+
+
 @contextmanager
 def timed(name=None):
-    """Context manager that logs execution time."""
+    """Context manager that logs execution time and peak memory usage."""
     name = name or ''
     start_time = time.time()
     yield
-    log.info('[%0.2fs] %s', time.time() - start_time, name)
+    log.info('[%0.2fs] [%0.1fMB] %s', time.time() - start_time,
+             peak_rss() / 1048576.0, name)
 
 
 def time_since(ts):
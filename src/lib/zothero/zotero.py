@@ -9,9 +9,8 @@
 
 """Interface to the Zotero database.
 
-All data classes are based on ``AttrDict``, which means their data
-can be accesses either as ``dict`` values or as attributes, i.e.
-``Entry.title`` and ``Entry['title']`` are equivalent.
+The data classes are defined in `models`. They are based on
+`models.Model`, which keeps their data in ``__slots__``.
 
 The `Zotero` class is a fairly-thin wrapper around the SQLite database
 stored by Zotero. It abstracts away the implementation details of the
@@ -32,6 +31,7 @@ from .models import (
 )
 
 from .util import (
+    batched,
     dt2sqlite,
     parse_date,
     shortpath,
@@ -62,34 +62,42 @@ WHERE items.itemTypeID not IN (1, 14)
 AND deletedItems.dateDeleted IS NULL
 """
 
-# Retrieve creators for a given item
+# The following queries retrieve data for a batch of items at once.
+# ``{ids}`` is replaced with a list of placeholders for the item IDs,
+# and each row contains the ID of the item it belongs to.
+
+# Retrieve creators for given items
 CREATORS_SQL = u"""
-SELECT  creators.firstName AS given,
+SELECT  itemCreators.itemID AS id,
+        creators.firstName AS given,
         creators.lastName AS family,
         itemCreators.orderIndex AS `index`,
         creatorTypes.creatorType AS `type`
-    FROM creators
-    LEFT JOIN itemCreators
-        ON creators.creatorID = itemCreators.creatorID
+    FROM itemCreators
+    LEFT JOIN creators
+        ON itemCreators.creatorID = creators.creatorID
     LEFT JOIN creatorTypes
         ON itemCreators.creatorTypeID = creatorTypes.creatorTypeID
-WHERE itemCreators.itemID = ?
-ORDER BY `index` ASC
+WHERE itemCreators.itemID IN ({ids})
+ORDER BY id ASC, `index` ASC
 """
 
-# Retrieve collections for a given item
+# Retrieve collections for given items
 COLLECTIONS_SQL = u"""
-SELECT  collections.collectionName AS name,
+SELECT  collectionItems.itemID AS id,
+        collections.collectionName AS name,
         collections.key AS key
-    FROM collections
-    LEFT JOIN collectionItems
-        ON collections.collectionID = collectionItems.collectionID
-WHERE collectionItems.itemID = ?
+    FROM collectionItems
+    LEFT JOIN collections
+        ON collectionItems.collectionID = collections.collectionID
+WHERE collectionItems.itemID IN ({ids})
+ORDER BY id ASC, collectionItems.collectionID ASC
 """
 
-# Retrieve attachments for a given item
+# Retrieve attachments for given items
 ATTACHMENTS_SQL = u"""
 SELECT
+    itemAttachments.parentItemID AS id,
     items.key AS key,
     itemAttachments.path AS path,
     (SELECT  itemDataValues.value
@@ -111,77 +119,164 @@ SELECT
 FROM itemAttachments
     LEFT JOIN items
         ON itemAttachments.itemID = items.itemID
-WHERE itemAttachments.parentItemID = ?
+WHERE itemAttachments.parentItemID IN ({ids})
+ORDER BY id ASC, itemAttachments.itemID ASC
 """
 
 # Retrieve IDs of items whose attachments have been modified
 MODIFIED_ATTACHMENTS_SQL = u"""
-SELECT  (SELECT items.key
-            FROM items
-            WHERE items.itemID = itemAttachments.parentItemID)
-        key
+SELECT itemAttachments.parentItemID
     FROM itemAttachments
     LEFT JOIN items
         ON itemAttachments.itemID = items.itemID
 WHERE itemAttachments.parentItemID IS NOT NULL
 AND items.dateModified > ?
-GROUP BY itemAttachments.parentItemID
 """
 
-# Retrieve all data for given item
+# High-water marks of the change log: the highest sync version
+# and the latest local modification of any item (incl. notes and
+# attachments). Every edit in Zotero increases one of them.
+SYNC_STATE_SQL = u"""
+SELECT MAX(version) AS version, MAX(clientDateModified) AS modified
+FROM items
+"""
+
+# Retrieve IDs of items that changed after the high-water marks
+# `:version` and `:modified`, with notes and attachments replaced by
+# their parent items.
+CHANGED_SQL = u"""
+SELECT IFNULL(itemNotes.parentItemID,
+              IFNULL(itemAttachments.parentItemID, items.itemID)) AS id
+    FROM items
+    LEFT JOIN itemNotes
+        ON items.itemID = itemNotes.itemID
+    LEFT JOIN itemAttachments
+        ON items.itemID = itemAttachments.itemID
+WHERE items.version > :version
+OR items.clientDateModified > :modified
+"""
+
+# Fingerprints of the notes, attachments, tags and collections of
+# each item. Removing a child row doesn't change the high-water marks,
+# but it does change the fingerprint of its parent. The sum of the
+# squares of the IDs makes it unlikely two different sets of children
+# have the same fingerprint. Renaming a collection changes its
+# modification time; renaming a tag modifies the items it's
+# attached to.
+FINGERPRINT_SQL = {
+    'notes': u"""
+        SELECT parentItemID AS id,
+               COUNT(*) || ':' || SUM(itemID) || ':' ||
+               SUM(itemID * itemID) AS value
+            FROM itemNotes
+        WHERE parentItemID IS NOT NULL
+        GROUP BY parentItemID
+    """,
+    'attachments': u"""
+        SELECT parentItemID AS id,
+               COUNT(*) || ':' || SUM(itemID) || ':' ||
+               SUM(itemID * itemID) AS value
+            FROM itemAttachments
+        WHERE parentItemID IS NOT NULL
+        GROUP BY parentItemID
+    """,
+    'tags': u"""
+        SELECT itemID AS id,
+               COUNT(*) || ':' || SUM(tagID) || ':' ||
+               SUM(tagID * tagID) || ':' || SUM(type) AS value
+            FROM itemTags
+        GROUP BY itemID
+    """,
+    'collections': u"""
+        SELECT collectionItems.itemID AS id,
+               COUNT(*) || ':' || SUM(collections.collectionID) || ':' ||
+               SUM(collections.collectionID * collections.collectionID) ||
+               ':' || MAX(collections.clientDateModified) AS value
+            FROM collectionItems
+            LEFT JOIN collections
+                ON collectionItems.collectionID = collections.collectionID
+        GROUP BY collectionItems.itemID
+    """,
+}
+
+# Retrieve all data for given items
 METADATA_SQL = u"""
-SELECT  fields.fieldName AS name,
+SELECT  itemData.itemID AS id,
+        fields.fieldName AS name,
         itemDataValues.value AS value
     FROM itemData
     LEFT JOIN fields
         ON itemData.fieldID = fields.fieldID
     LEFT JOIN itemDataValues
         ON itemData.valueID = itemDataValues.valueID
-WHERE itemData.itemID = ?
+WHERE itemData.itemID IN ({ids})
 """
 
-# Retrieve notes for given item
+# Retrieve notes for given items
 NOTES_SQL = u"""
-SELECT itemNotes.note AS note
+SELECT  itemNotes.parentItemID AS id,
+        itemNotes.note AS note
     FROM itemNotes
     LEFT JOIN items
         ON itemNotes.itemID = items.itemID
-WHERE itemNotes.parentItemID = ?
+WHERE itemNotes.parentItemID IN ({ids})
+ORDER BY id ASC, itemNotes.itemID ASC
 """
 
-# Retrieve tags for given item
+# Retrieve tags for given items
 TAGS_SQL = u"""
-SELECT tags.name AS name
-    FROM tags
-    LEFT JOIN itemTags
-        ON tags.tagID = itemTags.tagID
-WHERE itemTags.itemID = ?
+SELECT  itemTags.itemID AS id,
+        tags.name AS name
+    FROM itemTags
+    LEFT JOIN tags
+        ON itemTags.tagID = tags.tagID
+WHERE itemTags.itemID IN ({ids})
+ORDER BY id ASC, itemTags.tagID ASC
 """
 
+# Number of items whose data are retrieved with each set of the above
+# queries. Must be less than SQLite's limit of 999 SQL variables.
+BATCH_SIZE = 500
+
 
 class Zotero(object):
     """Interface to the Zotero database."""
 
-    def __init__(self, datadir, dbpath=None, attachments_base_dir=None):
+    def __init__(self, datadir, dbpath=None, attachments_base_dir=None,
+                 readonly=False, notes_cache=None):
         """Load Zotero data from ``datadir``.
 
         Args:
             datadir (str): Path to Zotero's data directory.
             dbpath (str, optional): Path to `zotero.sqlite` if not in
                 ``datadir``.
+            attachments_base_dir (str, optional): Zotero's "Linked
+                Attachment Base Directory".
+            readonly (bool, optional): Open the database read-only.
+            notes_cache (str, optional): Path to cache of the text of
+                notes. See `notes.NoteCache`.
 
         """
         self.datadir = datadir
         self._attachments_dir = attachments_base_dir
         self.dbpath = dbpath or os.path.join(datadir, 'zotero.sqlite')
+        self.readonly = readonly
+        self.notes_cache = notes_cache
         self._conn = None
+        self._notes = None  # NoteCache
         self._bbt = None  # BetterBibTex
 
     @property
     def conn(self):
         """Return connection to the database."""
         if not self._conn:
-            self._conn = sqlite3.connect(self.dbpath)
+            if self.readonly:
+                from urllib.parse import quote
+                uri = 'file:{}?mode=ro'.format(
+                    quote(os.path.abspath(self.dbpath)))
+                self._conn = sqlite3.connect(uri, uri=True)
+            else:
+                self._conn = sqlite3.connect(self.dbpath)
             self._conn.row_factory = sqlite3.Row
             log.debug('[zotero] opened database %r', shortpath(self.dbpath))
 
@@ -247,46 +342,165 @@ class Zotero(object):
         if not row:
             return None
 
-        return self._load_entry(row)
+        return self._load_entries([row])[0]
 
     def modified_since(self, dt):
-        """Iterate Entries modified since datetime."""
-        sql = ITEMS_SQL + 'AND modified > ?'
-        ts = dt2sqlite(dt)
-        for row in self.conn.execute(sql, (ts,)):
-            yield self._load_entry(row)
+        """Iterate Entries modified since datetime.
 
-        # Items whose attachments have changed
-        sql = MODIFIED_ATTACHMENTS_SQL
-        for row in self.conn.execute(sql, (ts,)):
-            log.debug('[zotero] attachment(s) modified')
-            yield self.entry(row['key'])
+        Includes entries whose attachments have been modified.
+        """
+        sql = ITEMS_SQL + 'AND (modified > ? OR items.itemID IN ({}))'.format(
+            MODIFIED_ATTACHMENTS_SQL)
+        ts = dt2sqlite(dt)
+        return self._iter_entries(self.conn.execute(sql, (ts, ts)))
 
     def all_entries(self):
         """Return all database entries."""
-        for row in self.conn.execute(ITEMS_SQL):
-            yield self._load_entry(row)
-
-    def _load_entry(self, row):
-        """Create an `Entry` from a SQLite database row."""
-        e = Entry(**row)
-        # Defaults & empty attributes
-        for k in ('collections', 'creators', 'attachments',
-                  'notes', 'tags'):
-            e[k] = []
-        # Metadata
-        e.title = u''
-        e.date = None
-        e.year = 0
-        e.abstract = u''
-        e.zdata = {}
-
-        # Parseable attributes
-        e.modified = sqlite2dt(e.modified)
+        return self._iter_entries(self.conn.execute(ITEMS_SQL))
+
+    def entries(self, ids):
+        """Iterate Entries for item IDs.
+
+        IDs of notes, attachments, deleted and unknown items are
+        ignored.
+
+        Args:
+            ids (iterable): Item IDs.
+
+        Yields:
+            Entry: Entry for each item.
+
+        """
+        sql = ITEMS_SQL + 'AND items.itemID IN ({ids})'
+        for batch in batched(ids, BATCH_SIZE):
+            rows = self._select(sql, batch).fetchall()
+            for e in self._load_entries(rows):
+                yield e
+
+    def entries_between(self, start, end=None):
+        """Iterate Entries whose IDs are in a range.
+
+        Args:
+            start (int): Lowest item ID.
+            end (int, optional): Item ID to stop before. If ``None``,
+                the range has no end.
+
+        Yields:
+            Entry: Entry for each item in the range.
+
+        """
+        if end is None:
+            sql = ITEMS_SQL + 'AND items.itemID >= ?'
+            params = (start,)
+        else:
+            sql = ITEMS_SQL + 'AND items.itemID >= ? AND items.itemID < ?'
+            params = (start, end)
+
+        return self._iter_entries(self.conn.execute(sql, params))
+
+    def id_ranges(self, size):
+        """Split item IDs into ranges of ``size`` items.
+
+        Ranges are counted over all items, including notes,
+        attachments and deleted items, so they may contain fewer than
+        ``size`` entries.
+
+        Args:
+            size (int): Number of items in each range.
+
+        Returns:
+            list: ``(start, end)`` tuples for `entries_between()`.
+                The ``end`` of the last range is ``None``.
+
+        """
+        sql = u"""
+            SELECT itemID FROM items WHERE itemID >= ?
+            ORDER BY itemID LIMIT 1 OFFSET ?
+        """
+        starts = []
+        row = self.conn.execute(sql, (0, 0)).fetchone()
+        while row:
+            starts.append(row[0])
+            row = self.conn.execute(sql, (row[0], size)).fetchone()
+
+        return list(zip(starts, starts[1:] + [None]))
+
+    def sync_state(self):
+        """High-water marks of the change log.
+
+        Returns:
+            tuple: Highest item ``version`` and latest
+                ``clientDateModified``, or ``(0, '')`` if there are
+                no items.
+
+        """
+        row = self.conn.execute(SYNC_STATE_SQL).fetchone()
+        return row['version'] or 0, row['modified'] or u''
+
+    def changed_since(self, version, modified):
+        """Iterate IDs of items changed since a `sync_state()`.
+
+        Changed notes and attachments are reported as their parents.
+        IDs may be repeated.
+
+        Args:
+            version (int): Highest item version previously seen.
+            modified (str): Latest modification time previously seen.
+
+        Yields:
+            int: ID of changed item.
+
+        """
+        params = {'version': version, 'modified': modified}
+        for row in self.conn.execute(CHANGED_SQL, params):
+            yield row['id']
+
+    def _iter_entries(self, rows):
+        """Generate `Entry` objects from SQLite database rows.
+
+        Entries are loaded `BATCH_SIZE` at a time by `_load_entries()`.
+
+        Args:
+            rows (iterable): `ITEMS_SQL` result rows.
+
+        Yields:
+            Entry: Entry for each row.
+
+        """
+        for batch in batched(rows, BATCH_SIZE):
+            for e in self._load_entries(batch):
+                yield e
+
+    def _select(self, sql, ids):
+        """Execute bulk query ``sql`` for item IDs ``ids``."""
+        sql = sql.format(ids=u', '.join(u'?' * len(ids)))
+        return self.conn.execute(sql, ids)
+
+    def _load_entries(self, rows):
+        """Create `Entry` objects from SQLite database rows.
+
+        Each of the related tables is queried once for all the items,
+        and the results are grouped by item ID.
+
+        Args:
+            rows (list): `ITEMS_SQL` result rows.
+
+        Returns:
+            list: `Entry` for each row in ``rows``.
+
+        """
+        entries = {}
+        for row in rows:
+            e = Entry(id=row['id'], key=row['key'], library=row['library'],
+                      type=row['type'], modified=sqlite2dt(row['modified']))
+            entries[e.id] = e
+
+        ids = list(entries)
 
         # --------------------------------------------------
         # Other data
-        for row in self.conn.execute(METADATA_SQL, (e.id,)):
+        for row in self._select(METADATA_SQL, ids):
+            e = entries[row['id']]
             k, v = row['name'], row['value']
 
             # everything goes in the `zdata` dict
@@ -310,62 +524,78 @@ class Zotero(object):
 
         # --------------------------------------------------
         # Data from other tables
-        e.attachments = self._entry_attachments(e.id)
-        e.collections = self._entry_collections(e.id)
-        e.creators = self._entry_creators(e.id)
-        e.notes = self._entry_notes(e.id)
-        e.tags = self._entry_tags(e.id)
-
-        # Better Bibtex citekey
-        e.citekey = self.bbt.citekey('{}_{}'.format(e.library, e.key))
-
-        return e
-
-    def _entry_attachments(self, entry_id):
-        """Fetch attachments for an entry."""
-        attachments = []
-        for row in self.conn.execute(ATTACHMENTS_SQL, (entry_id,)):
-            key, path, title, url = (row['key'], row['path'],
-                                     row['title'], row['url'])
-
-            # Attachment may be in Zotero's storage somewhere, so
-            # fix path to point to the right place.
-            if path and not os.path.exists(path):
-                if path.startswith('storage:'):
-                    path = path[8:]
-                    path = os.path.join(self.storage_dir, key, path)
-
-                elif path.startswith('attachments:'):
-                    path = path[12:]
-                    try:
-                        path = os.path.join(self.attachments_dir, path)
-                    except ValueError as err:
-                        log.warning(u"[zotero] can't access attachment "
-                                    '"%s": %s', path, err)
-                        continue
-
-            a = Attachment(key=key, name=title, path=path, url=url)
-            log.debug('[zotero] attachment=%r', a)
-            attachments.append(a)
-
-        return attachments
-
-    def _entry_collections(self, entry_id):
-        """Fetch collections for an entry."""
-        rows = self.conn.execute(COLLECTIONS_SQL, (entry_id,))
-        return [Collection(**row) for row in rows]
-
-    def _entry_creators(self, entry_id):
-        """Fetch creators for an entry."""
-        rows = self.conn.execute(CREATORS_SQL, (entry_id,))
-        return [Creator(**row) for row in rows]
-
-    def _entry_notes(self, entry_id):
-        """Fetch notes for an entry."""
-        rows = self.conn.execute(NOTES_SQL, (entry_id,))
-        return [strip_tags(row['note']) for row in rows]
-
-    def _entry_tags(self, entry_id):
-        """Fetch tags for an entry."""
-        rows = self.conn.execute(TAGS_SQL, (entry_id,))
-        return [row['name'] for row in rows]
+        for row in self._select(ATTACHMENTS_SQL, ids):
+            a = self._attachment(row)
+            if a:
+                entries[row['id']].attachments.append(a)
+
+        for row in self._select(COLLECTIONS_SQL, ids):
+            c = Collection(name=row['name'], key=row['key'])
+            entries[row['id']].collections.append(c)
+
+        for row in self._select(CREATORS_SQL, ids):
+            c = Creator(given=row['given'], family=row['family'],
+                        index=row['index'], type=row['type'])
+            entries[row['id']].creators.append(c)
+
+        rows = self._select(NOTES_SQL, ids).fetchall()
+        for row, text in zip(rows, self._note_texts(rows)):
+            entries[row['id']].notes.append(text)
+
+        for row in self._select(TAGS_SQL, ids):
+            entries[row['id']].tags.append(row['name'])
+
+        for e in entries.values():
+            # Better Bibtex citekey
+            e.citekey = self.bbt.citekey('{}_{}'.format(e.library, e.key))
+
+        return list(entries.values())
+
+    def _note_texts(self, rows):
+        """Text of notes.
+
+        Args:
+            rows (list): `NOTES_SQL` result rows.
+
+        Returns:
+            list: Text of the note in each row.
+
+        """
+        if not self.notes_cache:
+            return [strip_tags(row['note']) for row in rows]
+
+        if not self._notes:
+            from .notes import NoteCache
+            self._notes = NoteCache(self.notes_cache)
+
+        return self._notes.texts([row['note'] for row in rows])
+
+    def _attachment(self, row):
+        """Create an `Attachment` from a SQLite database row.
+
+        Returns:
+            Attachment: Attachment or ``None`` if it can't be accessed.
+
+        """
+        key, path, title, url = (row['key'], row['path'],
+                                 row['title'], row['url'])
+
+        # Attachment may be in Zotero's storage somewhere, so
+        # fix path to point to the right place.
+        if path and not os.path.exists(path):
+            if path.startswith('storage:'):
+                path = path[8:]
+                path = os.path.join(self.storage_dir, key, path)
+
+            elif path.startswith('attachments:'):
+                path = path[12:]
+                try:
+                    path = os.path.join(self.attachments_dir, path)
+                except ValueError as err:
+                    log.warning(u"[zotero] can't access attachment "
+                                '"%s": %s', path, err)
+                    return None
+
+        a = Attachment(key=key, name=title, path=path, url=url)
+        log.debug('[zotero] attachment=%r', a)
+        return a
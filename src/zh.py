@@ -18,13 +18,15 @@ Usage:
     zh config [<query>]
     zh copy [--bibliography] [--paste] <style> <id>
     zh copy [--paste] <citekey>
+    zh daemon
     zh fields [<query>]
     zh locale [<query>]
     zh notify [--title <msg>] [--text <msg>]
-    zh reindex
+    zh reindex [--full] [--workers=<n>]
     zh search <query>
     zh style [--style <key>] [<query>]
     zh setvar <key> <value>
+    zh update-styles
     zh --help
 
 Options:
@@ -33,20 +35,35 @@ Options:
     --title=<msg>                 Notification title.
     --text=<msg>                  Notification text.
     --paste                       Paste citation after copying it.
+    --full                        Re-index all entries.
+    -w <n>, --workers=<n>         Processes to re-index all entries with.
     -h, --help                    Show this message and exit.
 
+Add the --profile-startup option to any command (or set the
+environment variable ZH_PROFILE_STARTUP=1) to print a report of
+import times to STDERR.
+
 """
 
 # from __future__ import print_function, absolute_import
 
+from contextlib import redirect_stdout
+import io
 import os
 from operator import attrgetter
 import sys
 import json
+import time
 
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lib'))
 
+# Profile startup before importing anything else
+if __name__ == '__main__':
+    from zothero import startup
+    if startup.wanted():
+        sys.exit(startup.profile(__file__, sys.argv[1:]))
+
 from docopt import docopt
 from workflow import Workflow3, ICON_WARNING, ICON_WEB
 from workflow.background import is_running, run_in_background
@@ -55,15 +72,39 @@ from workflow.background import is_running, run_in_background
 log = None
 
 # User's preferred citation style
-CITE_STYLE = os.getenv('CITE_STYLE')
+CITE_STYLE = None
 # User's preferred locale for citations
-LOCALE = os.getenv('LOCALE')
-COPY_CITEKEY_MOD = os.getenv('COPY_CITEKEY_MOD')
+LOCALE = None
+COPY_CITEKEY_MOD = None
 
+# Set if workflow was run via Snippet Trigger
+AUTOPASTE = None
 
+# Number of processes to re-index all entries with
+REINDEX_WORKERS = None
 
-# Set if workflow was run via Snippet Trigger
-AUTOPASTE = os.getenv('autopaste')
+
+def load_settings():
+    """Read user settings from environment variables.
+
+    Called on import, and by `zh daemon` for each request.
+    """
+    global CITE_STYLE, LOCALE, COPY_CITEKEY_MOD, AUTOPASTE, REINDEX_WORKERS
+    CITE_STYLE = os.getenv('CITE_STYLE')
+    LOCALE = os.getenv('LOCALE')
+    COPY_CITEKEY_MOD = os.getenv('COPY_CITEKEY_MOD')
+    AUTOPASTE = os.getenv('autopaste')
+    REINDEX_WORKERS = int(os.getenv('REINDEX_WORKERS') or 0) or None
+
+
+load_settings()
+
+# Seconds `zh daemon` waits for a query before exiting
+DAEMON_TIMEOUT = float(os.getenv('DAEMON_TIMEOUT') or 600)
+
+# `ZotHero` instances keyed by (cachedir, datadir, attachdir). Only
+# `zh daemon` uses them more than once.
+_apps = {}
 
 # GitHub repo to check for updates
 UPDATE_SETTINGS = {
@@ -110,16 +151,7 @@ def do_fields(query):
 def do_search(query):
     """Search the Zotero database."""
     from zothero import app
-    from zothero.formatting import EntryFormatter
-    from zothero.icons import entry_icon
-    from zothero.index import COLUMNS
-
-
-    
-    style = None
-    if CITE_STYLE:
-        style = app.styles.get(CITE_STYLE)
-        log.debug(u'Citation style: %s', style.name)
+    from zothero.results import normalise
 
     # Add AUTOPASTE to workflow's variables, as Alfred's default
     # behaviour is to drop all other variables on the floor if
@@ -140,12 +172,62 @@ def do_search(query):
     if running:  # Tell Alfred to re-run the workflow
         wf.rerun = 0.2
 
-    # Get entries matching query
-    entries = app.search(query)
+    # A new Alfred session: remove data of previous ones
+    if not os.getenv('_WF_SESSION_ID'):
+        wf.clear_session_cache()
+
+    # ------------------------------------------------------------------
+    # Items only change with the index and the settings they use, so
+    # Alfred's repeated searches for the same query are cached
+    generation = app.index.generation
+    key = u'\n'.join([normalise(query), CITE_STYLE or u'',
+                      AUTOPASTE or u'', COPY_CITEKEY_MOD or u''])
+    items = app.results.fetch(u'items', key, generation,
+                              lambda: search_items(query, generation))
+    send_items(items)
+
+
+def search_items(query, generation):
+    """Alfred items for the results of searching for ``query``.
+
+    Args:
+        query (unicode): Query to search for.
+        generation (int): Generation of the search index.
+
+    Returns:
+        list: Alfred items (`dict` objects).
+
+    """
+    from zothero import app
+    from zothero.formatting import format_year
+    from zothero.icons import entry_icon
+    from zothero.index import COLUMNS, SEARCH_LIMIT, narrows
+
+    style = None
+    if CITE_STYLE:
+        style = app.styles.get(CITE_STYLE)
+        log.debug(u'Citation style: %s', style.name)
+
+    # Get entries matching query. While the user is typing a word,
+    # only the results of the previous query in this Alfred session
+    # are searched, unless there were too many to show them all.
+    within = None
+    last = wf.cached_data('search', max_age=0, session=True)
+    if last and last['generation'] == generation and last['complete'] \
+            and narrows(last['query'], query):
+        log.debug(u'narrowing %d result(s) for "%s"', len(last['ids']),
+                  last['query'])
+        within = last['ids']
+
+    hits = app.search(query, within)
+    wf.cache_data('search', dict(query=query, generation=generation,
+                                 ids=[h.id for h in hits],
+                                 complete=len(hits) < SEARCH_LIMIT),
+                  session=True)
 
     # ------------------------------------------------------------------
     # If no entries, show "Search XYZ" message or "no results" warning
-    if not entries:
+    if not hits:
         if app.index.empty:  # no results because there's no search index
             wf.add_item(
                 u'Initialising Search Index …',
@@ -164,19 +246,15 @@ def do_search(query):
 
     # ------------------------------------------------------------------
     # Create and send Alfred feedback
-    for i, e in enumerate(entries):
+    for i, e in enumerate(hits):
         #log.debug(u'%4d. %s', i + 1, e)
-        f = EntryFormatter(e)
-        sub = u'{} {}'.format(f.creators, f.year)
+        sub = u'{} {}'.format(e.creators, format_year(e.year))
         key = u'{}_{}'.format(e.library, e.key)
         url = u'zotero://select/items/' + key
         if e.attachments:
-            sub += u' Attachments: ' + str(len(e.attachments))
+            sub += u' Attachments: ' + str(e.attachments)
 
-        if e.notes:
-            large = u'\n\n'.join(e.notes)
-        else:
-            large = e.title or u'xxx'
+        large = e.notes or e.title or u'xxx'
 
         it = wf.add_item(e.title or u'xxx',
                          sub,
@@ -246,7 +324,27 @@ def do_search(query):
                 log.warning('COPY_CITEKEY_MOD should be one of '
                             '-, alt, cmd, ctrl, fn, shift, or empty')
 
-    wf.send_feedback()
+    return wf.obj['items']
+
+
+def send_items(items):
+    """Send Alfred feedback with ``items``.
+
+    Like `Workflow3.send_feedback()`, but ``items`` needn't have been
+    added with `Workflow3.add_item()`. `json.dumps()` is also much
+    faster than the `json.dump()` it uses.
+
+    Args:
+        items (list): Alfred items (`dict` objects).
+
+    """
+    o = wf.obj
+    o['items'] = items
+    if wf.debugging:
+        sys.stdout.write(json.dumps(o, indent=2, separators=(',', ': ')))
+    else:
+        sys.stdout.write(json.dumps(o))
+    sys.stdout.flush()
 
 
 def do_attachments(entry_id, query):
@@ -299,12 +397,8 @@ def do_citations(query, entry_id):
     if not e:
         raise ValueError('Unknown entry: ' + entry_id)
 
-    styles = app.styles.all()
-
-    # Filter styles
-    if query:
-        styles = wf.filter(query, styles, key=attrgetter('name'),
-                           min_score=30)
+    check_styles()
+    styles = app.styles.search(query)
 
     # Generate feedback
     action = 'Paste' if AUTOPASTE else 'Copy'
@@ -530,12 +624,8 @@ def do_style(query, style_key):
     """Choose a default style."""
     from zothero import app
 
-    styles = app.styles.all()
-
-    # Filter styles
-    if query:
-        styles = wf.filter(query, styles, key=attrgetter('name'),
-                           min_score=30)
+    check_styles()
+    styles = app.styles.search(query)
 
     for s in styles:
         icon = ICON_OFF
@@ -560,16 +650,41 @@ def do_style(query, style_key):
     wf.send_feedback()
 
 
+def filter_index(name, items_func, key):
+    """Return a `FilterIndex` of ``items_func()`` cached under ``name``.
+
+    The index is rebuilt when the workflow has been updated.
+
+    Args:
+        name (str): Name of the cache file.
+        items_func (callable): Function that returns the items.
+        key (callable): Function that returns the search key of an item.
+
+    Returns:
+        zothero.filtering.FilterIndex: Index of items.
+    """
+    from zothero.filtering import FilterIndex, VERSION
+
+    name = u'{}-filter'.format(name)
+    version = (VERSION, str(wf.version))
+    data = wf.cached_data(name, max_age=0)
+    if not data or data[0] != version:
+        data = (version, FilterIndex(items_func(), key))
+        wf.cache_data(name, data)
+
+    return data[1]
+
+
 def do_locale(query):
     """Choose a locale."""
     from cite import locales
 
-    locs = locales.all()
-
-    # Filter styles
+    index = filter_index('locales', locales.all, attrgetter('name'))
+    locs = index.items
     if query:
-        locs = wf.filter(query, locs, key=attrgetter('name'),
-                         min_score=30)
+        # Honour the user's setting, as `Workflow.filter()` does
+        fold = wf.settings.get('__workflow_diacritic_folding', True)
+        locs = index.search(query, min_score=30, fold_diacritics=fold)
 
     for l in locs:
         icon = ICON_OFF
@@ -600,7 +715,9 @@ def do_clear():
 
     def _deleteme(fn):
         x = os.path.splitext(fn)[1]
-        return x.lower() in ('.sqlite', '.csl')
+        # Include SQLite's journals and an unfinished re-index
+        return x.lower() in ('.sqlite', '.sqlite-wal', '.sqlite-shm',
+                             '.sqlite-journal', '.new', '.csl')
 
     wf.clear_cache(_deleteme)
 
@@ -610,27 +727,48 @@ def do_clear():
     ))
 
 
-def do_reindex():
+def check_styles():
+    """Re-read CSL styles in a background job if they have changed.
+
+    Alfred is told to re-run the workflow until the job has finished,
+    so new styles are shown.
+    """
+    from zothero import app
+
+    running = is_running('styles')
+    if not running and app.styles.stale:
+        run_in_background('styles', [__file__, 'update-styles'])
+        running = True
+
+    if running:
+        wf.rerun = 0.2
+
+
+def do_update_styles():
+    """Load new and changed CSL styles.
+
+    This command is called in a background job by `check_styles()`.
+    """
+    from zothero import app
+    app.styles.update()
+
+
+def do_reindex(full=False, workers=None):
     """Re-index search database.
 
     This command is called in a background job by `do_search()`.
+    Only entries that have changed are re-indexed (including those
+    whose notes, tags or collections have changed), unless ``full``
+    is ``True``.
+
+    Args:
+        full (bool, optional): Re-index all entries.
+        workers (int, optional): Number of processes to re-index all
+            entries with. Defaults to ``REINDEX_WORKERS``.
 
     """
     from zothero import app
-    # TODO: Decide whether to force a full update here.
-    #
-    # Only entries and attachments have a "modified" date.
-    # If any entries or attachments have changed, only they
-    # will be updated if force == False. Entries whose notes
-    # have changed are not picked up.
-    #
-    # Changed notes are only be picked up if *no* entries
-    # or attachments were changed (a full update is forced when
-    # the library notices that the database has changed,
-    # but there are no updated entries or attachments).
-    #
-    # Setting `force=True` reloads everything on every update.
-    app.update_index(force=False)
+    app.update_index(force=full, workers=workers)
 
 
 def do_setvar(key, value):
@@ -691,6 +829,53 @@ def do_citekey(citekey, paste=False):
     #     run_trigger('paste')
         
 
+def do_daemon():
+    """Answer queries from ``zhc.py`` until idle.
+
+    Requests are run by `handle_request()` in this process, reusing
+    the same `ZotHero` instance.
+
+    """
+    from zothero.daemon import Server, socket_path
+    server = Server(socket_path(wf.cachedir), handle_request,
+                    DAEMON_TIMEOUT, watch=[__file__])
+    if not server.serve_forever():
+        log.debug('[daemon] another daemon is running')
+
+
+def handle_request(argv, env):
+    """Run ``zh.py`` with arguments ``argv`` and environment ``env``.
+
+    Called by `zothero.daemon.Server` for each request.
+
+    Args:
+        argv (list): Command-line arguments (without program name).
+        env (dict): Environment variables of ``zhc.py``.
+
+    Returns:
+        unicode: Output of command.
+
+    """
+    global wf
+    os.environ.clear()
+    os.environ.update(env)
+    load_settings()
+    sys.argv = [__file__] + argv
+
+    wf = Workflow3(
+        update_settings=UPDATE_SETTINGS,
+        help_url=URL_ISSUES,
+    )
+    buf = io.StringIO()
+    with redirect_stdout(buf):
+        try:
+            wf.run(main)
+        except SystemExit:  # magic arguments exit after running
+            pass
+
+    return buf.getvalue()
+
+
 def main(wf):
     """Run workflow."""
     import zothero
@@ -716,7 +901,14 @@ def main(wf):
     if attachdir:
         attachdir = wf.decode(os.path.expanduser(attachdir))
 
-    app = zothero.ZotHero(wf.cachedir, datadir, attachdir)
+    key = (wf.cachedir, datadir, attachdir)
+    app = _apps.get(key)
+    if app:
+        app.refresh()
+    else:
+        app = _apps[key] = zothero.ZotHero(wf.cachedir, datadir, attachdir,
+                                           REINDEX_WORKERS)
+
     # Store app in `zothero` package where everything can access it.
     zothero.app = app
 
@@ -739,6 +931,9 @@ def main(wf):
         return do_copy(args['<style>'], entry_id, args['--bibliography'],
                        args['--paste'])
 
+    if args['daemon']:
+        return do_daemon()
+
     if args['fields']:
         return do_fields(query)
 
@@ -749,7 +944,8 @@ def main(wf):
         return do_notify(args['--title'], args['--text'])
 
     if args['reindex']:
-        return do_reindex()
+        workers = int(args['--workers']) if args['--workers'] else None
+        return do_reindex(args['--full'], workers)
 
     if args['search']:
         return do_search(query)
@@ -760,6 +956,9 @@ def main(wf):
     if args['setvar']:
         return do_setvar(args['<key>'], args['<value>'])
 
+    if args['update-styles']:
+        return do_update_styles()
+
     raise ValueError('Unknown command')
 
 
@@ -769,4 +968,6 @@ if __name__ == '__main__':
         help_url=URL_ISSUES,
     )
     log = wf.logger
+    start = time.time()
     wf.run(main)
+    startup.report_main(time.time() - start)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2017 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2017-12-29
+#
+
+"""zhc <command> [<args>...]
+
+Thin client for ``zh.py daemon``.
+
+Forwards ``search``, ``attachments`` and ``citations`` queries to the
+daemon and prints its output. If the daemon isn't running, it's
+started in the background and this query is answered by running
+``zh.py`` in this process. Other commands, and all commands unless
+the ``USE_DAEMON`` workflow variable is set, go straight to ``zh.py``.
+
+Deliberately imports as little as possible: the point is to start
+faster than ``zh.py``.
+"""
+
+import os
+import sys
+import zlib
+
+# The C module imports much faster than `socket`
+import _socket
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ZH = os.path.join(HERE, 'zh.py')
+
+# Commands answered by the daemon
+COMMANDS = ('search', 'attachments', 'citations')
+
+# Seconds to wait for the daemon to answer
+TIMEOUT = 10.0
+
+
+def socket_path(cachedir):
+    """Path of the daemon's socket. Copy of `zothero.daemon.socket_path`."""
+    tmpdir = os.getenv('TMPDIR') or '/tmp'
+    name = 'zothero-{:08x}.sock'.format(zlib.crc32(cachedir.encode('utf-8')))
+    return os.path.join(tmpdir, name)
+
+
+def request(path, argv):
+    """Send ``argv`` to daemon listening on ``path``.
+
+    Returns:
+        bytes: Output of command or ``None`` if it failed.
+
+    Raises:
+        OSError: Raised if daemon isn't running.
+
+    """
+    fields = [str(len(argv))] + argv
+    fields += ['{}={}'.format(k, v) for k, v in os.environ.items()]
+
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    sock.settimeout(TIMEOUT)
+    try:
+        sock.connect(path)
+        sock.sendall(u'\0'.join(fields).encode('utf-8', 'surrogateescape'))
+        sock.shutdown(_socket.SHUT_WR)
+
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        sock.close()
+
+    status, _, output = b''.join(chunks).partition(b'\n')
+    if status != b'0':
+        return None
+
+    return output
+
+
+def start_daemon():
+    """Start ``zh.py daemon`` in the background."""
+    import subprocess
+    subprocess.Popen([sys.executable, ZH, 'daemon'], cwd=HERE,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def run_zh(argv):
+    """Run ``zh.py`` with arguments ``argv`` in this process."""
+    import runpy
+    sys.argv = [ZH] + argv
+    runpy.run_path(ZH, run_name='__main__')
+
+
+def main(argv):
+    """Run workflow."""
+    cachedir = os.getenv('alfred_workflow_cache')
+    if os.getenv('USE_DAEMON') not in ('1', 'true', 'yes') or \
+            not cachedir or not argv or argv[0] not in COMMANDS:
+        return run_zh(argv)
+
+    try:
+        output = request(socket_path(cachedir), argv)
+    except OSError:  # not running, or hung
+        start_daemon()
+        return run_zh(argv)
+
+    if output is None:  # daemon had a problem; it's logged
+        return run_zh(argv)
+
+    out = sys.stdout.buffer
+    out.write(output)
+    out.flush()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])